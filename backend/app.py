@@ -4,13 +4,20 @@ from flask_cors import CORS
 from routes.chat import chat_bp
 from routes.summarize_route import summarize_bp
 from routes.teams import teams_bp
+from routes.metrics import metrics_bp
+from routes.search import search_bp
+from services import session_index, tracing
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor", "ETag"])
+tracing.init_app(app)
+session_index.init_app(app)
 
 app.register_blueprint(chat_bp, url_prefix="/api")
 app.register_blueprint(summarize_bp, url_prefix="/api")
 app.register_blueprint(teams_bp, url_prefix="/api")
+app.register_blueprint(metrics_bp, url_prefix="/api")
+app.register_blueprint(search_bp, url_prefix="/api")
 
 if __name__ == "__main__":
     app.run(debug=True, port=8000)
@@ -0,0 +1,90 @@
+# Deterministic stand-in for the Gemini chat model, used by the benchmarks
+#
+# Answers are built from the prompt alone (same prompt -> same answer), take
+# FAKE_LLM_DELAY_MS to arrive and are about FAKE_LLM_OUTPUT_CHARS long. The
+# shape follows the call site so the routes behave as they do in production:
+# JSON for chat turns, a short title for titles and a headed document for
+# summaries.
+import hashlib
+import json
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_WORDS = ("project client feature budget team scope users data deadline "
+          "platform requirement stakeholder delivery risk mobile career").split()
+
+_QUESTIONS = [
+    "What is the specific problem you want to solve?",
+    "What kind of features are mission-critical?",
+    "What is our budget and preferred tech stack?",
+    "Which deliverables are in scope/out of scope?",
+    "Which team members and teams involved should we plan for?",
+]
+
+_HEADINGS = [
+    "High-level goals/business objectives",
+    "Functional & non-functional capabilities/features",
+    "Technical considerations",
+    "Requirements/constraints",
+    "Teams/team members",
+    "Project assumptions",
+    "Project deliverables",
+]
+
+
+def _filler(seed: str, chars: int) -> str:
+    """Deterministic pseudo-text of roughly `chars` characters"""
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    words, i = [], 0
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(_WORDS[digest[i % len(digest)] % len(_WORDS)])
+        i += 1
+    return " ".join(words).capitalize() + "."
+
+
+class FakeChatModel(BaseChatModel):
+    model: str = "fake-model"
+    temperature: float = 0.0
+    delay_ms: float = 0.0
+    output_chars: int = 600
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _answer(self, system: str, user: str) -> str:
+        seed = system[-200:] + user
+        if "project summary title" in system:
+            return "Benchmark Project App"
+        if "inputType" in system:
+            # Chat turn: cycle through the stage questions so compaction has something to fold
+            question = _QUESTIONS[len(system) % len(_QUESTIONS)]
+            return json.dumps({
+                "text": _filler(seed, self.output_chars),
+                "inputType": "mixed",
+                "options": [],
+                "allowOther": False,
+                "sections": [{"question": question, "inputType": "text", "options": []}],
+            })
+        per_section = max(self.output_chars // len(_HEADINGS), 20)
+        return "\n\n".join(f"**__{heading}__**\n\n{_filler(seed + heading, per_section)}"
+                           for heading in _HEADINGS)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        system = "\n".join(m.content for m in messages if m.type == "system" and isinstance(m.content, str))
+        user = "\n".join(m.content for m in messages if m.type != "system" and isinstance(m.content, str))
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1000)
+        text = self._answer(system, user)
+        prompt_tokens = (len(system) + len(user) + 3) // 4
+        completion_tokens = (len(text) + 3) // 4
+        # Gemini answers with a list of content parts, not a plain string
+        message = AIMessage(content=[{"type": "text", "text": text}], usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,275 @@
+# End-to-end load test and latency benchmark for the Flask API
+#
+# Simulates many concurrent client sessions against the app in-process:
+# each session replays the user messages of sample_transcripts/transcript_1.json
+# through /api/chat, records every message with /api/chat/message, then
+# lists /api/sessions and asks for a summary with /api/summarize/<id>;
+# /api/teams/members is read at the start of every session. Like the
+# frontend, the summary is requested as a background job and polled; the
+# "summary job" row is the time until it finished.
+#
+# The LLM is a deterministic fake (benchmarks/fake_llm.py) and persistence is
+# the local SQLite/filesystem backend with injected latency, so runs are
+# reproducible offline. Reports throughput, p50/p95/p99 latency and storage/DB
+# round trips per request for each endpoint.
+#
+# Usage (from backend/):
+#   python -m benchmarks.load_test
+#   python -m benchmarks.load_test --sessions 32 --concurrency 16 --save benchmarks/baseline.json
+#   python -m benchmarks.load_test --compare benchmarks/baseline.json
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(BACKEND_DIR, "sample_transcripts", "transcript_1.json")
+
+# Background work (title generation, write-behind flushes) can land on either side
+# of a request, so mean round trips wobble slightly between runs
+ROUND_TRIP_SLACK = 0.1
+JOB_POLL_SECONDS = 0.01
+
+TEAM_MEMBERS = [
+    {"team": "Frontend", "name": "Ada", "role": "Engineer", "email": "ada@example.com"},
+    {"team": "Backend", "name": "Linus", "role": "Engineer", "email": "linus@example.com"},
+    {"team": "Design", "name": "Grace", "role": "Designer", "email": "grace@example.com"},
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Rally Flask API")
+    parser.add_argument("--sessions", type=int, default=32, help="simulated client sessions")
+    parser.add_argument("--concurrency", type=int, default=8, help="sessions running at once")
+    parser.add_argument("--turns", type=int, default=0,
+                        help="chat turns per session (default: every user message in the script)")
+    parser.add_argument("--llm-delay-ms", type=float, default=50, help="fake LLM latency per call")
+    parser.add_argument("--llm-output-chars", type=int, default=600, help="fake LLM answer size")
+    parser.add_argument("--db-latency-ms", type=float, default=2, help="injected latency per DB call")
+    parser.add_argument("--storage-latency-ms", type=float, default=5,
+                        help="injected latency per storage call")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random extra latency per call")
+    parser.add_argument("--data-dir", help="local persistence directory (default: a temp dir)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative p95 increase before a regression is reported")
+    parser.add_argument("--min-delta-ms", type=float, default=10,
+                        help="ignore p95 increases smaller than this (noise on fast endpoints)")
+    parser.add_argument("--log-level", default="WARNING", help="the app's LOG_LEVEL during the run")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, data_dir: str):
+    """Point the app at local persistence; must run before the app is imported"""
+    os.environ["PERSISTENCE_BACKEND"] = "local"
+    os.environ["LOCAL_DATA_DIR"] = data_dir
+    os.environ["LOCAL_DB_LATENCY_MS"] = str(args.db_latency_ms)
+    os.environ["LOCAL_STORAGE_LATENCY_MS"] = str(args.storage_latency_ms)
+    os.environ["LOCAL_LATENCY_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["LOG_LEVEL"] = args.log_level
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    sys.path.insert(0, BACKEND_DIR)
+
+    from benchmarks.fake_llm import FakeChatModel
+    from services import llm_clients
+
+    llm_clients.set_client_factory(lambda model, temperature: FakeChatModel(
+        model=model, temperature=temperature,
+        delay_ms=args.llm_delay_ms, output_chars=args.llm_output_chars))
+
+
+def load_script(turns: int) -> list:
+    with open(SCRIPT_PATH, "r", encoding="utf-8") as f:
+        messages = json.load(f)
+    queries = [m["message"] for m in messages if m.get("role") == "user"]
+    return queries[:turns] if turns else queries
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # endpoint -> list of (latency_ms, ok, round trip counts)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, latency_ms: float, ok: bool, counts: dict):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((latency_ms, ok, counts))
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_session(app, recorder: Recorder, queries: list, index: int):
+    from services import round_trips
+
+    client = app.test_client()
+    session_id = f"bench-{index}-{uuid.uuid4().hex[:8]}"
+
+    def call(endpoint: str, method: str, path: str, **kwargs):
+        with round_trips.track() as counter:
+            started = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            latency_ms = (time.perf_counter() - started) * 1000
+        recorder.add(endpoint, latency_ms, response.status_code < 400, dict(counter.counts))
+        return response
+
+    # Tag the opening message so each session's transcript (and summary) is distinct
+    queries = [f"{queries[0]} (client {index})"] + queries[1:]
+
+    call("GET /api/teams/members", "GET", "/api/teams/members")
+    for turn, query in enumerate(queries):
+        response = call("POST /api/chat", "POST", "/api/chat",
+                        json={"session_id": session_id, "user_query": query})
+        answer = (response.get_json(silent=True) or {}).get("response", "")
+        call("POST /api/chat/message", "POST", "/api/chat/message",
+             json={"session_id": session_id, "message_id": f"{turn}-user", "sender": "user", "text": query})
+        call("POST /api/chat/message", "POST", "/api/chat/message",
+             json={"session_id": session_id, "message_id": f"{turn}-bot", "sender": "bot", "text": answer})
+    call("GET /api/sessions", "GET", "/api/sessions")
+
+    started = time.perf_counter()
+    response = call("POST /api/summarize/<id>", "POST", f"/api/summarize/{session_id}",
+                    headers={"Prefer": "respond-async"})
+    if response.status_code == 202:
+        status_url = response.get_json()["status_url"]
+        job = {}
+        while job.get("status") not in ("succeeded", "failed"):
+            time.sleep(JOB_POLL_SECONDS)
+            job = client.get(status_url).get_json() or {}
+        latency_ms = (time.perf_counter() - started) * 1000
+        counts = {kind: n for kind, n in job.get("round_trips", {}).items() if kind != "total"}
+        recorder.add("summary job", latency_ms, job["status"] == "succeeded", counts)
+
+
+def summarize(recorder: Recorder, wall_seconds: float) -> dict:
+    endpoints = {}
+    total = 0
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = sorted(s[0] for s in samples)
+        kinds = sorted({kind for s in samples for kind in s[2]})
+        round_trip_means = {kind: round(sum(s[2].get(kind, 0) for s in samples) / len(samples), 2)
+                            for kind in kinds}
+        round_trip_means["total"] = round(sum(sum(s[2].values()) for s in samples) / len(samples), 2)
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": sum(1 for s in samples if not s[1]),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "round_trips": round_trip_means,
+        }
+        total += len(samples)
+    return {
+        "requests": total,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(results: dict):
+    print(f"\n{results['requests']} requests in {results['wall_seconds']}s "
+          f"({results['throughput_rps']} req/s)\n")
+    header = f"{'endpoint':<28}{'reqs':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'db':>7}{'storage':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, stats in results["endpoints"].items():
+        trips = stats["round_trips"]
+        print(f"{endpoint:<28}{stats['requests']:>6}{stats['errors']:>5}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+              f"{trips.get('db', 0):>7.2f}{trips.get('storage', 0):>9.2f}")
+    print("\nLatencies in ms; db/storage are mean round trips per request.")
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float = 0) -> list:
+    """Regressions against a baseline: slower p95 beyond tolerance, or more round trips"""
+    if baseline.get("config") != results.get("config"):
+        print("[WARNING] Baseline was recorded with a different configuration; comparison may be off")
+    regressions = []
+    for endpoint, stats in results["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(endpoint)
+        if base is None:
+            continue
+        if (stats["p95_ms"] > base["p95_ms"] * (1 + tolerance)
+                and stats["p95_ms"] - base["p95_ms"] >= min_delta_ms):
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']}ms -> {stats['p95_ms']}ms")
+        if stats["round_trips"]["total"] > base["round_trips"]["total"] + ROUND_TRIP_SLACK:
+            regressions.append(f"{endpoint}: round trips {base['round_trips']['total']} -> "
+                               f"{stats['round_trips']['total']}")
+        if stats["errors"] > base["errors"]:
+            regressions.append(f"{endpoint}: errors {base['errors']} -> {stats['errors']}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="rally-bench-")
+    configure_environment(args, data_dir)
+    queries = load_script(args.turns)
+
+    from app import app
+    from services.session_cache import session_cache
+
+    seed = app.test_client()
+    for member in TEAM_MEMBERS:
+        seed.post("/api/teams/members", json=member)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(run_session, app, recorder, queries, i) for i in range(args.sessions)]
+        for future in futures:
+            future.result()
+    wall_seconds = time.perf_counter() - started
+    session_cache.shutdown()
+
+    results = summarize(recorder, wall_seconds)
+    results["config"] = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "turns": len(queries),
+        "llm_delay_ms": args.llm_delay_ms,
+        "llm_output_chars": args.llm_output_chars,
+        "db_latency_ms": args.db_latency_ms,
+        "storage_latency_ms": args.storage_latency_ms,
+        "jitter_ms": args.jitter_ms,
+    }
+    results["recorded_at"] = datetime.utcnow().isoformat()
+    print_report(results)
+
+    if not args.data_dir:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
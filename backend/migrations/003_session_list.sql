@@ -0,0 +1,12 @@
+-- Migration 003: Session list pagination
+-- Run after 002_team_members.sql.
+
+-- Sidebar title: the generated title, or "Session <last 8 chars of id>" until there is one.
+-- Computed by Postgres on write, so listing sessions needs no per-row fallback logic.
+ALTER TABLE sessions
+  ADD COLUMN IF NOT EXISTS display_title TEXT
+  GENERATED ALWAYS AS (COALESCE(NULLIF(title, ''), 'Session ' || RIGHT(session_id, 8))) STORED;
+
+-- Keyset pagination walks (created_at, id) newest first, optionally per user
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at_id ON sessions(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_created_at_id ON sessions(user_id, created_at DESC, id DESC);
@@ -0,0 +1,14 @@
+-- Migration 004: Cache versions
+-- Run after 003_session_list.sql.
+
+-- One row per cached dataset (e.g. "team_members:Frontend"). Writers store a new
+-- version token after changing the data; every worker compares tokens before
+-- serving its cached copy, so invalidation reaches all processes.
+CREATE TABLE IF NOT EXISTS cache_versions (
+  name TEXT PRIMARY KEY,
+  version TEXT NOT NULL,
+  updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Keep disabled for now (no app-level auth/RLS policy yet)
+ALTER TABLE cache_versions DISABLE ROW LEVEL SECURITY;
@@ -0,0 +1,70 @@
+-- Migration 005: Full-text search over transcripts and final summaries
+-- Run after 004_cache_versions.sql.
+
+-- One row per transcript message (seq = its index in the transcript) or final
+-- summary (seq 0). The backend keeps it in step with transcript and summary
+-- writes; content_tsv is maintained by Postgres and GIN-indexed.
+CREATE TABLE IF NOT EXISTS search_documents (
+  id BIGSERIAL PRIMARY KEY,
+  session_id TEXT NOT NULL,
+  kind TEXT NOT NULL CHECK (kind IN ('transcript', 'summary')),
+  seq INTEGER NOT NULL,
+  role TEXT,
+  content TEXT NOT NULL,
+  content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', content)) STORED,
+  updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  UNIQUE (session_id, kind, seq)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_documents_tsv ON search_documents USING GIN (content_tsv);
+
+-- Keep disabled for now (no app-level auth/RLS policy yet)
+ALTER TABLE search_documents DISABLE ROW LEVEL SECURITY;
+
+-- Sessions matching a web-search style query ("quoted phrases", -excluded, or),
+-- best first. A session's rank is the sum over its matching documents; the
+-- snippet comes from its best one, with matches wrapped in <mark></mark>.
+-- Headlines are only built for the requested page.
+CREATE OR REPLACE FUNCTION search_sessions(query TEXT, max_results INTEGER DEFAULT 20, skip INTEGER DEFAULT 0)
+RETURNS TABLE (
+  session_id TEXT,
+  title TEXT,
+  created_at TIMESTAMP WITH TIME ZONE,
+  kind TEXT,
+  seq INTEGER,
+  snippet TEXT,
+  rank REAL,
+  matches BIGINT
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH q AS (
+    SELECT websearch_to_tsquery('english', query) AS tsq
+  ),
+  hits AS (
+    SELECT d.session_id, d.kind, d.seq, d.content, ts_rank_cd(d.content_tsv, q.tsq) AS score
+    FROM search_documents d, q
+    WHERE d.content_tsv @@ q.tsq
+  ),
+  ranked AS (
+    SELECT h.session_id, SUM(h.score) AS score, COUNT(*) AS matches
+    FROM hits h
+    GROUP BY h.session_id
+    ORDER BY score DESC, h.session_id
+    LIMIT max_results OFFSET skip
+  ),
+  best AS (
+    SELECT DISTINCT ON (h.session_id) h.session_id, h.kind, h.seq, h.content
+    FROM hits h JOIN ranked r ON r.session_id = h.session_id
+    ORDER BY h.session_id, h.score DESC
+  )
+  SELECT r.session_id, s.display_title, s.created_at, b.kind, b.seq,
+         ts_headline('english', b.content, q.tsq,
+                     'StartSel=<mark>, StopSel=</mark>, MinWords=10, MaxWords=30, MaxFragments=2, FragmentDelimiter=" … "'),
+         r.score::REAL, r.matches
+  FROM ranked r
+  JOIN best b ON b.session_id = r.session_id
+  CROSS JOIN q
+  LEFT JOIN sessions s ON s.session_id = r.session_id
+  ORDER BY r.score DESC, r.session_id;
+$$;
@@ -0,0 +1,19 @@
+-- Migration 006: Database-assigned chat message write times
+-- Run after 005_search.sql.
+
+-- GET /api/chat/messages/<id>?since= syncs on (timestamp, message_id). The
+-- database sets timestamp on every insert and update, so write times come
+-- from one clock and as late as possible in the transaction, not from
+-- whichever app server handled the request.
+CREATE OR REPLACE FUNCTION chat_messages_touch() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  NEW.timestamp := clock_timestamp();
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS chat_messages_touch ON chat_messages;
+CREATE TRIGGER chat_messages_touch
+  BEFORE INSERT OR UPDATE ON chat_messages
+  FOR EACH ROW EXECUTE FUNCTION chat_messages_touch();
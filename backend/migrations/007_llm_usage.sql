@@ -0,0 +1,31 @@
+-- Migration 007: Atomic per-session LLM usage totals
+-- Run after 006_chat_message_write_time.sql.
+
+-- Numeric fields of `total` plus those of `delta`; other fields of `total` are kept
+CREATE OR REPLACE FUNCTION jsonb_add_counts(total jsonb, delta jsonb) RETURNS jsonb
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT coalesce(total, '{}'::jsonb) || coalesce(jsonb_object_agg(
+    key, coalesce((total ->> key)::numeric, 0) + (value #>> '{}')::numeric), '{}'::jsonb)
+  FROM jsonb_each(coalesce(delta, '{}'::jsonb))
+  WHERE jsonb_typeof(value) = 'number';
+$$;
+
+-- Adds a usage delta ({"calls", "prompt_tokens", "completion_tokens",
+-- "latency_ms", "retries", "errors", "by_call": {name: {...}}}), field by field,
+-- to sessions.metadata->'llm_usage' in one statement, so concurrent workers
+-- never overwrite each other's increments. Returns false if the session row
+-- does not exist (yet).
+CREATE OR REPLACE FUNCTION add_session_llm_usage(target_session_id text, delta jsonb) RETURNS boolean
+LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE sessions
+  SET metadata = jsonb_set(
+    coalesce(metadata, '{}'::jsonb), '{llm_usage}',
+    jsonb_add_counts(metadata -> 'llm_usage', delta - 'by_call') || jsonb_build_object('by_call', (
+      SELECT coalesce(metadata #> '{llm_usage,by_call}', '{}'::jsonb) || coalesce(jsonb_object_agg(
+        name, jsonb_add_counts(metadata #> array['llm_usage', 'by_call', name], usage)), '{}'::jsonb)
+      FROM jsonb_each(coalesce(delta -> 'by_call', '{}'::jsonb)) AS calls(name, usage))))
+  WHERE session_id = target_session_id;
+  RETURN FOUND;
+END;
+$$;
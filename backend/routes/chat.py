@@ -1,51 +1,130 @@
 # /api/chat (Gemini chat)
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 import json
-from services.gemini import run_chat, generate_title
-from routes.transcript import add_message, save_transcript, get_session_title, set_session_title, get_transcript_with_update
-from services.supabase_client import list_sessions, get_session, save_chat_message, get_chat_messages
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from services.gemini import run_chat, stream_chat, extract_partial_text, generate_title, _fallback_title
+from routes.transcript import save_transcript, get_session_title, set_session_title, get_transcript, TranscriptUnitOfWork
+from services.context import compact_history
+from services.supabase_client import (list_sessions, get_session, save_chat_message, save_chat_messages, get_chat_messages,
+                                     SESSION_PAGE_SIZE, MESSAGE_PAGE_SIZE, CHAT_MESSAGE_BATCH_MAX)
+from services.title_store import title_store
+from services.session_locks import SessionBusy, session_locks
+from services.single_flight import FingerprintMismatch, SingleFlight
+from services import tracing
+from services.log import SAMPLED, get_logger
+import threading
 
 chat_bp = Blueprint("chat", __name__)
+log = get_logger(__name__)
+
+# Title generation runs here, concurrently with the main chat call
+title_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="title")
+_title_futures = {}
+_title_lock = threading.Lock()
+
+# Duplicate chat submissions share one LLM run: identical requests for a
+# session while the first is still running, and requests carrying the same
+# Idempotency-Key also for IDEMPOTENCY_TTL after it finished
+chat_flights = SingleFlight()
+
+
+def _flight(kind: str, session_id: str, data: dict) -> tuple:
+    """(key, fingerprint, remember) identifying a chat request for chat_flights"""
+    fingerprint = hashlib.sha1(json.dumps(
+        [data.get("user_query"), data.get("question"), data.get("selected_option")]).encode("utf-8")).hexdigest()
+    idempotency_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+    if idempotency_key:
+        return (kind, session_id, "key", str(idempotency_key)), fingerprint, True
+    return (kind, session_id, "body", fingerprint), fingerprint, False
+
 
 @chat_bp.route("/chat", methods=["POST"])
 def chat():
+    """
+    One chat turn. Turns for the same session run one at a time. A duplicate
+    of a request that is still running, or a request repeating an earlier
+    Idempotency-Key header (or "idempotency_key" field), gets the first
+    request's reply (marked Idempotent-Replayed) instead of a second LLM call.
+    Reusing a key for a different message is a 422; a session still busy
+    after SESSION_LOCK_TIMEOUT is a 409.
+    """
     data = request.get_json()
     user_query = data.get("user_query")
     session_id = data.get("session_id")
     question = data.get("question")  # The question being answered
     selected_option = data.get("selected_option")  # The option selected
     
-    print(f"[DEBUG] Chat Request - Session: {session_id}")
-    print(f"[DEBUG] User Query: {user_query}")
-    print(f"[DEBUG] Question: {question}")
-    print(f"[DEBUG] Selected Option: {selected_option}")
+    log.debug("Chat request - session: %s, query: %s, question: %s, selected option: %s",
+              session_id, user_query, question, selected_option, extra=SAMPLED)
 
     if not user_query:
         return jsonify({"response": "Please enter your question."})
 
-    transcript = get_transcript_with_update(session_id, "user", user_query, question=question, selected_option=selected_option)
+    key, fingerprint, remember = _flight("chat", session_id, data)
+    try:
+        call, leader = chat_flights.begin(key, fingerprint)
+        if leader:
+            try:
+                result, headers = _chat_turn(session_id, user_query, selected_option)
+            except Exception as e:
+                chat_flights.finish(key, call, error=e)
+                raise
+            chat_flights.finish(key, call, result=(result, headers), remember=remember)
+        else:
+            # The same request is already running (or was answered): reuse its reply
+            result, headers = call.wait(session_locks.timeout)
+            headers = {**headers, "X-Round-Trips": "0", "Idempotent-Replayed": "true"}
+    except FingerprintMismatch as e:
+        return jsonify({"error": str(e)}), 422
+    except (SessionBusy, TimeoutError) as e:
+        return jsonify({"error": str(e)}), 409
+
+    with tracing.span("chat.serialize"):
+        response = jsonify(result)
+    response.headers.update(headers)
+    return response
 
-    response = run_chat(user_query, transcript)
-    parsed = None
-    response_text = response
-    input_type = "text"
-    options = []
-    allow_other = False
-    sections = []
 
+def _chat_turn(session_id: str, user_query: str, selected_option: str = None) -> tuple:
+    """Run one chat turn; returns (result, response headers)"""
+    # Session row and transcript are loaded once; both messages are written in one commit
+    with TranscriptUnitOfWork(session_id) as uow:
+        title_future = _start_title(uow, user_query)
+        uow.add("user", user_query, selected_option=selected_option)
+        result = _run_turn(uow, user_query, title_future)
+    return result, {
+        "X-Round-Trips": str(uow.round_trips.get("total", 0)),
+        "X-Context-Tokens": f"{uow.context_stats['tokens_before']}/{uow.context_stats['tokens_after']}",
+    }
+
+
+def _parse_response(response: str) -> dict:
+    """Split the LLM's JSON answer into the fields returned to the client"""
+    result = {
+        "response": response,
+        "input_type": "text",
+        "options": [],
+        "allow_other": False,
+        "sections": [],
+    }
     try:
         parsed = json.loads(response)
-        response_text = parsed.get("text", response_text)
-        input_type = parsed.get("inputType", input_type)
-        options = parsed.get("options", options) or []
-        allow_other = parsed.get("allowOther", allow_other)
-        sections = parsed.get("sections", []) or []
+        result["response"] = parsed.get("text", response)
+        result["input_type"] = parsed.get("inputType", "text")
+        result["options"] = parsed.get("options", []) or []
+        result["allow_other"] = parsed.get("allowOther", False)
+        result["sections"] = parsed.get("sections", []) or []
     except Exception as e:
-        print(f"[DEBUG] Failed to parse JSON: {e}")
-        parsed = None
+        log.debug("Failed to parse JSON: %s", e)
+    return result
+
 
-    # Format complete message for transcript including all questions
-    complete_transcript_message = response_text
+def _format_transcript_message(result: dict) -> str:
+    """Format complete message for transcript including all questions"""
+    complete_transcript_message = result["response"]
+    sections = result["sections"]
+    options = result["options"]
     
     # Add sections if they exist (for Problem Definition or multi-part questions)
     if sections:
@@ -59,38 +138,181 @@ def chat():
         for option in options:
             complete_transcript_message += f"- {option}\n"
     
-    print(f"[DEBUG] Complete Transcript Message: {complete_transcript_message[:200]}...")
-    
-    
+    log.debug("Complete transcript message: %.200s...", complete_transcript_message, extra=SAMPLED)
+    return complete_transcript_message
 
-    # Generate session title on first user message (greeting/problem statement)
-    session_title = get_session_title(session_id)
-    if not session_title:
-        # Generate a concise summary title (max 4 words) from the user query
-        session_title = generate_title(user_query)
+
+def _start_title(uow: TranscriptUnitOfWork, user_query: str):
+    """
+    Start generating a title on the session's first message (greeting/problem statement).
+
+    Returns:
+        a Future for the generated title, or None if the session already has one
+    """
+    session_id = uow.session_id
+    # Read through to the sessions row the unit of work already loaded
+    if title_store.get(session_id, uow.session):
+        return None
+    with _title_lock:
+        # One generation per session at a time in this worker
+        future = _title_futures.get(session_id)
+        if future is None:
+            # Generate a concise summary title (max 4 words) from the user query
+            future = title_executor.submit(generate_title, user_query, session_id)
+            _title_futures[session_id] = future
+            future.add_done_callback(lambda f: _title_futures.pop(session_id, None))
+    return future
+
+
+def _store_generated_title(session_id: str, title_future, placeholder: str = None):
+    """Store a generated title, unless another worker already titled the session"""
+    session_title = title_future.result()
+    if title_store.store_generated(session_id, session_title, replaces=placeholder):
+        log.debug("Generated session title: %s", session_title)
+
+
+def _session_title(session_id: str, user_query: str, title_future, title_pending: bool) -> str:
+    if title_future is None:
+        return get_session_title(session_id)
+    if title_pending:
+        # Don't wait on the LLM; the generated title replaces this once it's ready
+        session_title = _fallback_title(user_query, max_words=4)
+        set_session_title(session_id, session_title, provisional=True)
+    else:
+        session_title = title_future.result()
+        log.debug("Generated session title: %s", session_title)
         set_session_title(session_id, session_title)
-        print(f"[DEBUG] Generated session title: {session_title}")
-        
-        # Immediately save the session to database with the title
-        # try:
-        #     save_transcript(session_id, title=session_title)
-        #     print(f"[DEBUG] Initial session saved to database with title")
-        # except Exception as e:
-        #     print(f"[ERROR] Failed to save initial session: {e}")
-    print(f"[DEBUG] Session title is {session_title}")
-    print("[DEBUG] Saving user message")
-    add_message(session_id, "user", user_query, question=question, selected_option=selected_option, title=session_title)
-    print("[DEBUG] Saving bot message")
-    add_message(session_id, "bot", complete_transcript_message, title=session_title)
-
-    return jsonify({
-        "response": response_text,
-        "input_type": input_type,
-        "options": options,
-        "allow_other": allow_other,
-        "sections": sections,
-        "session_title": session_title
-    })
+    return session_title
+
+
+def _finish_turn(uow: TranscriptUnitOfWork, user_query: str, response: str, title_future=None) -> dict:
+    """Parse the LLM answer, record the bot reply on the unit of work and commit"""
+    result = _parse_response(response)
+    complete_transcript_message = _format_transcript_message(result)
+    title_pending = title_future is not None and not title_future.done()
+    session_title = _session_title(uow.session_id, user_query, title_future, title_pending)
+    log.debug("Session title is %s", session_title)
+
+    uow.add("bot", complete_transcript_message)
+    uow.commit(title=session_title)
+
+    # Registered after the commit, so the title update always lands on an existing row.
+    # A row this turn created holds session_title; an older row has no title yet.
+    if title_future is not None and (title_pending or not uow.created):
+        placeholder = session_title if uow.created else None
+        title_future.add_done_callback(lambda f: _store_generated_title(uow.session_id, f, placeholder))
+
+    result["session_title"] = session_title
+    return result
+
+
+def _session_history(uow: TranscriptUnitOfWork) -> str:
+    # Older turns are folded into a digest once the history outgrows the token budget
+    with tracing.span("context.compact"):
+        session_history, stats = compact_history(uow.session_id, uow.transcript)
+    uow.context_stats = stats
+    log.debug("Context for session %s: %s", uow.session_id, stats, extra=SAMPLED)
+    return session_history
+
+
+def _run_turn(uow: TranscriptUnitOfWork, user_query: str, title_future=None) -> dict:
+    """Run the LLM for one chat turn and record the bot reply on the unit of work"""
+    response = run_chat(user_query, _session_history(uow), uow.session_id)
+    return _finish_turn(uow, user_query, response, title_future)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chat_bp.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming variant of /chat using Server-Sent Events.
+
+    As with /chat, a duplicate of a request that is still running (or one
+    repeating an Idempotency-Key) gets the first request's reply instead of
+    a second LLM call; it arrives as one delta once the reply is saved.
+
+    Events:
+        delta: {"text": "..."}  new characters of the reply text, as they are generated
+        done:  same payload as /chat, sent after the transcript has been saved
+        error: {"error": "..."}
+    """
+    data = request.get_json()
+    user_query = data.get("user_query")
+    session_id = data.get("session_id")
+    selected_option = data.get("selected_option")  # The option selected
+
+    log.debug("Streaming chat request - session: %s", session_id, extra=SAMPLED)
+
+    if not user_query:
+        return jsonify({"response": "Please enter your question."})
+
+    key, fingerprint, remember = _flight("chat/stream", session_id, data)
+    try:
+        call, leader = chat_flights.begin(key, fingerprint)
+    except FingerprintMismatch as e:
+        return jsonify({"error": str(e)}), 422
+
+    def generate():
+        outcome = {}
+        try:
+            yield from stream(outcome)
+        finally:
+            # Also reached when the client disconnects mid-stream
+            if "result" in outcome:
+                chat_flights.finish(key, call, result=outcome["result"], remember=remember)
+            else:
+                chat_flights.finish(key, call, error=outcome.get("error") or RuntimeError("Streaming chat was interrupted"))
+
+    def stream(outcome: dict):
+        try:
+            with TranscriptUnitOfWork(session_id) as uow:
+                title_future = _start_title(uow, user_query)
+                uow.add("user", user_query, selected_option=selected_option)
+                buffer = ""
+                streamed = ""
+                try:
+                    for piece in stream_chat(user_query, _session_history(uow), uow.session_id):
+                        buffer += piece
+                        text = extract_partial_text(buffer)
+                        if len(text) > len(streamed):
+                            yield _sse("delta", {"text": text[len(streamed):]})
+                            streamed = text
+                    # Saved once the LLM stream has closed
+                    result = _finish_turn(uow, user_query, buffer, title_future)
+                except Exception as e:
+                    log.error("Streaming chat failed: %s", e)
+                    outcome["error"] = e
+                    yield _sse("error", {"error": str(e)})
+                    return
+        except SessionBusy as e:
+            outcome["error"] = e
+            yield _sse("error", {"error": str(e)})
+            return
+        # Text the incremental parser couldn't pick up (e.g. non-JSON output);
+        # "done" always carries the full reply text as well
+        final_text = result["response"]
+        if len(final_text) > len(streamed) and final_text.startswith(streamed):
+            yield _sse("delta", {"text": final_text[len(streamed):]})
+        result["round_trips"] = uow.round_trips.get("total", 0)
+        result["context_tokens"] = uow.context_stats
+        outcome["result"] = result
+        yield _sse("done", result)
+
+    def replay():
+        # The same request is already streaming (or was answered): send its reply once it is saved
+        try:
+            result = call.wait(session_locks.timeout)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+            return
+        yield _sse("delta", {"text": result["response"]})
+        yield _sse("done", {**result, "round_trips": 0})
+
+    return Response(stream_with_context(generate() if leader else replay()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @chat_bp.route("/chat/message", methods=["POST"])
 def save_message():
@@ -123,23 +345,57 @@ def save_message():
         )
         return jsonify({"success": True, "message": message}), 200
     except Exception as e:
-        print(f"[ERROR] Failed to save message: {e}")
+        log.error("Failed to save message: %s", e)
         return jsonify({"error": str(e)}), 500
 
+@chat_bp.route("/chat/messages", methods=["POST"])
+def save_messages():
+    """
+    Save a batch of chat messages, for one or more sessions, in at most two DB round trips.
+
+    Body: {"messages": [{"session_id", "message_id", "sender", "text", ...}]}
+    (up to CHAT_MESSAGE_BATCH_MAX items). Returns {"success", "results"} with
+    one {"index", "session_id", "message_id", "status"} per item; status is
+    "saved", "duplicate" or "error". The response is 207 if any item was not saved.
+    """
+    data = request.get_json(silent=True) or {}
+    messages = data.get("messages") if isinstance(data, dict) else None
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "messages must be a non-empty list"}), 400
+    if len(messages) > CHAT_MESSAGE_BATCH_MAX:
+        return jsonify({"error": f"At most {CHAT_MESSAGE_BATCH_MAX} messages per request"}), 413
+
+    results = save_chat_messages(messages)
+    success = all(result["status"] == "saved" for result in results)
+    return jsonify({"success": success, "results": results}), 200 if success else 207
+
 @chat_bp.route("/chat/messages/<session_id>", methods=["GET"])
 def get_messages(session_id):
-
     """
-    Get all chat messages for a session with selection state
+    Get chat messages for a session with selection state, for delta sync.
+
+    Query params: since (next_cursor from an earlier call; omit for the full
+    history) and limit (default 200, max 1000). Returns
+    {"messages", "next_cursor", "has_more"}; poll again with since=next_cursor
+    to get only new or changed messages (plus those written just before the
+    cursor, which clients merge by message_id). Responses carry an ETag, so a poll
+    with If-None-Match gets a 304 when nothing changed.
     """
-    
+    limit = request.args.get("limit", default=MESSAGE_PAGE_SIZE, type=int)
+    since = request.args.get("since") or None
     try:
-        messages = get_chat_messages(session_id)
-        return jsonify(messages), 200
-
+        messages, next_cursor, has_more = get_chat_messages(session_id, since=since, limit=limit)
+        response = jsonify({"messages": messages, "next_cursor": next_cursor, "has_more": has_more})
+        # Every write bumps a message's timestamp, so the page's last position identifies its contents
+        last = (messages[-1]["timestamp"], messages[-1]["message_id"]) if messages else ("", "")
+        etag = hashlib.sha1(json.dumps([session_id, since, limit, len(messages), *last]).encode("utf-8")).hexdigest()
+        response.set_etag(etag, weak=True)
+        return response.make_conditional(request)
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"[ERROR] Failed to fetch messages: {e}")
+        log.error("Failed to fetch messages: %s", e)
         error_message = str(e)
         return jsonify({"error": error_message}), 500
 
@@ -158,7 +414,7 @@ def upload_transcript():
     # Get the title for this session
     session_title = get_session_title(session_id)
     
-    print(f"[DEBUG] Uploading transcript for session {session_id} with title: {session_title}")
+    log.info("Uploading transcript for session %s with title: %s", session_id, session_title)
     result = save_transcript(session_id, user_id, title=session_title)
     
     if "error" in result:
@@ -166,12 +422,24 @@ def upload_transcript():
     
     return jsonify(result), 200
 
+@chat_bp.route("/transcript/<session_id>", methods=["GET"])
+def fetch_transcript(session_id):
+    """
+    Get the full transcript for a session (assembled from its stored chunks)
+    """
+    try:
+        transcript = get_transcript(session_id)
+        return jsonify(transcript), 200
+    except Exception as e:
+        log.error("Failed to fetch transcript: %s", e)
+        return jsonify({"error": str(e)}), 500
+
 @chat_bp.route("/transcript/save/<session_id>", methods=["POST"])
 def download_transcript(session_id):
     """
     Deprecated: Use /api/transcript/upload instead
     """
-    print("[WARNING] download_transcript is deprecated, use /api/transcript/upload")
+    log.warning("download_transcript is deprecated, use /api/transcript/upload")
     result = save_transcript(session_id)
     if "error" in result:
         return jsonify(result), 500
@@ -180,13 +448,24 @@ def download_transcript(session_id):
 @chat_bp.route("/sessions", methods=["GET"])
 def get_sessions():
     """
-    Get all sessions from database
+    Get one page of sessions, newest first.
+
+    Query params: limit (default 50, max 200), cursor (from the previous
+    page's X-Next-Cursor header) and optional user_id. The body is the list
+    of sessions; X-Next-Cursor is only set when there are more.
     """
+    limit = request.args.get("limit", default=SESSION_PAGE_SIZE, type=int)
     try:
-        sessions = list_sessions()
-        return jsonify(sessions), 200
+        sessions, next_cursor = list_sessions(user_id=request.args.get("user_id") or None, limit=limit,
+                                              cursor=request.args.get("cursor") or None)
+        response = jsonify(sessions)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"[ERROR] Failed to fetch sessions: {e}")
+        log.error("Failed to fetch sessions: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @chat_bp.route("/session/<session_id>", methods=["GET"])
@@ -200,5 +479,5 @@ def get_session_detail(session_id):
             return jsonify({"error": "Session not found"}), 404
         return jsonify(session), 200
     except Exception as e:
-        print(f"[ERROR] Failed to fetch session: {e}")
+        log.error("Failed to fetch session: %s", e)
         return jsonify({"error": str(e)}), 500
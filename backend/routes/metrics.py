@@ -0,0 +1,64 @@
+# /api/metrics (runtime metrics)
+from flask import Blueprint, Response, request, jsonify
+from services import llm_metrics, tracing
+from services.session_cache import session_cache
+from services.title_store import title_store
+from services.session_index import session_index
+from services.roster_cache import roster_cache
+from services.session_locks import session_locks
+from routes.chat import chat_flights
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def _llm_counters() -> list:
+    totals = llm_metrics.snapshot(limit=0)["totals"]
+    lines = ["# HELP rally_llm_calls_total LLM calls per call site",
+             "# TYPE rally_llm_calls_total counter"]
+    lines += [f'rally_llm_calls_total{{call="{name}"}} {usage["calls"]}' for name, usage in sorted(totals.items())]
+    lines += ["# HELP rally_llm_tokens_total LLM tokens per call site",
+              "# TYPE rally_llm_tokens_total counter"]
+    for name, usage in sorted(totals.items()):
+        lines.append(f'rally_llm_tokens_total{{call="{name}",type="prompt"}} {usage["prompt_tokens"]}')
+        lines.append(f'rally_llm_tokens_total{{call="{name}",type="completion"}} {usage["completion_tokens"]}')
+    return lines
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Request and span latency histograms plus LLM counters, in Prometheus text format"""
+    body = tracing.render_metrics() + "\n".join(_llm_counters()) + "\n"
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+@metrics_bp.route("/metrics/slow", methods=["GET"])
+def get_slow_requests():
+    """
+    Recent requests slower than TRACE_SLOW_MS with their span breakdown.
+    Optional ?limit= caps the number returned.
+    """
+    limit = request.args.get("limit", default=tracing.RECENT_SLOW, type=int)
+    return jsonify(tracing.recent_slow(limit=limit)), 200
+
+
+@metrics_bp.route("/metrics/llm", methods=["GET"])
+def get_llm_metrics():
+    """
+    Recent LLM calls (model, tokens, latency, retries) and totals per call site.
+    Optional ?limit= caps the number of calls returned (default 100).
+    """
+    limit = request.args.get("limit", default=100, type=int)
+    return jsonify(llm_metrics.snapshot(limit=limit)), 200
+
+
+@metrics_bp.route("/metrics/cache", methods=["GET"])
+def get_cache_metrics():
+    """Size and hit/miss counters of the in-process caches, plus chat lock and dedupe counters"""
+    return jsonify({
+        "sessions": session_cache.stats(),
+        "titles": title_store.stats(),
+        "session_exists": session_index.stats(),
+        "roster": roster_cache.stats(),
+        "session_locks": session_locks.stats(),
+        "chat_flights": chat_flights.stats(),
+    }), 200
@@ -0,0 +1,36 @@
+# /api/search (full-text search over transcripts and final summaries)
+from flask import Blueprint, request, jsonify
+from services.log import get_logger
+from services.search_index import search_index, SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE_MAX
+
+search_bp = Blueprint("search", __name__)
+log = get_logger(__name__)
+
+MAX_QUERY_CHARS = 256
+
+
+@search_bp.route("/search", methods=["GET"])
+def search_sessions():
+    """
+    Sessions whose transcript or approved summary match a query, best first.
+
+    Query params: q (words, "quoted phrases", -excluded words), limit
+    (default 20, max 100) and offset (next_offset from the previous page).
+    Returns {"query", "results", "next_offset"}; each result's snippet is raw
+    text with the matched words wrapped in <mark></mark>, so escape the rest
+    before rendering it as HTML.
+    """
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    if len(query) > MAX_QUERY_CHARS:
+        return jsonify({"error": f"q is longer than {MAX_QUERY_CHARS} characters"}), 400
+    limit = max(1, min(request.args.get("limit", default=SEARCH_PAGE_SIZE, type=int), SEARCH_PAGE_SIZE_MAX))
+    offset = max(0, request.args.get("offset", default=0, type=int))
+
+    try:
+        results, next_offset = search_index.search(query, limit=limit, offset=offset)
+    except Exception as e:
+        log.error("search_sessions: %s", e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"query": query, "results": results, "next_offset": next_offset})
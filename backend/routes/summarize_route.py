@@ -1,9 +1,24 @@
-from flask import Blueprint, jsonify, request
-from langchain_google_genai import ChatGoogleGenerativeAI
+from flask import Blueprint, current_app, jsonify, request, url_for
 from services.supabase_client import supabase
+from services.session_cache import session_cache
+from services import llm_metrics, round_trips
+from services.llm_clients import get_llm, DEFAULT_MODEL
+from services.context import estimate_tokens
+from services.jobs import JobQueue, JobStore, QueueFull
+from services.summary_history import summary_history
+from services.search_index import search_index
+from services import summary_sections
+from services.log import get_logger
+import contextvars
 import json
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 summarize_bp = Blueprint("summarize", __name__)
+log = get_logger(__name__)
 
 # TODO: Make this read from prompts text file
 SUMMARIZE_PROMPT = """You are given a document that is a conversation between a product manager and a client. 
@@ -55,33 +70,230 @@ REVIEWER COMMENTS:
 Now write the improved summary:
 """
 
-# Helper functions for doing summary editing
-def _fetch_and_format_transcript(session_id: str):
-    """Download and format transcript from Supabase. Returns (formatted_str, error_response)."""
-    try:
-        transcript_bytes = supabase.storage.from_("transcripts").download(
-            f"transcripts/{session_id}.json"
-        )
-        transcript_text = transcript_bytes.decode("utf-8")
-    except Exception as e:
-        return None, (jsonify({"detail": f"Transcript not found for session {session_id}: {e}"}), 404)
+# Regeneration rewrites only the sections that have comments, each with the
+# part of the transcript relevant to it; REGENERATE_PROMPT is the fallback
+# when the summary's headings or the comments can't be placed
+SECTION_REGENERATE_PROMPT = """You are given one section of an AI-generated summary of a conversation between a product manager and a client, reviewer comments on that section, and the parts of the conversation relevant to it.
+
+Rewrite this section so that it addresses every comment. Change only what the comments ask for and keep the rest as it is.
+Start with the section heading exactly as given (in bold and underline, not as a header in markdown, with a new line after it) and do not write any other section.
+
+---
+SECTION:
+{section}
+
+---
+REVIEWER COMMENTS:
+{comments}
+
+---
+RELEVANT CONVERSATION:
+{transcript}
+
+---
+Now write the improved section:
+"""
+
+# Long transcripts are summarized map-reduce style: each chunk of turns is
+# condensed into notes (map), then the notes are written up under the
+# SUMMARIZE_PROMPT headings (reduce)
+CHUNK_NOTES_PROMPT = """You are given one part of a longer conversation between a product manager and a client (part {part} of {parts}).
+
+Write concise notes of every fact, decision, requirement, constraint and open question in this part, grouped under these headings (skip headings with nothing to report):
+High-level goals/business objectives; Functional & non-functional capabilities/features; Technical considerations; Requirements/constraints; Teams/team members; Project assumptions; Project deliverables
+
+Keep names, numbers and the client's own wording. Do not invent anything.
+
+CONVERSATION PART:
+{chunk}
+"""
+
+REDUCE_PROMPT = """{summarize_prompt}
 
+The conversation was too long to include in full. Below are notes taken from each consecutive part of it, in order. Later parts take precedence when they contradict earlier ones.
+
+NOTES:
+{notes}
+"""
+
+SUMMARY_MODEL = DEFAULT_MODEL
+SUMMARY_TEMPERATURE = 0.5
+# Bumped automatically whenever a prompt or the model changes
+SUMMARY_PROMPT_VERSION = hashlib.sha256(
+    f"{SUMMARY_MODEL}\n{SUMMARIZE_PROMPT}\n{CHUNK_NOTES_PROMPT}\n{REDUCE_PROMPT}".encode("utf-8")
+).hexdigest()[:12]
+
+# Transcripts longer than this (estimated tokens) are summarized in chunks
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "6000"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+# Budget (estimated tokens) for the transcript excerpt sent with each section
+SECTION_CONTEXT_TOKENS = int(os.getenv("SECTION_CONTEXT_TOKENS", "3000"))
+_chunk_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary-chunk")
+
+# Summaries and regenerations run here, off the request threads. Identical
+# requests (same session and input) share one job while it runs.
+SUMMARY_JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS", "4"))
+SUMMARY_JOB_QUEUE_MAX = int(os.getenv("SUMMARY_JOB_QUEUE_MAX", "16"))
+# Synchronous requests wait this long for their job, then get 202 + job id like async ones
+SUMMARY_JOB_WAIT_SECONDS = float(os.getenv("SUMMARY_JOB_WAIT", "20"))
+summary_jobs = JobQueue("summary", workers=SUMMARY_JOB_WORKERS, max_pending=SUMMARY_JOB_QUEUE_MAX,
+                        store=JobStore(supabase.storage.from_("transcripts")))
+
+# In-process copy of recent content-addressed summaries (key -> text)
+_summary_cache = OrderedDict()
+_summary_cache_lock = threading.Lock()
+SUMMARY_CACHE_ENTRIES = 128
+
+# Helper functions for doing summary editing
+def _fetch_transcript(session_id: str):
+    """Load a transcript (read-through the session cache). Returns (messages, error_response)."""
     try:
-        messages = json.loads(transcript_text)
-        formatted = "\n".join(
-            f"{'AI' if m['role'] == 'bot' else 'Client'}: {m['message']}"
-            for m in messages
-        )
-        return formatted, None
+        messages = session_cache.read(session_id)
     except Exception as e:
         return None, (jsonify({"detail": f"Failed to parse transcript: {e}"}), 500)
+    if messages is None:
+        return None, (jsonify({"detail": f"Transcript not found for session {session_id}"}), 404)
+    return messages, None
 
 
-def _call_llm(prompt: str) -> tuple[str | None, tuple | None]:
+def _format_transcript(messages: list) -> str:
+    return "\n".join(
+        f"{'AI' if m['role'] == 'bot' else 'Client'}: {m['message']}"
+        for m in messages
+    )
+
+
+def _format_comments(comments: list) -> str:
+    return "\n".join(
+        f"{i + 1}. Highlighted: \"{c.get('highlightedText', '')}\"\n   Comment: {c.get('comment', '')}"
+        for i, c in enumerate(comments)
+    )
+
+
+def _submit(fn, *args):
+    """Run fn on the chunk executor in the caller's context (app context included)"""
+    return _chunk_executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _split_turns(messages: list, max_tokens: int) -> list:
+    """
+    Split a transcript into chunks of whole turns (a client message plus the
+    replies to it) of roughly max_tokens each. Chunks are cut greedily from
+    the start, so appending turns only ever changes the last chunk.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for turn in summary_sections.split_turns(messages):
+        tokens = estimate_tokens(_format_transcript(turn))
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.extend(turn)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _summarize_chunk(session_id: str, part: int, parts: int, chunk_text: str):
+    """Notes for one chunk, from the content-addressed cache when possible. Returns (notes, error_response)."""
+    # Part numbers are left out of the key so a chunk's notes survive the transcript growing
+    key = "chunk-" + _summary_cache_key(chunk_text)
+    cached = _get_cached_summary(key)
+    if cached is not None:
+        return cached, None
+    notes, err = _call_llm(CHUNK_NOTES_PROMPT.format(part=part, parts=parts, chunk=chunk_text),
+                           session_id, name="summarize_chunk")
+    if err:
+        return None, err
+    _put_cached_summary(key, notes)
+    return notes, None
+
+
+def _map_reduce_summary(session_id: str, messages: list):
+    """Summarize a long transcript chunk by chunk in parallel, then merge. Returns (summary, error_response)."""
+    chunks = [_format_transcript(chunk) for chunk in _split_turns(messages, SUMMARY_CHUNK_TOKENS)]
+    log.debug("Map-reduce summary for session %s: %s chunks", session_id, len(chunks))
+    futures = [
+        _submit(_summarize_chunk, session_id, i + 1, len(chunks), chunk)
+        for i, chunk in enumerate(chunks)
+    ]
+    notes = []
+    for i, future in enumerate(futures):
+        chunk_notes, err = future.result()
+        if err:
+            return None, err
+        notes.append(f"--- Part {i + 1} of {len(chunks)} ---\n{chunk_notes}")
+
+    reduce_prompt = REDUCE_PROMPT.format(summarize_prompt=SUMMARIZE_PROMPT, notes="\n\n".join(notes))
+    return _call_llm(reduce_prompt, session_id, name="summarize_reduce")
+
+
+def _regenerate_section(session_id: str, messages: list, section: dict, comments: list):
+    """
+    Rewrite one section for its comments.
+
+    Returns:
+        (section_text, error_response); section_text is None if the model
+        answered with more than that one section
+    """
+    excerpt = summary_sections.relevant_turns(messages, section, comments, SECTION_CONTEXT_TOKENS)
+    prompt = SECTION_REGENERATE_PROMPT.format(
+        section=section["text"].strip(),
+        comments=_format_comments(comments),
+        transcript=_format_transcript(excerpt),
+    )
+    text, err = _call_llm(prompt, session_id, name="regenerate_section")
+    if err:
+        return None, err
+    text = summary_sections.extract_section(text, section)
+    if text is None:
+        log.warning("Rewrite of section %s for session %s contained other sections", section["key"], session_id)
+        return None, None
+    # Keep the spacing that separated this section from the next one
+    original = section["text"]
+    return text + original[len(original.rstrip()):], None
+
+
+def _regenerate_sections(session_id: str, messages: list, summary: str, comments: list):
+    """
+    Regenerate only the sections that comments point at, in parallel, and
+    stitch the others back unchanged.
+
+    Returns:
+        (new_summary, section keys regenerated, error_response); None if
+        the summary has no recognisable sections, a comment can't be placed
+        or a rewrite wasn't a single section (the whole summary is then
+        rewritten instead)
+    """
+    parsed = summary_sections.parse(summary)
+    if parsed is None:
+        return None
+    preamble, sections = parsed
+    assigned = summary_sections.assign_comments(summary, sections, comments)
+    if assigned is None:
+        return None
+
+    futures = {
+        section["key"]: _submit(_regenerate_section, session_id, messages, section, assigned[section["key"]])
+        for section in sections if section["key"] in assigned
+    }
+    rewritten = {}
+    for key, future in futures.items():
+        text, err = future.result()
+        if err:
+            return None, None, err
+        if text is None:
+            return None
+        rewritten[key] = text
+    new_summary = preamble + "".join(rewritten.get(s["key"], s["text"]) for s in sections)
+    return new_summary, list(rewritten), None
+
+
+def _call_llm(prompt: str, session_id: str = None, name: str = "summarize") -> tuple[str | None, tuple | None]:
     """Invoke Gemini with a raw prompt string. Returns (text, error_response)."""
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-flash-latest", temperature=0.5)
-        response = llm.invoke([prompt])
+        llm = get_llm(SUMMARY_MODEL, SUMMARY_TEMPERATURE)
+        response = llm_metrics.invoke(llm, [prompt], name=name, session_id=session_id)
         text = response.content
         if not isinstance(text, str):
             text = text[0]["text"]
@@ -90,8 +302,51 @@ def _call_llm(prompt: str) -> tuple[str | None, tuple | None]:
         return None, (jsonify({"detail": f"LLM call failed: {e}"}), 500)
 
 
+def _summary_cache_key(formatted_transcript: str) -> str:
+    """Content address of a summary: hash of the formatted transcript plus the prompt version"""
+    digest = hashlib.sha256(formatted_transcript.encode("utf-8")).hexdigest()
+    return f"{SUMMARY_PROMPT_VERSION}-{digest}"
+
+
+def _remember_summary(key: str, summary_text: str):
+    with _summary_cache_lock:
+        _summary_cache[key] = summary_text
+        _summary_cache.move_to_end(key)
+        while len(_summary_cache) > SUMMARY_CACHE_ENTRIES:
+            _summary_cache.popitem(last=False)
+
+
+def _get_cached_summary(key: str):
+    """Look up a summary by content address, in memory first, then in storage"""
+    with _summary_cache_lock:
+        if key in _summary_cache:
+            _summary_cache.move_to_end(key)
+            return _summary_cache[key]
+    try:
+        round_trips.record("storage")
+        summary_text = supabase.storage.from_("transcripts").download(f"summaries/cache/{key}.txt").decode("utf-8")
+    except Exception:
+        return None
+    _remember_summary(key, summary_text)
+    return summary_text
+
+
+def _put_cached_summary(key: str, summary_text: str):
+    _remember_summary(key, summary_text)
+    try:
+        round_trips.record("storage")
+        supabase.storage.from_("transcripts").upload(
+            f"summaries/cache/{key}.txt",
+            summary_text.encode("utf-8"),
+            {"content-type": "text/plain", "upsert": "true"},
+        )
+    except Exception as e:
+        log.warning("Failed to store summary cache entry %s: %s", key, e)
+
+
 def _upload_summary(session_id: str, summary_text: str):
     """Upload summary text to Supabase storage."""
+    round_trips.record("storage")
     supabase.storage.from_("transcripts").upload(
         f"summaries/{session_id}.txt",
         summary_text.encode("utf-8"),
@@ -99,56 +354,142 @@ def _upload_summary(session_id: str, summary_text: str):
     )
 
 
-def save_summary_iteration(session_id: str, iteration: int, summary_text: str, comments: list = None):
+def save_summary_iteration(session_id: str, summary_text: str, comments: list = None, source: str = "regenerate"):
     """
-    Save a versioned summary iteration to Supabase.
-    TODO: implement full versioning storage.
+    Save a versioned summary iteration (with the comments that produced it)
+    to the session's summary history. History is best-effort: a failure is
+    logged and the summary itself is still returned.
+    Returns the iteration's index entry, or None if it could not be saved.
     """
-    pass
+    try:
+        return summary_history.save(session_id, summary_text, comments=comments, source=source)
+    except Exception as e:
+        log.warning("Failed to save summary iteration for %s: %s", session_id, e)
+        return None
 
 def save_final_summary(session_id: str, summary_text: str) -> str:
     """
     Save the user-approved final summary as a markdown file.
-    Uses a _final suffix so it's never overwritten by draft regenerations.
+    Uses a _final suffix so it's never overwritten by draft regenerations,
+    and replaces the session's summary in the search index.
     Returns the public URL.
     """
     file_name = f"summaries/{session_id}_final.md"
+    round_trips.record("storage")
     supabase.storage.from_("transcripts").upload(
         file_name,
         summary_text.encode("utf-8"),
         {"content-type": "text/markdown", "upsert": "true"},
     )
     public_url = supabase.storage.from_("transcripts").get_public_url(file_name)
-    print(f"[DEBUG] [save_final_summary] Saved for session {session_id} at {public_url}")
+    search_index.index_summary(session_id, summary_text)
+    log.info("save_final_summary: saved for session %s at %s", session_id, public_url)
     return public_url
 
 
+def _wants_async(body: dict) -> bool:
+    """Whether the client asked for 202 + job id (Prefer: respond-async or ?async=true)"""
+    return ("respond-async" in request.headers.get("Prefer", "")
+            or request.args.get("async", "").lower() in ("1", "true", "yes")
+            or body.get("async") is True)
+
+
+def _as_job(fn):
+    """Adapt a function returning a view response into a job returning (body, status)"""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            response = app.make_response(fn())
+            return response.get_json(), response.status_code
+    return run
+
+
+def _run_job(kind: str, session_id: str, key: str, fn, run_async: bool):
+    """
+    Run fn on the summary job queue.
+
+    Async: answer 202 with the job id right away; the client polls
+    GET /api/summarize/jobs/<job_id>. Otherwise wait up to
+    SUMMARY_JOB_WAIT_SECONDS for the job and return its response as before,
+    falling back to the 202 answer if it is still running, so a slow LLM call
+    never holds a request worker for long.
+    """
+    try:
+        job, created = summary_jobs.submit(kind, _as_job(fn), key=key, session_id=session_id)
+    except QueueFull as e:
+        return jsonify({"detail": str(e)}), 503, {"Retry-After": "5"}
+    if not created:
+        log.debug("Joined running %s job %s for session %s", kind, job.id, session_id)
+
+    if not run_async and job.wait(SUMMARY_JOB_WAIT_SECONDS):
+        return jsonify(job.result), job.status_code
+    status_url = url_for("summarize.get_summary_job", job_id=job.id)
+    return jsonify({"job_id": job.id, "status": job.status, "status_url": status_url,
+                    "deduplicated": not created}), 202, {"Location": status_url}
+
+
 # Routes
 
 @summarize_bp.route("/summarize/<session_id>", methods=["POST"])
 def summarize_transcript(session_id):
-    """Generate initial summary from transcript"""
-    formatted, err = _fetch_and_format_transcript(session_id)
-    if err:
-        return err
+    """
+    Generate initial summary from transcript.
 
-    full_prompt = f"{SUMMARIZE_PROMPT}\n\nTRANSCRIPT:\n{formatted}"
-    summary_text, err = _call_llm(full_prompt)
-    if err:
-        return err
+    Summaries are cached by transcript content and prompt version, so an
+    unchanged transcript returns the stored summary without an LLM call.
+    Pass ?force=true (or {"force": true} in the body) to regenerate anyway.
 
-    try:
-        _upload_summary(session_id, summary_text)
-    except Exception as e:
-        return jsonify({"detail": f"Failed to upload summary: {e}"}), 500
+    With Prefer: respond-async (or ?async=true), a summary that needs the LLM
+    is answered with 202 and a job id instead; see get_summary_job. Without
+    it, a summary not ready within SUMMARY_JOB_WAIT seconds gets that 202 too.
+    """
+    body = request.get_json(silent=True) or {}
+    force = request.args.get("force", "").lower() in ("1", "true", "yes") or body.get("force") is True
 
-    return jsonify({"session_id": session_id, "summary": summary_text})
+    messages, err = _fetch_transcript(session_id)
+    if err:
+        return err
+    formatted = _format_transcript(messages)
+
+    cache_key = _summary_cache_key(formatted)
+    if not force:
+        cached = _get_cached_summary(cache_key)
+        if cached is not None:
+            log.debug("Summary cache hit for session %s", session_id)
+            return jsonify({"session_id": session_id, "summary": cached, "cached": True})
+
+    def run():
+        if estimate_tokens(formatted) > SUMMARY_CHUNK_TOKENS:
+            summary_text, err = _map_reduce_summary(session_id, messages)
+        else:
+            full_prompt = f"{SUMMARIZE_PROMPT}\n\nTRANSCRIPT:\n{formatted}"
+            summary_text, err = _call_llm(full_prompt, session_id)
+        if err:
+            return err
+
+        try:
+            _upload_summary(session_id, summary_text)
+        except Exception as e:
+            return jsonify({"detail": f"Failed to upload summary: {e}"}), 500
+        _put_cached_summary(cache_key, summary_text)
+        entry = save_summary_iteration(session_id, summary_text, source="summarize")
+
+        return jsonify({"session_id": session_id, "summary": summary_text, "cached": False,
+                        "iteration": entry and entry["iteration"]})
+
+    return _run_job("summarize", session_id, f"summarize:{session_id}:{cache_key}", run, _wants_async(body))
 
 @summarize_bp.route("/summarize/<session_id>/regenerate", methods=["POST"])
 def regenerate_summary(session_id):
     """
     Regenerate summary using the original summary + reviewer comments.
 
+    Only the heading sections that comments highlight are rewritten (in
+    parallel, each with the relevant part of the transcript); the rest of
+    the summary is kept as is. If the headings or a comment's highlighted
+    text can't be found, the whole summary is rewritten instead.
+
     Expected request body:
     {
         "summary": "...the current summary text...",
@@ -161,6 +502,10 @@ def regenerate_summary(session_id):
             ...
         ]
     }
+
+    With Prefer: respond-async (or ?async=true), answers 202 with a job id;
+    see get_summary_job. Without it, answers 202 as well once the job has
+    run for SUMMARY_JOB_WAIT seconds.
     """
     body = request.get_json(silent=True) or {}
     original_summary = body.get("summary", "").strip()
@@ -172,36 +517,52 @@ def regenerate_summary(session_id):
         return jsonify({"detail": "No comments provided"}), 400
 
     # Fetch transcript
-    formatted_transcript, err = _fetch_and_format_transcript(session_id)
+    messages, err = _fetch_transcript(session_id)
     if err:
         return err
-
-    # Format comments for the prompt
-    formatted_comments = "\n".join(
-        f"{i + 1}. Highlighted: \"{c.get('highlightedText', '')}\"\n   Comment: {c.get('comment', '')}"
-        for i, c in enumerate(comments)
-    )
-
-    full_prompt = REGENERATE_PROMPT.format(
-        transcript=formatted_transcript,
-        summary=original_summary,
-        comments=formatted_comments,
-    )
-
-    new_summary, err = _call_llm(full_prompt)
-    if err:
-        return err
-
-    # Upload the new summary (overwrites previous)
-    try:
-        _upload_summary(session_id, new_summary)
-    except Exception as e:
-        return jsonify({"detail": f"Failed to upload regenerated summary: {e}"}), 500
-
-    # Stub: save this iteration for audit/history
-    save_summary_iteration(session_id, iteration=1, summary_text=new_summary, comments=comments)
-
-    return jsonify({"session_id": session_id, "summary": new_summary})
+    formatted_transcript = _format_transcript(messages)
+
+    def run():
+        sectioned = _regenerate_sections(session_id, messages, original_summary, comments)
+        if sectioned is not None:
+            new_summary, sections, err = sectioned
+        else:
+            full_prompt = REGENERATE_PROMPT.format(
+                transcript=formatted_transcript,
+                summary=original_summary,
+                comments=_format_comments(comments),
+            )
+            new_summary, err = _call_llm(full_prompt, session_id, name="regenerate")
+            sections = None
+        if err:
+            return err
+
+        # Upload the new summary (overwrites previous)
+        try:
+            _upload_summary(session_id, new_summary)
+        except Exception as e:
+            return jsonify({"detail": f"Failed to upload regenerated summary: {e}"}), 500
+
+        entry = save_summary_iteration(session_id, new_summary, comments=comments)
+
+        return jsonify({"session_id": session_id, "summary": new_summary,
+                        "iteration": entry and entry["iteration"], "regenerated_sections": sections})
+
+    request_input = json.dumps([session_id, formatted_transcript, original_summary, comments], sort_keys=True)
+    key = "regenerate:" + hashlib.sha256(request_input.encode("utf-8")).hexdigest()
+    return _run_job("regenerate", session_id, key, run, _wants_async(body))
+
+@summarize_bp.route("/summarize/jobs/<job_id>", methods=["GET"])
+def get_summary_job(job_id):
+    """
+    Status of a summarize/regenerate job: queued, running, succeeded or failed.
+    Once finished, "result" holds the body the synchronous request would have
+    returned and "status_code" its HTTP status.
+    """
+    job = summary_jobs.get(job_id)
+    if job is None:
+        return jsonify({"detail": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict()), 200
 
 @summarize_bp.route("/summarize/<session_id>/approve", methods=["POST"])
 def approve_summary(session_id):
@@ -223,5 +584,36 @@ def approve_summary(session_id):
         public_url = save_final_summary(session_id, summary_text)
     except Exception as e:
         return jsonify({"detail": f"Failed to save final summary: {e}"}), 500
+    entry = save_summary_iteration(session_id, summary_text, source="approve")
+
+    return jsonify({"session_id": session_id, "summary_url": public_url,
+                    "iteration": entry and entry["iteration"]})
+
+
+@summarize_bp.route("/summarize/<session_id>/history", methods=["GET"])
+def list_summary_history(session_id):
+    """
+    Iterations of a session's summary, newest first, without their text.
 
-    return jsonify({"session_id": session_id, "summary_url": public_url})
+    Query params: limit (default 20, max 100) and before (next_cursor from
+    the previous page). Returns {"iterations", "next_cursor", "count"}.
+    """
+    limit = max(1, min(request.args.get("limit", default=20, type=int), 100))
+    before = request.args.get("before", type=int)
+    try:
+        entries, next_cursor, count = summary_history.list(session_id, before=before, limit=limit)
+    except Exception as e:
+        return jsonify({"detail": f"Failed to read summary history: {e}"}), 500
+    return jsonify({"session_id": session_id, "iterations": entries, "next_cursor": next_cursor, "count": count})
+
+
+@summarize_bp.route("/summarize/<session_id>/history/<int:iteration>", methods=["GET"])
+def get_summary_iteration(session_id, iteration):
+    """One iteration of a session's summary: full text plus the comments that produced it"""
+    try:
+        version = summary_history.get(session_id, iteration)
+    except Exception as e:
+        return jsonify({"detail": f"Failed to read summary history: {e}"}), 500
+    if version is None:
+        return jsonify({"detail": f"Iteration {iteration} not found for session {session_id}"}), 404
+    return jsonify({"session_id": session_id, **version})
@@ -1,25 +1,37 @@
 from flask import Blueprint, request, jsonify
 from services.supabase_client import supabase
+from services import round_trips
+from services.log import get_logger
+from services.roster_cache import roster_cache
 
 teams_bp = Blueprint("teams", __name__)
+log = get_logger(__name__)
 
 VALID_TEAMS = {"Frontend", "Backend", "Design", "Business", "DevOps", "QA"}
 
 
 @teams_bp.route("/teams/members", methods=["GET"])
 def get_all_members():
-    """Get all team members, optionally filtered by team."""
-    team = request.args.get("team")
+    """
+    Get all team members, optionally filtered by team.
+
+    Served from the roster cache; responses carry an ETag (and Last-Modified
+    once the roster has been edited), so conditional requests get a 304.
+    """
+    team = request.args.get("team") or None
+    if team and team not in VALID_TEAMS:
+        return jsonify({"error": f"Invalid team '{team}'"}), 400
     try:
-        query = supabase.table("team_members").select("*").order("name")
-        if team:
-            if team not in VALID_TEAMS:
-                return jsonify({"error": f"Invalid team '{team}'"}), 400
-            query = query.eq("team", team)
-        response = query.execute()
-        return jsonify(response.data), 200
+        members, etag, last_modified = roster_cache.get(team)
+        response = jsonify(members)
+        response.set_etag(etag, weak=True)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        # Let browsers keep a copy but revalidate it on every use
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
-        print(f"[ERROR] get_all_members: {e}")
+        log.error("get_all_members: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -38,15 +50,17 @@ def add_member():
         return jsonify({"error": f"Invalid team '{team}'"}), 400
 
     try:
+        round_trips.record("db")
         response = supabase.table("team_members").insert({
             "team": team,
             "name": name,
             "role": role,
             "email": email,
         }).execute()
+        roster_cache.invalidate(team)
         return jsonify(response.data[0] if response.data else {}), 201
     except Exception as e:
-        print(f"[ERROR] add_member: {e}")
+        log.error("add_member: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -66,6 +80,7 @@ def update_member(member_id):
         return jsonify({"error": "No fields to update"}), 400
 
     try:
+        round_trips.record("db")
         response = (
             supabase.table("team_members")
             .update(updates)
@@ -74,9 +89,11 @@ def update_member(member_id):
         )
         if not response.data:
             return jsonify({"error": "Member not found"}), 404
+        # A member moved to another team also leaves their old team's list
+        roster_cache.invalidate(*(VALID_TEAMS if "team" in updates else (response.data[0]["team"],)))
         return jsonify(response.data[0]), 200
     except Exception as e:
-        print(f"[ERROR] update_member: {e}")
+        log.error("update_member: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -84,6 +101,7 @@ def update_member(member_id):
 def delete_member(member_id):
     """Delete a team member."""
     try:
+        round_trips.record("db")
         response = (
             supabase.table("team_members")
             .delete()
@@ -92,7 +110,8 @@ def delete_member(member_id):
         )
         if not response.data:
             return jsonify({"error": "Member not found"}), 404
+        roster_cache.invalidate(response.data[0]["team"])
         return jsonify({"success": True}), 200
     except Exception as e:
-        print(f"[ERROR] delete_member: {e}")
+        log.error("delete_member: %s", e)
         return jsonify({"error": str(e)}), 500
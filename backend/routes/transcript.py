@@ -1,14 +1,29 @@
-# In-memory storage for chat transcriptions
-# Upload to Supabase when session ends
-
-import uuid
-from collections import defaultdict
-import os
-import json
-from services.supabase_client import upload_transcript_to_storage, save_session_to_db, get_session
+# Chat transcripts: reads go through the session cache, and every write goes
+# through TranscriptUnitOfWork (queued on the cache, flushed to storage in the
+# background)
+
+from contextlib import ExitStack
+from services.supabase_client import create_session, get_session, session_exists
+from services.transcript_store import transcript_store
+from services.session_cache import session_cache
+from services import round_trips, tracing
+from services.session_locks import session_locks
+from services.title_store import title_store
+from services.session_index import session_index
+from services.search_index import search_index
+from services.log import SAMPLED, get_logger
+
+log = get_logger(__name__)
+
+def _format_message(role: str, message: str, selected_option: str = None) -> dict:
+    # For section responses, use the message directly (already formatted on frontend)
+    # For simple selections, just save the selected option
+    formatted_message = message
+    if selected_option and not message.startswith('A:'):
+        # This is a simple option selection, not section responses
+        formatted_message = selected_option
 
-# Global dict to store session titles
-session_titles = {}
+    return {"role": role, "message": formatted_message}
 
 def get_transcript(session_id: str) -> list:
     """
@@ -18,85 +33,102 @@ def get_transcript(session_id: str) -> list:
     Returns:
         list containing transcript; empty if not there
     """
-    from services.supabase_client import supabase  # local import to avoid circular deps
+    cached = session_cache.get(session_id)
+    if cached is not None:
+        return cached
 
-    session = get_session(session_id)
-    if not session:
+    if not session_exists(session_id):
         return []
 
-    file_name = f"transcripts/{session_id}.json"
     try:
-        existing = supabase.storage.from_("transcripts").download(file_name)
-        return json.loads(existing.decode("utf-8"))
+        return session_cache.read(session_id) or []
     except Exception as e:
-        print(f"[WARNING] Could not load transcript for {session_id}: {e}")
+        log.warning("Could not load transcript for %s: %s", session_id, e)
         return []
 
-def get_transcript_with_update(session_id: str, role: str, message: str, question: str = None, selected_option: str = None, title: str = None) -> list:
-    transcript = get_transcript(session_id)
-    # For section responses, use the message directly (already formatted on frontend)
-    # For simple selections, just save the selected option
-    formatted_message = message
-    if selected_option and not message.startswith('A:'):
-        # This is a simple option selection, not section responses
-        formatted_message = selected_option
-
-    # Append new message dictionary
-    message_dictionary = {"role": role, "message": formatted_message}
-    transcript.append(message_dictionary)
-    return transcript
-
-def add_message(session_id: str, role: str, message: str, question: str = None, selected_option: str = None, title: str = None):
+class TranscriptUnitOfWork:
     """
-    Args:
-        session_id:
-        role: either "user" or "bot"
-        message: 
-        question: The question being answered (optional, for selections)
-        selected_option: The option that was selected (optional)
-
-    Returns:
-        transcript with the new message
+    Loads a session's row and transcript once, applies new messages in memory,
+    and persists them in a single commit. The session is locked for the whole
+    block, so concurrent turns for one session run one after the other (in
+    this worker) and each sees the previous one's messages.
+
+    Usage:
+        with TranscriptUnitOfWork(session_id) as uow:
+            uow.add("user", user_query)
+            ...
+            uow.add("bot", reply)
+            uow.commit(title=title)
+        uow.round_trips  # storage/DB calls made during the block
+
+    Raises SessionBusy on entry if the session stays locked for SESSION_LOCK_TIMEOUT.
     """
-    print("ARGS:", session_id, role, message, question, selected_option, title)
-    transcript = get_transcript(session_id)
-    # For section responses, use the message directly (already formatted on frontend)
-    # For simple selections, just save the selected option
-    formatted_message = message
-    if selected_option and not message.startswith('A:'):
-        # This is a simple option selection, not section responses
-        formatted_message = selected_option
 
-    # Append new message dictionary
-    message_dictionary = {"role": role, "message": formatted_message}
-    transcript.append(message_dictionary)
-
-    already_exists, transcript_url, _ = upload_transcript_to_storage(session_id, [])
-    print(f"[DEBUG] Already exists? {already_exists}")
-    overwrite_transcript(session_id, transcript)
-    
-    # Create the DB record on first message
-    if not already_exists:
-        print(f"[DEBUG] Does not already exist")
-        print(f"[DEBUG] add_message: Title is {title}")
-        file_name = f"transcripts/{session_id}.json"
-        from services.supabase_client import supabase
-        public_url = supabase.storage.from_("transcripts").get_public_url(file_name)
-        save_session_to_db(session_id, public_url, title=title)
-
-    return transcript
-    
-    # print(f"[DEBUG] Added message {message_dictionary} to session {session_id}")
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.session = None
+        self.created = False  # True if commit() created the sessions row
+        self.transcript = []
+        self.pending = []
+        self.round_trips = {}
+        self.context_stats = {}
+        self._counter = None
+        self._stack = None
+
+    def __enter__(self):
+        with ExitStack() as stack:
+            with tracing.span("session.lock"):
+                stack.enter_context(session_locks.hold(self.session_id))
+            self._counter = stack.enter_context(round_trips.track())
+            self.load()
+            self._stack = stack.pop_all()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.round_trips = self._counter.as_dict()
+        self._stack.__exit__(exc_type, exc, tb)
+        log.debug("Round trips for session %s: %s", self.session_id, self.round_trips, extra=SAMPLED)
+        return False
+
+    def load(self):
+        # Not from the "missing" cache: commit() creates the row when there is none
+        self.session = get_session(self.session_id, fresh=True)
+        # A session without a DB row starts from an empty transcript, as in get_transcript
+        self.transcript = []
+        if self.session:
+            try:
+                # Checked against the store: another worker may have added turns
+                self.transcript = session_cache.read(self.session_id, fresh=True) or []
+            except Exception as e:
+                log.warning("Could not load transcript for %s: %s", self.session_id, e)
+
+    def add(self, role: str, message: str, selected_option: str = None) -> dict:
+        """Append a message in memory; nothing is written until commit()"""
+        message_dictionary = _format_message(role, message, selected_option)
+        self.transcript.append(message_dictionary)
+        self.pending.append(message_dictionary)
+        return message_dictionary
+
+    def commit(self, title: str = None, user_id: str = None):
+        """Queue pending messages as one append, and create the DB row for new sessions"""
+        if self.pending:
+            # Written to storage by the session cache's background flusher
+            session_cache.append(self.session_id, self.pending, transcript=self.transcript)
+            self.pending = []
+
+        if not self.session:
+            log.debug("TranscriptUnitOfWork: creating session %s with title %s", self.session_id, title)
+            self.session, self.created = create_session(
+                self.session_id, transcript_store.public_url(self.session_id), user_id=user_id, title=title)
 
 def save_transcript(session_id: str, user_id: str = None, title: str = None):
-    from services.supabase_client import supabase
-
-    file_name = f"transcripts/{session_id}.json"
-    transcript_url = supabase.storage.from_("transcripts").get_public_url(file_name)
+    # Session end: make sure everything queued for this session is in storage
+    session_cache.flush(session_id)
+    transcript_url = transcript_store.public_url(session_id)
 
-    session = get_session(session_id)
+    session = get_session(session_id, fresh=True)
     if not session:
-        session = save_session_to_db(session_id, transcript_url, user_id=user_id, title=title)
+        session, _ = create_session(session_id, transcript_url, user_id=user_id, title=title)
     
     return {
         "session_id": session_id,
@@ -105,36 +137,23 @@ def save_transcript(session_id: str, user_id: str = None, title: str = None):
     }
     
     
-def overwrite_transcript(session_id: str, transcript: list):
-    from services.supabase_client import supabase
-
-    file_name = f"transcripts/{session_id}.json"
-    content = json.dumps(transcript, indent=2).encode("utf-8")
-    supabase.storage.from_("transcripts").upload(
-        file_name,
-        content,
-        {"content-type": "application/json", "upsert": "true"},
-    )
-    print(f"[DEBUG] Transcript overwritten for session {session_id}")
-
-
 def delete_session(session_id: str):
     # TODO: Also delete from DB
-    from services.supabase_client import supabase
-
-    file_name = f"transcripts/{session_id}.json"
+    session_index.discard(session_id)
+    search_index.delete_session(session_id)
     try:
-        supabase.storage.from_("transcripts").remove([file_name])
-        print(f"[DEBUG] Deleted transcript file for session {session_id}")
+        session_cache.discard(session_id)
+        transcript_store.delete(session_id)
+        log.info("Deleted transcript file for session %s", session_id)
     except Exception as e:
-        print(f"[WARNING] Could not delete transcript file: {e}")
+        log.warning("Could not delete transcript file: %s", e)
 
 def get_session_title(session_id: str):
-    """Get the title for a session"""
-    return session_titles.get(session_id)
+    """Get the title for a session (local cache, then sessions.title)"""
+    return title_store.get(session_id)
 
 
-def set_session_title(session_id: str, title: str):
-    """Set the title for a session"""
-    session_titles[session_id] = title
-    print(f"[DEBUG] Set session title: {session_id} -> {title}")
\ No newline at end of file
+def set_session_title(session_id: str, title: str, provisional: bool = False):
+    """Cache the title for a session; provisional (fallback) titles expire quickly"""
+    title_store.remember(session_id, title, provisional=provisional)
+    log.debug("Set session title: %s -> %s", session_id, title)
\ No newline at end of file
@@ -0,0 +1,225 @@
+# Rolling compaction of the session history sent to run_chat
+#
+# Short sessions are passed through verbatim. Once the history is over the
+# token budget, the last CONTEXT_KEEP_TURNS turns stay verbatim and older
+# messages are folded into a digest that keeps every question the AI asked
+# (grouped by discovery stage) and the client's answers. The questions are
+# kept word for word, so the stage keywords in format_instructions still
+# match and already-answered questions are not asked again.
+#
+# Each session's digest is stored with its transcript
+# (transcripts/<session_id>/context.json: the digest plus how many messages
+# it covers) and extended incrementally as the conversation grows, so a
+# worker that has not seen the session, or has restarted, picks it up
+# instead of re-folding the whole transcript. A bounded in-process map caches
+# the stored copies; writes go out on a background thread, off the request
+# path. A stored digest whose last folded message no longer matches the
+# transcript (the transcript was rewritten) is rebuilt from scratch.
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+COMPACTION_ENABLED = os.getenv("CONTEXT_COMPACTION", "on").lower() not in ("0", "off", "false", "no")
+TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+MAX_ANSWER_CHARS = int(os.getenv("CONTEXT_MAX_ANSWER_CHARS", "600"))
+MAX_DIGESTS = 512
+DIGEST_VERSION = 1
+
+# Same stage keywords the prompt uses for stage detection
+STAGES = [
+    ("Problem Definition", ["What is the specific problem you want to solve", "What is the scope of the problem"]),
+    ("Functional Requirements", ["What kind of features", "mission-critical features"]),
+    ("Technical Requirements", ["What is our budget", "tech stack"]),
+    ("Logistics", ["in scope/out of scope", "deliverables"]),
+    ("Team", ["team members", "teams involved"]),
+]
+
+_QUESTION_LINE = re.compile(r"^\s*(\d+\.\s+|[-*]\s+)?.*\?[*_\s]*$")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _format_messages(messages: list) -> str:
+    # Same representation run_chat received before compaction existed
+    return str(messages)
+
+
+def _fingerprint(message: dict) -> str:
+    return hashlib.sha1(json.dumps(message, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class _Digest:
+    def __init__(self):
+        self.upto = 0            # number of transcript messages folded in
+        self.last = None         # fingerprint of the last message folded in
+        self.stage = "Kickoff"
+        self.sections = OrderedDict()
+        self.stored_upto = 0     # upto of the copy in storage
+
+    def to_dict(self) -> dict:
+        return {"version": DIGEST_VERSION, "upto": self.upto, "last": self.last, "stage": self.stage,
+                "sections": [[stage, list(entries)] for stage, entries in self.sections.items()]}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """A stored digest, or None if it was written in another format"""
+        if not data or data.get("version") != DIGEST_VERSION:
+            return None
+        digest = cls()
+        digest.upto = digest.stored_upto = data["upto"]
+        digest.last = data.get("last")
+        digest.stage = data["stage"]
+        digest.sections = OrderedDict((stage, entries) for stage, entries in data["sections"])
+        return digest
+
+    def matches(self, transcript: list) -> bool:
+        """Whether the messages this digest covers are still the transcript's first ones"""
+        if self.upto > len(transcript):
+            return False
+        return self.upto == 0 or self.last == _fingerprint(transcript[self.upto - 1])
+
+    def fold(self, messages: list):
+        for message in messages:
+            text = message.get("message") or ""
+            if message.get("role") == "bot":
+                self._fold_bot(text)
+            else:
+                answer = text.strip()
+                if len(answer) > MAX_ANSWER_CHARS:
+                    answer = answer[:MAX_ANSWER_CHARS] + "..."
+                if answer:
+                    self.sections.setdefault(self.stage, []).append(f"Client: {answer}")
+        self.upto += len(messages)
+        if messages:
+            self.last = _fingerprint(messages[-1])
+
+    def _fold_bot(self, text: str):
+        lowered = text.lower()
+        for stage, keywords in STAGES:
+            if any(keyword.lower() in lowered for keyword in keywords):
+                self.stage = stage
+        for line in text.splitlines():
+            if _QUESTION_LINE.match(line):
+                self.sections.setdefault(self.stage, []).append(f"AI asked: {line.strip()}")
+            elif line.strip().startswith("- ") and self.sections.get(self.stage):
+                # Options listed under a question
+                self.sections[self.stage].append(f"  option {line.strip()[2:]}")
+
+    def render(self) -> str:
+        if not self.sections:
+            return ""
+        lines = ["Digest of earlier messages (questions already asked and the client's answers; "
+                 "do NOT ask these again):"]
+        for stage, entries in self.sections.items():
+            lines.append(f"[{stage}]")
+            lines.extend(entries)
+        lines.append(f"Current stage: {self.stage}")
+        return "\n".join(lines)
+
+
+_digests = OrderedDict()
+_lock = threading.Lock()
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-digest")
+
+
+def _load_digest(session_id: str):
+    from services.transcript_store import transcript_store  # local import to avoid circular deps
+
+    try:
+        return _Digest.from_dict(transcript_store.read_context(session_id))
+    except Exception as e:
+        log.warning("Could not load context digest for %s: %s", session_id, e)
+        return None
+
+
+def _store_digest(session_id: str, data: dict):
+    from services.transcript_store import transcript_store  # local import to avoid circular deps
+
+    try:
+        transcript_store.write_context(session_id, data)
+    except Exception as e:
+        # The next turn that extends the digest stores it again
+        log.warning("Could not store context digest for %s: %s", session_id, e)
+
+
+def _digest_for(session_id: str, transcript: list, upto: int) -> _Digest:
+    with _lock:
+        digest = _digests.get(session_id)
+    if digest is None:
+        # New to this worker: start from the stored copy
+        digest = _load_digest(session_id)
+
+    # Folding is pure CPU work, so it is done under the lock
+    with _lock:
+        digest = _digests.get(session_id) or digest
+        if digest is None or not digest.matches(transcript):
+            # Never stored, or the transcript was rewritten; rebuild from scratch
+            digest = _Digest()
+        # A digest never un-folds messages; if it already covers more, it is reused as is
+        if digest.upto < upto:
+            digest.fold(transcript[digest.upto:upto])
+        data = None
+        if digest.upto != digest.stored_upto:
+            data = digest.to_dict()
+            digest.stored_upto = digest.upto
+
+        _digests[session_id] = digest
+        _digests.move_to_end(session_id)
+        while len(_digests) > MAX_DIGESTS:
+            _digests.popitem(last=False)
+    if data is not None:
+        _writer.submit(_store_digest, session_id, data)
+    return digest
+
+
+def compact_history(session_id: str, transcript: list, token_budget: int = None,
+                    keep_turns: int = None) -> tuple:
+    """
+    Build the session_history string for run_chat.
+
+    Args:
+        session_id: Session identifier (digests are kept per session)
+        transcript: Full list of message dicts
+        token_budget: Optional override of CONTEXT_TOKEN_BUDGET
+        keep_turns: Optional override of CONTEXT_KEEP_TURNS
+
+    Returns:
+        (session_history, stats) where stats has tokens_before, tokens_after
+        and the number of messages folded into the digest
+    """
+    token_budget = TOKEN_BUDGET if token_budget is None else token_budget
+    keep_turns = KEEP_TURNS if keep_turns is None else keep_turns
+
+    full = _format_messages(transcript)
+    tokens_before = estimate_tokens(full)
+    stats = {"messages": len(transcript), "compacted_messages": 0,
+             "tokens_before": tokens_before, "tokens_after": tokens_before}
+    if not COMPACTION_ENABLED or tokens_before <= token_budget:
+        return full, stats
+
+    # A turn is a client message plus the AI reply; shrink the verbatim tail
+    # until the result fits, but always keep the latest turn
+    keep = max(keep_turns, 1) * 2
+    while True:
+        digest = _digest_for(session_id, transcript, max(len(transcript) - keep, 0))
+        upto = digest.upto
+        history = digest.render() + "\n\nRecent messages: " + _format_messages(transcript[upto:])
+        if estimate_tokens(history) <= token_budget or keep <= 2:
+            break
+        keep -= 2
+
+    stats["compacted_messages"] = upto
+    stats["tokens_after"] = estimate_tokens(history)
+    return history, stats
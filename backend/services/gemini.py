@@ -2,15 +2,16 @@ from dotenv import load_dotenv
 import os 
 import sys
 import re
+import logging
 load_dotenv()
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
+from services import llm_metrics
+from services.llm_clients import get_llm
+from services.log import SAMPLED, get_logger
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-flash-latest",   # or "gemini-pro-latest"
-    temperature=0.5
-)
+log = get_logger(__name__)
+llm = get_llm()
 
 def read_system_prompt(filepath):
     """Making this a function for future prompt txt file reading"""
@@ -106,17 +107,19 @@ prompt = ChatPromptTemplate.from_messages([
 
 chain = prompt | llm
 
-def run_chat(user_message: str, session_history: str) -> str:
-    print(f"[DEBUG] === Running Chat ===")
-    print(f"[DEBUG] User Message: {user_message[:200]}...")
-    if session_history:
-        print(f"[DEBUG] Session History (last 500 chars): ...{session_history[-500:]}")
-        print(f"[DEBUG] Session History (first 500 chars): ...{session_history[:500]}")
-    else:
-        print(f"[DEBUG] Session History: None (new session)")
-    
-    result = chain.invoke({"message": user_message, 
-                           "session_history": session_history or ""}).content
+def run_chat(user_message: str, session_history: str, session_id: str = None) -> str:
+    # Slicing the history isn't free; only do it when debug output is on
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Running chat, user message: %s...", user_message[:200], extra=SAMPLED)
+        if session_history:
+            log.debug("Session history (first/last 500 chars): %s ... %s",
+                      session_history[:500], session_history[-500:], extra=SAMPLED)
+        else:
+            log.debug("Session history: None (new session)", extra=SAMPLED)
+
+    result = llm_metrics.invoke(chain, {"message": user_message,
+                                        "session_history": session_history or ""},
+                                name="chat", session_id=session_id).content
     # print(f"[DEBUG] Full Result: {result}") 
 
     # Sometimes it returns a list of json (even though I tried to specify
@@ -125,12 +128,75 @@ def run_chat(user_message: str, session_history: str) -> str:
     if not isinstance(result, str):
         result = result[0]['text']
 
-    print(f"[DEBUG] LLM Response: {result[:200]}...")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("LLM response: %s...", result[:200], extra=SAMPLED)
     return result
 
 
+def _chunk_text(content) -> str:
+    # Streamed chunks can be a string or a list of content parts, like invoke results
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def stream_chat(user_message: str, session_history: str, session_id: str = None):
+    """Like run_chat, but yields the raw LLM output piece by piece as it is generated"""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Streaming chat, user message: %s...", user_message[:200], extra=SAMPLED)
+    for chunk in llm_metrics.stream(chain, {"message": user_message,
+                                            "session_history": session_history or ""},
+                                    name="chat_stream", session_id=session_id):
+        text = _chunk_text(chunk.content)
+        if text:
+            yield text
+
+
+_TEXT_FIELD = re.compile(r'"text"\s*:\s*"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def extract_partial_text(buffer: str) -> str:
+    """
+    Decode as much of the top-level "text" string as has arrived in a partial
+    JSON response. Stops before an incomplete escape sequence.
+
+    Returns:
+        the decoded prefix of the text field ("" if it hasn't started yet)
+    """
+    match = _TEXT_FIELD.search(buffer)
+    if not match:
+        return ""
+
+    out = []
+    i = match.end()
+    while i < len(buffer):
+        ch = buffer[i]
+        if ch == '"':
+            break
+        if ch != "\\":
+            out.append(ch)
+            i += 1
+            continue
+        if i + 1 >= len(buffer):
+            break
+        code = buffer[i + 1]
+        if code == "u":
+            if i + 6 > len(buffer):
+                break
+            try:
+                out.append(chr(int(buffer[i + 2:i + 6], 16)))
+            except ValueError:
+                break
+            i += 6
+            continue
+        out.append(_ESCAPES.get(code, code))
+        i += 2
+    return "".join(out)
+
+
 def _clean_title(raw_title: str, max_words: int = 4) -> str:
-    print(f"[DEBUG] _clean_title: raw_title is {raw_title}")
+    log.debug("_clean_title: raw_title is %s", raw_title)
     raw_title = raw_title[0].get('text')
     text = (raw_title or "").strip()
     text = text.replace("\n", " ").replace("\r", " ")
@@ -165,7 +231,7 @@ def _fallback_title(text: str, max_words: int = 4) -> str:
     return " ".join(selected_tokens).title()
 
 
-def generate_title(text: str) -> str:
+def generate_title(text: str, session_id: str = None) -> str:
     """Generate a concise summary title with a maximum of 4 words."""
     instructions = """Generate a concise project summary title.
 
@@ -187,14 +253,14 @@ Examples:
         ("system", instructions),
         ("user", "{text}")
     ])
-    print(f"[DEBUG] generate_title.py: text: {text}")
+    log.debug("generate_title: text: %s", text)
     
     title_chain = title_prompt | llm
     
     try:
-        result = title_chain.invoke({"text": text}).content
+        result = llm_metrics.invoke(title_chain, {"text": text}, name="title", session_id=session_id).content
         cleaned_title = _clean_title(result, max_words=4)
         return cleaned_title if cleaned_title else _fallback_title(text, max_words=4)
     except Exception as e:
-        print(f"[ERROR] Failed to generate title: {e}")
+        log.error("Failed to generate title: %s", e)
         return _fallback_title(text, max_words=4)
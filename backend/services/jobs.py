@@ -0,0 +1,225 @@
+# Bounded background job queue
+#
+# submit() runs a function on a small thread pool and returns a Job that can
+# be polled by id or waited on. Jobs submitted with the same dedupe key while
+# one is still queued or running share that run. At most max_pending jobs may
+# be queued or running at once; beyond that submit() raises QueueFull so the
+# caller can answer 503 instead of piling up work.
+#
+# Jobs run in the worker process that accepted them, but their status is also
+# written to a JobStore (jobs/<job_id>.json in the `transcripts` bucket) when
+# they are queued and when they finish, so a poll that lands on another
+# worker can still answer. Finished jobs are kept for JOB_RESULT_TTL seconds.
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from services import round_trips
+from services.log import get_logger
+from services.supabase_client import supabase
+
+log = get_logger(__name__)
+
+RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL", "900"))
+MAX_FINISHED = 1000
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, key: str = None, session_id: str = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.session_id = session_id
+        self.status = "queued"  # queued -> running -> succeeded | failed
+        self.result = None
+        self.status_code = None
+        self.round_trips = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        """A read-only copy of a job stored by another worker"""
+        job = cls(data["kind"], session_id=data.get("session_id"))
+        job.id = data["job_id"]
+        for field in ("status", "status_code", "result", "round_trips", "created_at", "started_at", "finished_at"):
+            setattr(job, field, data.get(field))
+        if job.status in ("succeeded", "failed"):
+            job._done.set()
+        return job
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "session_id": self.session_id,
+            "status": self.status,
+            "status_code": self.status_code,
+            "result": self.result,
+            "round_trips": self.round_trips,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobStore:
+    """Job status shared by all workers, one storage object per job"""
+
+    def __init__(self, bucket, prefix: str = "jobs"):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _path(self, job_id: str) -> str:
+        return f"{self.prefix}/{job_id}.json"
+
+    def save(self, job: Job):
+        round_trips.record("storage")
+        self.bucket.upload(self._path(job.id), json.dumps(job.to_dict()).encode("utf-8"),
+                           {"content-type": "application/json", "upsert": "true"})
+
+    def load(self, job_id: str):
+        round_trips.record("storage")
+        try:
+            return Job.from_dict(json.loads(self.bucket.download(self._path(job_id)).decode("utf-8")))
+        except Exception:
+            return None
+
+    def remove(self, job_ids: list):
+        if job_ids:
+            round_trips.record("storage")
+            self.bucket.remove([self._path(job_id) for job_id in job_ids])
+
+
+class JobQueue:
+    def __init__(self, name: str, workers: int, max_pending: int, result_ttl: float = RESULT_TTL_SECONDS,
+                 store: JobStore = None):
+        self.name = name
+        self.store = store
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-job")
+        self._jobs = OrderedDict()  # job id -> Job, in submission order
+        self._active = {}  # dedupe key -> queued or running Job
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.deduplicated = 0
+        self.rejected = 0
+
+    def submit(self, kind: str, fn, key: str = None, session_id: str = None) -> tuple:
+        """
+        Queue fn() unless a job with the same key is already queued or running.
+
+        fn returns (result, status_code); a status code of 400 or more marks
+        the job failed. fn runs with a copy of the caller's context, so logs
+        and spans keep the request id; its round trips are counted on the job.
+
+        Returns:
+            (job, created); created is False if the request joined a running job
+        """
+        created = False
+        with self._lock:
+            expired = self._prune()
+            job = self._active.get(key) if key is not None else None
+            if job is not None:
+                self.deduplicated += 1
+            elif self._pending >= self.max_pending:
+                self.rejected += 1
+            else:
+                job = Job(kind, key=key, session_id=session_id)
+                self._jobs[job.id] = job
+                if key is not None:
+                    self._active[key] = job
+                self._pending += 1
+                created = True
+        self._remove(expired)
+        if job is None:
+            raise QueueFull(f"{self.name} queue is full ({self.max_pending} jobs)")
+        if not created:
+            return job, False
+        self._save(job)
+        self._executor.submit(contextvars.copy_context().run, self._run, job, fn)
+        return job, True
+
+    def _save(self, job: Job):
+        if self.store is None:
+            return
+        try:
+            self.store.save(job)
+        except Exception as e:
+            # Polls reaching this worker still work; others get a 404 until the next save
+            log.warning("Failed to store %s job %s: %s", job.kind, job.id, e)
+
+    def _run(self, job: Job, fn):
+        job.status = "running"
+        job.started_at = time.time()
+        with round_trips.track(isolated=True) as counter:
+            self._save(job)
+            try:
+                job.result, job.status_code = fn()
+            except Exception as e:
+                log.error("%s job %s failed: %s", job.kind, job.id, e)
+                job.result, job.status_code = {"detail": str(e)}, 500
+        job.round_trips = counter.as_dict()
+        job.status = "failed" if job.status_code >= 400 else "succeeded"
+        job.finished_at = time.time()
+        self._save(job)
+        with self._lock:
+            self._pending -= 1
+            if job.key is not None and self._active.get(job.key) is job:
+                del self._active[job.key]
+        job._done.set()
+
+    def _prune(self) -> list:
+        # Called with self._lock held; finished jobs age out oldest first. Returns their ids
+        cutoff = time.time() - self.result_ttl
+        finished = [job for job in self._jobs.values() if job.done]
+        expired = []
+        for i, job in enumerate(finished):
+            if job.finished_at >= cutoff and len(finished) - i <= MAX_FINISHED:
+                break
+            del self._jobs[job.id]
+            expired.append(job.id)
+        return expired
+
+    def _remove(self, job_ids: list):
+        if not job_ids or self.store is None:
+            return
+        try:
+            self.store.remove(job_ids)
+        except Exception as e:
+            log.warning("Failed to remove expired %s jobs: %s", self.name, e)
+
+    def get(self, job_id: str):
+        """A job accepted by this worker, or else by any worker (via the store); None if unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self.store is None:
+            return job
+        job = self.store.load(job_id)
+        if job is not None and job.finished_at and job.finished_at < time.time() - self.result_ttl:
+            return None
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._pending, "jobs": len(self._jobs),
+                    "deduplicated": self.deduplicated, "rejected": self.rejected}
@@ -0,0 +1,47 @@
+# Shared Gemini clients
+#
+# Building a ChatGoogleGenerativeAI sets up a new API client (and new
+# HTTP/TLS connections on first use), so clients are created once per
+# (model, temperature) and reused by every call site. All model settings
+# live here.
+import os
+import threading
+
+from dotenv import load_dotenv
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+load_dotenv()
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-flash-latest")  # or "gemini-pro-latest"
+DEFAULT_TEMPERATURE = float(os.getenv("GEMINI_TEMPERATURE", "0.5"))
+
+_clients = {}
+_lock = threading.Lock()
+# Builds a client from (model, temperature); swapped out by the benchmarks
+_factory = lambda model, temperature: ChatGoogleGenerativeAI(model=model, temperature=temperature)
+
+
+def set_client_factory(factory):
+    """
+    Use `factory(model, temperature)` to build clients from now on.
+
+    Must be called before the route modules are imported, since they fetch
+    their clients at import time.
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _clients.clear()
+
+
+def get_llm(model: str = None, temperature: float = None) -> ChatGoogleGenerativeAI:
+    """Shared client for a model/temperature pair, created on first use"""
+    key = (model or DEFAULT_MODEL, DEFAULT_TEMPERATURE if temperature is None else temperature)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _factory(*key)
+                _clients[key] = client
+    return client
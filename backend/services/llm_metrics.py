@@ -0,0 +1,247 @@
+# Token and latency accounting for every LLM call
+#
+# invoke()/stream() wrap a LangChain runnable and record model,
+# prompt/completion tokens, latency and retries for each call. Retrying is
+# left to the model client's own policy; the wrapper counts the client's
+# retry attempts (the "Retrying ..." record google-genai logs before each
+# one). Recent calls are kept in memory for GET /api/metrics/llm;
+# per-session totals are added to sessions.metadata["llm_usage"] by a
+# background writer, off the request path, with one atomic increment per
+# write (add_session_llm_usage, migrations/007_llm_usage.sql).
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime
+
+from services import round_trips, tracing
+from services.log import SAMPLED, get_logger
+
+log = get_logger(__name__)
+
+RECENT_CALLS = 500
+
+_recent = deque(maxlen=RECENT_CALLS)
+_totals = {}
+_lock = threading.Lock()
+
+# Per-session usage waiting to be written to sessions.metadata
+_pending = {}
+_queued = set()
+WRITE_ATTEMPTS = 5
+WRITE_RETRY_SECONDS = 2.0
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-usage")
+
+_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "latency_ms", "retries", "errors")
+
+# Retries of the call running in this context: [count], or None outside a call
+_retries = ContextVar("llm_retries", default=None)
+# google-genai's retry loop logs here (at INFO) before sleeping for each retry
+CLIENT_RETRY_LOGGER = "google_genai._api_client"
+
+
+class _RetryCounter(logging.Handler):
+    def emit(self, record: logging.LogRecord):
+        counter = _retries.get()
+        if counter is not None and str(record.msg).startswith("Retrying"):
+            counter[0] += 1
+
+
+def _install_retry_counter():
+    client_log = logging.getLogger(CLIENT_RETRY_LOGGER)
+    client_log.addHandler(_RetryCounter())
+    # The records must be created to be counted; nothing prints them unless
+    # the root logger is configured to
+    if not client_log.isEnabledFor(logging.INFO):
+        client_log.setLevel(logging.INFO)
+
+
+def _counted(fn, counter: list):
+    """fn() with the client's retries during it added to counter[0]"""
+    token = _retries.set(counter)
+    try:
+        return fn()
+    finally:
+        _retries.reset(token)
+
+
+def _empty_usage() -> dict:
+    return {field: 0 for field in _FIELDS}
+
+
+def _add_usage(total: dict, record: dict):
+    total["calls"] = total.get("calls", 0) + record.get("calls", 1)
+    for field in _FIELDS[1:]:
+        total[field] = total.get(field, 0) + record.get(field, 0)
+
+
+def _merge_usage(total: dict, delta: dict):
+    """Add a per-session usage delta (overall + by_call) into `total`"""
+    _add_usage(total, delta)
+    by_call = total.setdefault("by_call", {})
+    for name, usage in delta.get("by_call", {}).items():
+        _add_usage(by_call.setdefault(name, _empty_usage()), usage)
+
+
+def _model_name(runnable) -> str:
+    # `prompt | llm` chains keep the model as the last step
+    llm = getattr(runnable, "last", runnable)
+    return getattr(llm, "model", None) or type(llm).__name__
+
+
+def _usage_tokens(usage) -> tuple:
+    usage = usage or {}
+    return usage.get("input_tokens", 0) or 0, usage.get("output_tokens", 0) or 0
+
+
+def _record(name: str, model: str, session_id, started: float, retries: int, usage, error: str = None):
+    prompt_tokens, completion_tokens = _usage_tokens(usage)
+    record = {
+        "name": name,
+        "model": model,
+        "session_id": session_id,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "retries": retries,
+        "errors": 1 if error else 0,
+        "error": error,
+        "at": datetime.utcnow().isoformat(),
+    }
+    with _lock:
+        _recent.append(record)
+        _add_usage(_totals.setdefault(name, _empty_usage()), record)
+    log.debug("LLM call %s (%s): %s+%s tokens, %sms, %s retries", name, model, prompt_tokens,
+              completion_tokens, record["latency_ms"], retries, extra=SAMPLED)
+    if session_id:
+        _schedule_session_update(session_id, record)
+    return record
+
+
+def invoke(runnable, inputs, name: str, session_id: str = None):
+    """
+    Call runnable.invoke(inputs) and record its usage.
+
+    Args:
+        runnable: LangChain chat model or chain
+        inputs: Input passed to invoke
+        name: Call site label ("chat", "title", "summarize", ...)
+        session_id: Optional session the usage is charged to
+
+    Returns:
+        the result of runnable.invoke
+    """
+    model = _model_name(runnable)
+    started = time.perf_counter()
+    retries = [0]
+    with tracing.span(f"llm.{name}", "llm"):
+        try:
+            result = _counted(lambda: runnable.invoke(inputs), retries)
+        except Exception as e:
+            _record(name, model, session_id, started, retries[0], None, error=str(e))
+            raise
+
+    _record(name, model, session_id, started, retries[0], getattr(result, "usage_metadata", None))
+    return result
+
+
+def stream(runnable, inputs, name: str, session_id: str = None):
+    """
+    Like invoke(), but yields chunks from runnable.stream(inputs). Usage is
+    recorded when the stream ends, including when the consumer stops early
+    (e.g. the client disconnected).
+    """
+    model = _model_name(runnable)
+    started = time.perf_counter()
+    usage = {}
+    error = None
+    retries = [0]
+    with tracing.span(f"llm.{name}", "llm"):
+        try:
+            chunks = iter(runnable.stream(inputs))
+            # Counted per chunk, so the counter is never left set across a yield
+            while (chunk := _counted(lambda: next(chunks, None), retries)) is not None:
+                for key, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+                    if isinstance(value, int):
+                        usage[key] = usage.get(key, 0) + value
+                yield chunk
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            _record(name, model, session_id, started, retries[0], usage, error=error)
+
+
+# Per-session persistence
+
+def _schedule_session_update(session_id: str, record: dict, delay: float = 0):
+    with _lock:
+        delta = _pending.setdefault(session_id, _empty_usage())
+        if record:
+            _merge_usage(delta, {**record, "calls": 1, "by_call": {record["name"]: {**record, "calls": 1}}})
+        # Calls that land while a write is queued are folded into it
+        if session_id in _queued:
+            return
+        _queued.add(session_id)
+    if delay:
+        timer = threading.Timer(delay, _submit_write, (session_id,))
+        timer.daemon = True
+        timer.start()
+    else:
+        _submit_write(session_id)
+
+
+def _submit_write(session_id: str):
+    try:
+        _writer.submit(_write_session_usage, session_id)
+    except RuntimeError:
+        # Interpreter is shutting down; the atexit flush picks this up
+        pass
+
+
+def _write_session_usage(session_id: str):
+    from services.supabase_client import supabase  # local import to avoid circular deps
+
+    with _lock:
+        _queued.discard(session_id)
+        delta = _pending.pop(session_id, None)
+    if not delta:
+        return
+    attempts = delta.pop("write_attempts", 0) + 1
+    try:
+        round_trips.record("db")
+        written = supabase.rpc("add_session_llm_usage", {"target_session_id": session_id, "delta": delta}).execute().data
+    except Exception as e:
+        log.error("Failed to save LLM usage for session %s: %s", session_id, e)
+        return
+    if not written:
+        # Row not created yet (e.g. the first turn hasn't committed); try again shortly
+        with _lock:
+            pending = _pending.setdefault(session_id, _empty_usage())
+            _merge_usage(pending, delta)
+            pending["write_attempts"] = attempts
+        if attempts < WRITE_ATTEMPTS:
+            _schedule_session_update(session_id, None, delay=WRITE_RETRY_SECONDS)
+
+
+def flush():
+    """Write all pending per-session usage now (blocks until done)"""
+    with _lock:
+        session_ids = list(_pending)
+    for session_id in session_ids:
+        _write_session_usage(session_id)
+
+
+def snapshot(limit: int = 100) -> dict:
+    """Recent calls (newest first) and per-call-site totals"""
+    with _lock:
+        recent = list(_recent)[-limit:][::-1] if limit > 0 else []
+        totals = {name: dict(usage) for name, usage in _totals.items()}
+    return {"calls": recent, "totals": totals}
+
+
+_install_retry_counter()
+atexit.register(flush)
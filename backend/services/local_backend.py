@@ -0,0 +1,657 @@
+# Local stand-in for the Supabase client: SQLite for tables, a directory for storage
+#
+# Implements the slice of the supabase-py API this backend uses:
+#   client.table(name).select/insert/upsert/update/delete
+#       .eq/.neq/.gt/.gte/.lt/.lte/.is_/.in_/.or_/.order/.limit/.range
+#       .execute()
+#   client.rpc(name, params).execute() for the functions in _RPCS
+#   client.storage.from_(bucket).download/upload/remove/get_public_url
+#
+# Selected with PERSISTENCE_BACKEND=local (see services/supabase_client.py).
+# LOCAL_DB_LATENCY_MS / LOCAL_STORAGE_LATENCY_MS (plus LOCAL_LATENCY_JITTER_MS)
+# add a sleep to every call to model production round-trip costs.
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  session_id TEXT UNIQUE NOT NULL,
+  user_id TEXT,
+  title TEXT,
+  transcript_url TEXT NOT NULL,
+  created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+  ended_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+  metadata TEXT DEFAULT '{}',
+  updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  session_id TEXT NOT NULL,
+  message_id TEXT NOT NULL,
+  sender TEXT NOT NULL,
+  text TEXT,
+  options TEXT DEFAULT NULL,
+  allow_other INTEGER DEFAULT 0,
+  selected_option TEXT,
+  custom_response TEXT,
+  timestamp TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+  created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+  FOREIGN KEY (session_id) REFERENCES sessions(session_id) ON DELETE CASCADE,
+  UNIQUE(session_id, message_id)
+);
+
+CREATE TABLE IF NOT EXISTS team_members (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  team TEXT NOT NULL CHECK (team IN ('Frontend', 'Backend', 'Design', 'Business', 'DevOps', 'QA')),
+  name TEXT NOT NULL,
+  role TEXT NOT NULL DEFAULT '',
+  email TEXT NOT NULL DEFAULT '',
+  created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS cache_versions (
+  name TEXT PRIMARY KEY,
+  version TEXT NOT NULL,
+  updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- Full-text search: one row per transcript message or final summary, indexed
+-- by the search_fts FTS5 table and kept in sync by triggers
+CREATE TABLE IF NOT EXISTS search_documents (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  session_id TEXT NOT NULL,
+  kind TEXT NOT NULL CHECK (kind IN ('transcript', 'summary')),
+  seq INTEGER NOT NULL,
+  role TEXT,
+  content TEXT NOT NULL,
+  updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+  UNIQUE(session_id, kind, seq)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+  content, content='search_documents', content_rowid='id', tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+  INSERT INTO search_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+  INSERT INTO search_fts(search_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+  INSERT INTO search_fts(search_fts, rowid, content) VALUES ('delete', old.id, old.content);
+  INSERT INTO search_fts(rowid, content) VALUES (new.id, new.content);
+END;
+
+CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id ON chat_messages(session_id);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_timestamp ON chat_messages(session_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_team_members_team ON team_members(team);
+"""
+
+# Later migrations, as (table, column added, statements)
+_MIGRATIONS = [
+    ("sessions", "display_title", """
+ALTER TABLE sessions ADD COLUMN display_title TEXT
+  GENERATED ALWAYS AS (COALESCE(NULLIF(title, ''), 'Session ' || substr(session_id, -8))) VIRTUAL;
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at_id ON sessions(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_created_at_id ON sessions(user_id, created_at DESC, id DESC);
+"""),
+]
+
+# Columns stored as JSON text (JSONB / TEXT[] in Postgres) and booleans stored as 0/1
+_JSON_COLUMNS = {"sessions": {"metadata"}, "chat_messages": {"options"}}
+_BOOL_COLUMNS = {"chat_messages": {"allow_other"}}
+# Columns the database sets to the write time on every insert and update
+# (a trigger in Postgres, see migrations/006_chat_message_write_time.sql)
+_WRITE_TIME_COLUMNS = {"chat_messages": "timestamp"}
+# What upsert conflicts on when on_conflict isn't given
+_NATURAL_KEYS = {"sessions": "session_id", "chat_messages": "session_id,message_id", "team_members": "id",
+                 "cache_versions": "name", "search_documents": "session_id,kind,seq"}
+
+_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class LocalBackendError(Exception):
+    pass
+
+
+class LocalResponse:
+    def __init__(self, data: list, count: int = None):
+        self.data = data
+        self.count = count
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class _Latency:
+    def __init__(self, latency_ms: float, jitter_ms: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def wait(self):
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+
+# Tables
+
+class LocalQuery:
+    def __init__(self, client, table: str):
+        if table not in client.columns:
+            raise LocalBackendError(f"Unknown table '{table}'")
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns = None
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.count = None
+        self.where = []
+        self.params = []
+        self.orders = []
+        self.limit_n = None
+        self.offset_n = None
+
+    def _column(self, name: str) -> str:
+        name = name.strip()
+        if name not in self.client.columns[self.table]:
+            raise LocalBackendError(f"Unknown column '{name}' on '{self.table}'")
+        return f'"{name}"'
+
+    def _value(self, column: str, value):
+        column = column.strip()
+        if column in _JSON_COLUMNS.get(self.table, ()) and value is not None and not isinstance(value, str):
+            return json.dumps(value)
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    # Operations
+
+    def select(self, *columns, count: str = None):
+        self.op = "select"
+        # "alias:column" renames a column in the result, as in PostgREST
+        names = [c.strip() for spec in columns for c in spec.split(",") if c.strip()]
+        self.columns = None if not names or names == ["*"] else [
+            tuple(name.split(":", 1)) if ":" in name else (name, name) for name in names]
+        self.count = count
+        return self
+
+    def insert(self, data):
+        self.op, self.payload = "insert", data
+        return self
+
+    def upsert(self, data, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs):
+        self.op, self.payload = "upsert", data
+        self.on_conflict = on_conflict or _NATURAL_KEYS[self.table]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, data):
+        self.op, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    # Filters
+
+    def _filter(self, column: str, op: str, value):
+        self.where.append(f"{self._column(column)} {_OPERATORS[op]} ?")
+        self.params.append(self._value(column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "neq", value)
+
+    def gt(self, column, value):
+        return self._filter(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._filter(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "lte", value)
+
+    def is_(self, column, value):
+        if value in (None, "null"):
+            self.where.append(f"{self._column(column)} IS NULL")
+        else:
+            self.where.append(f"{self._column(column)} IS ?")
+            self.params.append(self._value(column, value))
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            self.where.append("0")
+            return self
+        self.where.append(f"{self._column(column)} IN ({', '.join('?' * len(values))})")
+        self.params.extend(self._value(column, v) for v in values)
+        return self
+
+    def or_(self, filters: str):
+        """PostgREST-style "col.op.value,and(col.op.value,...)" with eq/neq/gt/gte/lt/lte/is"""
+        sql, params = self._parse_logic(filters, "OR")
+        self.where.append(sql)
+        self.params.extend(params)
+        return self
+
+    def _parse_logic(self, text: str, joiner: str):
+        parts, depth, current = [], 0, ""
+        for ch in text:
+            if ch == "," and depth == 0:
+                parts.append(current)
+                current = ""
+                continue
+            depth += ch == "("
+            depth -= ch == ")"
+            current += ch
+        parts.append(current)
+
+        clauses, params = [], []
+        for part in (p.strip() for p in parts if p.strip()):
+            nested = re.fullmatch(r"(and|or)\((.*)\)", part)
+            if nested:
+                sql, nested_params = self._parse_logic(nested.group(2), nested.group(1).upper())
+                clauses.append(sql)
+                params.extend(nested_params)
+                continue
+            column, op, value = part.split(".", 2)
+            if op == "is":
+                clauses.append(f"{self._column(column)} IS NULL" if value == "null" else f"{self._column(column)} IS ?")
+                if value != "null":
+                    params.append(value)
+            elif op in _OPERATORS:
+                clauses.append(f"{self._column(column)} {_OPERATORS[op]} ?")
+                params.append(self._value(column, value.strip('"')))
+            else:
+                raise LocalBackendError(f"Unsupported filter operator '{op}'")
+        return "(" + f" {joiner} ".join(clauses) + ")", params
+
+    # Modifiers
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.orders.append(f"{self._column(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, n: int, **kwargs):
+        self.limit_n = int(n)
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self.offset_n = int(start)
+        self.limit_n = int(end) - int(start) + 1
+        return self
+
+    # Execution
+
+    def _where_sql(self) -> str:
+        return f" WHERE {' AND '.join(self.where)}" if self.where else ""
+
+    def _decode(self, row: sqlite3.Row) -> dict:
+        item = dict(row)
+        for column in _JSON_COLUMNS.get(self.table, ()):
+            if isinstance(item.get(column), str):
+                try:
+                    item[column] = json.loads(item[column])
+                except ValueError:
+                    pass
+        for column in _BOOL_COLUMNS.get(self.table, ()):
+            if column in item and item[column] is not None:
+                item[column] = bool(item[column])
+        return item
+
+    def _rows(self) -> list:
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        rows = [{k: v for k, v in row.items()} for row in rows]
+        column = _WRITE_TIME_COLUMNS.get(self.table)
+        if column:
+            # Runs under the client lock, i.e. at commit time
+            now = _now()
+            for row in rows:
+                row[column] = now
+        return rows
+
+    def execute(self) -> LocalResponse:
+        self.client.db_latency.wait()
+        with self.client.lock:
+            conn = self.client.connection()
+            try:
+                data, count = getattr(self, f"_execute_{self.op}")(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                raise LocalBackendError(str(e)) from e
+        return LocalResponse(data, count)
+
+    def _execute_select(self, conn):
+        columns = ", ".join(f'{self._column(c)} AS "{alias}"' for alias, c in self.columns) if self.columns else "*"
+        sql = f'SELECT {columns} FROM "{self.table}"{self._where_sql()}'
+        if self.orders:
+            sql += " ORDER BY " + ", ".join(self.orders)
+        if self.limit_n is not None or self.offset_n is not None:
+            sql += " LIMIT ? OFFSET ?"
+        params = list(self.params)
+        if self.limit_n is not None or self.offset_n is not None:
+            params += [self.limit_n if self.limit_n is not None else -1, self.offset_n or 0]
+        data = [self._decode(r) for r in conn.execute(sql, params)]
+        count = None
+        if self.count:
+            count = conn.execute(f'SELECT COUNT(*) FROM "{self.table}"{self._where_sql()}', self.params).fetchone()[0]
+        return data, count
+
+    def _write_rows(self, conn, conflict_sql: str):
+        data = []
+        for row in self._rows():
+            columns = list(row)
+            sql = (f'INSERT INTO "{self.table}" ({", ".join(self._column(c) for c in columns)}) '
+                   f'VALUES ({", ".join("?" * len(columns))}){conflict_sql(columns)} RETURNING *')
+            data.extend(self._decode(r) for r in conn.execute(sql, [self._value(c, row[c]) for c in columns]))
+        return data, None
+
+    def _execute_insert(self, conn):
+        return self._write_rows(conn, lambda columns: "")
+
+    def _execute_upsert(self, conn):
+        keys = [k.strip() for k in self.on_conflict.split(",")]
+        target = ", ".join(self._column(k) for k in keys)
+
+        def conflict_sql(columns):
+            updates = [c for c in columns if c not in keys]
+            if self.ignore_duplicates or not updates:
+                return f" ON CONFLICT ({target}) DO NOTHING"
+            return f" ON CONFLICT ({target}) DO UPDATE SET " + ", ".join(
+                f"{self._column(c)} = excluded.{self._column(c)}" for c in updates)
+
+        return self._write_rows(conn, conflict_sql)
+
+    def _execute_update(self, conn):
+        columns = list(self.payload)
+        if self.table == "sessions" and "updated_at" not in columns:
+            self.payload = {**self.payload, "updated_at": _now()}
+            columns.append("updated_at")
+        if self.table in _WRITE_TIME_COLUMNS:
+            self.payload = {**self.payload, _WRITE_TIME_COLUMNS[self.table]: _now()}
+            columns = list(self.payload)
+        sql = (f'UPDATE "{self.table}" SET {", ".join(f"{self._column(c)} = ?" for c in columns)}'
+               f'{self._where_sql()} RETURNING *')
+        params = [self._value(c, self.payload[c]) for c in columns] + self.params
+        return [self._decode(r) for r in conn.execute(sql, params)], None
+
+    def _execute_delete(self, conn):
+        sql = f'DELETE FROM "{self.table}"{self._where_sql()} RETURNING *'
+        return [self._decode(r) for r in conn.execute(sql, self.params)], None
+
+
+# Functions (Postgres functions called through PostgREST /rpc)
+
+_SNIPPET_TOKENS = 24
+
+
+def _fts_query(text: str):
+    """
+    FTS5 query for a web-search style string, as websearch_to_tsquery reads
+    it: words and "quoted phrases" must all match, "or" between two of them
+    accepts either, -word excludes. None if nothing searchable is left.
+    """
+    required, excluded, either = [], [], False
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        if word.lower() == "or":
+            either = bool(required)
+            continue
+        words = re.findall(r"\w+", phrase or word)
+        if not words:
+            continue
+        term = '"' + " ".join(words) + '"'
+        if word.startswith("-"):
+            excluded.append(term)
+        elif either:
+            required[-1] = f"{required[-1]} OR {term}"
+        else:
+            required.append(term)
+        either = False
+    if not required:
+        return None
+    return " AND ".join(f"({term})" for term in required) + "".join(f" NOT {term}" for term in excluded)
+
+
+def _search_sessions(conn, params: dict) -> list:
+    """Same result as search_sessions() in migrations/005_search.sql, with bm25 for ts_rank_cd"""
+    match = _fts_query(params.get("query") or "")
+    if match is None:
+        return []
+    # FTS5's rank (bm25) is lower for better matches; sessions rank by the sum
+    # over their matching documents. With MIN(), SQLite takes the bare d.id
+    # from the best matching row, which is the document the snippet comes from.
+    ranked = conn.execute(
+        "SELECT d.session_id, -SUM(h.score) AS score, COUNT(*) AS matches, MIN(h.score), d.id "
+        "FROM (SELECT rowid, rank AS score FROM search_fts WHERE search_fts MATCH ?) h "
+        "JOIN search_documents d ON d.id = h.rowid "
+        "GROUP BY d.session_id ORDER BY score DESC, d.session_id LIMIT ? OFFSET ?",
+        [match, int(params.get("max_results", 20)), int(params.get("skip", 0))]).fetchall()
+    if not ranked:
+        return []
+
+    # Snippets only for the page's documents
+    doc_ids = [row["id"] for row in ranked]
+    snippets = {row["id"]: row for row in conn.execute(
+        f"SELECT d.id, d.kind, d.seq, h.snippet FROM (SELECT rowid, "
+        f"snippet(search_fts, 0, '<mark>', '</mark>', ' … ', {_SNIPPET_TOKENS}) AS snippet "
+        f"FROM search_fts WHERE search_fts MATCH ? AND rowid IN ({', '.join('?' * len(doc_ids))})) h "
+        f"JOIN search_documents d ON d.id = h.rowid", [match] + doc_ids)}
+    session_ids = [row["session_id"] for row in ranked]
+    sessions = {row["session_id"]: row for row in conn.execute(
+        f"SELECT session_id, display_title, created_at FROM sessions "
+        f"WHERE session_id IN ({', '.join('?' * len(session_ids))})", session_ids)}
+
+    results = []
+    for row in ranked:
+        session, hit = sessions.get(row["session_id"]), snippets[row["id"]]
+        results.append({
+            "session_id": row["session_id"],
+            "title": session["display_title"] if session else None,
+            "created_at": session["created_at"] if session else None,
+            "kind": hit["kind"],
+            "seq": hit["seq"],
+            "snippet": hit["snippet"],
+            "rank": row["score"],
+            "matches": row["matches"],
+        })
+    return results
+
+
+def _add_counts(total: dict, delta: dict) -> dict:
+    """jsonb_add_counts() in migrations/007_llm_usage.sql"""
+    total = dict(total or {})
+    for key, value in (delta or {}).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = (total.get(key) or 0) + value
+    return total
+
+
+def _merge_llm_usage(metadata, delta):
+    metadata = json.loads(metadata) if metadata else {}
+    delta = json.loads(delta)
+    usage = metadata.get("llm_usage") or {}
+    by_call = dict(usage.get("by_call") or {})
+    for name, call_usage in (delta.get("by_call") or {}).items():
+        by_call[name] = _add_counts(by_call.get(name), call_usage)
+    metadata["llm_usage"] = {**_add_counts(usage, delta), "by_call": by_call}
+    return json.dumps(metadata)
+
+
+def _add_session_llm_usage(conn, params: dict) -> bool:
+    """Same as add_session_llm_usage() in migrations/007_llm_usage.sql: one UPDATE statement"""
+    conn.create_function("merge_llm_usage", 2, _merge_llm_usage)
+    cursor = conn.execute("UPDATE sessions SET metadata = merge_llm_usage(metadata, ?) WHERE session_id = ?",
+                          [json.dumps(params["delta"]), params["target_session_id"]])
+    return cursor.rowcount > 0
+
+
+_RPCS = {"search_sessions": _search_sessions, "add_session_llm_usage": _add_session_llm_usage}
+
+
+class LocalRpc:
+    def __init__(self, client, name: str, params: dict):
+        if name not in _RPCS:
+            raise LocalBackendError(f"Unknown function '{name}'")
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self) -> LocalResponse:
+        self.client.db_latency.wait()
+        with self.client.lock:
+            conn = self.client.connection()
+            try:
+                data = _RPCS[self.name](conn, self.params)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                raise LocalBackendError(str(e)) from e
+        return LocalResponse(data)
+
+
+# Storage
+
+class LocalBucket:
+    def __init__(self, root: str, bucket: str, latency: _Latency):
+        self.root = os.path.join(root, bucket)
+        self.bucket = bucket
+        self.latency = latency
+
+    def _path(self, path: str) -> str:
+        full = os.path.normpath(os.path.join(self.root, path))
+        if not full.startswith(os.path.normpath(self.root) + os.sep):
+            raise LocalBackendError(f"Invalid storage path '{path}'")
+        return full
+
+    def download(self, path: str) -> bytes:
+        self.latency.wait()
+        try:
+            with open(self._path(path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise LocalBackendError(f"Object not found: {self.bucket}/{path}")
+
+    def upload(self, path: str, file: bytes, file_options: dict = None):
+        self.latency.wait()
+        full = self._path(path)
+        upsert = str((file_options or {}).get("upsert", "false")).lower() == "true"
+        if os.path.exists(full) and not upsert:
+            raise LocalBackendError(f"The resource already exists: {self.bucket}/{path}")
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        # Write-then-rename so readers never see a partial object
+        tmp = f"{full}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(file)
+        os.replace(tmp, full)
+        return {"path": path}
+
+    def remove(self, paths: list) -> list:
+        self.latency.wait()
+        removed = []
+        for path in paths:
+            try:
+                os.remove(self._path(path))
+                removed.append({"name": path})
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def list(self, path: str = "") -> list:
+        self.latency.wait()
+        try:
+            return [{"name": name} for name in sorted(os.listdir(self._path(path) if path else self.root))]
+        except FileNotFoundError:
+            return []
+
+    def get_public_url(self, path: str) -> str:
+        return f"local://{self.bucket}/{quote(path)}"
+
+
+class LocalStorage:
+    def __init__(self, root: str, latency: _Latency):
+        self.root = root
+        self.latency = latency
+
+    def from_(self, bucket: str) -> LocalBucket:
+        return LocalBucket(self.root, bucket, self.latency)
+
+
+# Client
+
+class LocalClient:
+    def __init__(self, data_dir: str, db_latency_ms: float = 0, storage_latency_ms: float = 0,
+                 jitter_ms: float = 0):
+        os.makedirs(data_dir, exist_ok=True)
+        self.db_path = os.path.join(data_dir, "rally.sqlite3")
+        self.db_latency = _Latency(db_latency_ms, jitter_ms)
+        self.storage = LocalStorage(os.path.join(data_dir, "storage"), _Latency(storage_latency_ms, jitter_ms))
+        # SQLite allows one writer at a time; serialize statements across threads
+        self.lock = threading.RLock()
+        self._local = threading.local()
+
+        conn = self.connection()
+        conn.executescript(_SCHEMA)
+        for table, column, statements in _MIGRATIONS:
+            if column not in self._table_columns(conn, table):
+                conn.executescript(statements)
+        self.columns = {table: self._table_columns(conn, table)
+                        for table in ("sessions", "chat_messages", "team_members", "cache_versions",
+                                      "search_documents")}
+
+    @staticmethod
+    def _table_columns(conn, table: str) -> set:
+        # table_xinfo also lists generated columns
+        return {row["name"] for row in conn.execute(f'PRAGMA table_xinfo("{table}")')}
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+
+    def rpc(self, name: str, params: dict = None) -> LocalRpc:
+        return LocalRpc(self, name, params or {})
+
+
+def create_local_client(data_dir: str = None) -> LocalClient:
+    """Local client configured from LOCAL_DATA_DIR and the LOCAL_*_LATENCY_MS env vars"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return LocalClient(
+        data_dir or os.getenv("LOCAL_DATA_DIR", os.path.join(backend_dir, ".local_data")),
+        db_latency_ms=float(os.getenv("LOCAL_DB_LATENCY_MS", "0")),
+        storage_latency_ms=float(os.getenv("LOCAL_STORAGE_LATENCY_MS", "0")),
+        jitter_ms=float(os.getenv("LOCAL_LATENCY_JITTER_MS", "0")),
+    )
@@ -0,0 +1,76 @@
+# Leveled, non-blocking logging for the backend
+#
+# get_logger(__name__) returns a standard library logger under "rally".
+# Records are handed to a queue and formatted and written by a background
+# listener thread, so request threads never block on stdout. Pass values as
+# %-style arguments (log.debug("x=%s", x)) so nothing is formatted when the
+# level is off, and guard anything expensive to compute with
+# log.isEnabledFor(logging.DEBUG).
+#
+# LOG_LEVEL sets the level (default INFO). High-volume debug events pass
+# extra=SAMPLED and only LOG_DEBUG_SAMPLE_RATE (0-1) of them are kept.
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1"))
+FORMAT = "%(asctime)s [%(levelname)s] %(name)s (%(request_id)s): %(message)s"
+
+SAMPLED = {"sampled": True}
+
+
+class _ContextFilter(logging.Filter):
+    """Drops unlucky sampled records and tags the rest with the request id"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False) and random.random() >= DEBUG_SAMPLE_RATE:
+            return False
+        from services.tracing import current_trace  # local import to avoid circular deps
+
+        trace = current_trace()
+        record.request_id = trace.request_id if trace is not None else "-"
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # The stock prepare() formats the message in the calling thread; leave
+    # that to the listener instead
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks reference frames that may change; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_queue = queue.SimpleQueue()
+_root = logging.getLogger("rally")
+
+
+def _configure() -> QueueListener:
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(FORMAT))
+    handler = _DeferredQueueHandler(_queue)
+    handler.addFilter(_ContextFilter())
+    _root.addHandler(handler)
+    _root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    _root.propagate = False
+
+    listener = QueueListener(_queue, stream)
+    listener.start()
+    # Stopping drains the queue, so records logged just before exit are written
+    atexit.register(listener.stop)
+    return listener
+
+
+_listener = _configure()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module, e.g. get_logger(__name__)"""
+    return _root.getChild(name)
@@ -0,0 +1,146 @@
+# Read-through cache of team members for /api/teams/members
+#
+# Each worker caches the member list per filter (one team, or everyone).
+# Entries are tagged with roster versions kept in the cache_versions table:
+# "team_members:<team>" for one team and "team_members" for the whole roster.
+# Any write, on any worker, stores new version tokens after it succeeds, so
+# the next read everywhere sees a different version and reloads. A cache hit
+# costs one small versions lookup instead of the members query.
+#
+# If cache_versions is missing (migration 004 not run), reads go straight to
+# team_members as before. A version bump that still fails after retrying
+# leaves other workers on their copy, so entries also expire after
+# ROSTER_CACHE_TTL seconds; that bounds how stale a roster can get.
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from services import round_trips
+from services.log import get_logger
+from services.supabase_client import supabase
+
+log = get_logger(__name__)
+
+MAX_ENTRIES = int(os.getenv("ROSTER_CACHE_MAX_ENTRIES", "16"))
+TTL_SECONDS = float(os.getenv("ROSTER_CACHE_TTL", "60"))
+BUMP_ATTEMPTS = 3
+ROSTER_KEY = "team_members"
+
+
+def _key(team: str = None) -> str:
+    return f"{ROSTER_KEY}:{team}" if team else ROSTER_KEY
+
+
+class RosterCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = {}  # version key -> (version, members, etag, loaded_at)
+        self._lock = threading.Lock()
+        self._load_locks = {}  # version key -> lock held while one request reloads it
+        self.hits = 0
+        self.misses = 0
+
+    def _version(self, key: str) -> tuple:
+        """(version, updated_at) of a roster key; ("0", None) before its first write"""
+        round_trips.record("db")
+        response = supabase.table("cache_versions").select("version,updated_at").eq("name", key).execute()
+        if not response.data:
+            return "0", None
+        row = response.data[0]
+        return row["version"], datetime.fromisoformat(row["updated_at"])
+
+    def _load(self, team: str = None) -> list:
+        query = supabase.table("team_members").select("*").order("name")
+        if team:
+            query = query.eq("team", team)
+        round_trips.record("db")
+        return query.execute().data
+
+    def get(self, team: str = None) -> tuple:
+        """
+        Members of a team (or of every team), read through the cache.
+
+        Returns:
+            (members, etag, last_modified); last_modified is None until the
+            roster has been written through this cache
+        """
+        key = _key(team)
+        try:
+            version, updated_at = self._version(key)
+        except Exception as e:
+            log.warning("Roster versions unavailable, reading team_members directly: %s", e)
+            members = self._load(team)
+            return members, self._etag(key, members), None
+
+        entry = self._cached(key, version)
+        if entry is None:
+            with self._lock:
+                load_lock = self._load_locks.setdefault(key, threading.Lock())
+            # Concurrent misses wait for one reload instead of all querying
+            with load_lock:
+                entry = self._cached(key, version, count=False)
+                if entry is None:
+                    # Tagged with the version read before loading, so a write landing
+                    # in between leaves a stale tag and the next read reloads
+                    members = self._load(team)
+                    entry = (version, members, self._etag(key, members), time.monotonic())
+                    with self._lock:
+                        self._entries[key] = entry
+                        while len(self._entries) > self.max_entries:
+                            self._entries.pop(next(iter(self._entries)))
+        return entry[1], entry[2], updated_at
+
+    def _cached(self, key: str, version: str, count: bool = True):
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = (entry is not None and entry[0] == version
+                   and time.monotonic() - entry[3] < self.ttl)
+            if count:
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return entry if hit else None
+
+    @staticmethod
+    def _etag(key: str, members: list) -> str:
+        # From the content, so a reload after the TTL with an unchanged version
+        # still changes the ETag if the roster did
+        return hashlib.sha1(f"{key}:{members!r}".encode("utf-8")).hexdigest()
+
+    def invalidate(self, *teams: str):
+        """
+        Mark the roster (and the given teams) as changed on every worker.
+        Call after a write to team_members has succeeded.
+        """
+        keys = [ROSTER_KEY] + [_key(team) for team in dict.fromkeys(teams) if team]
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        now = datetime.now(timezone.utc).isoformat()
+        for attempt in range(1, BUMP_ATTEMPTS + 1):
+            try:
+                round_trips.record("db")
+                supabase.table("cache_versions").upsert(
+                    [{"name": key, "version": uuid.uuid4().hex, "updated_at": now} for key in keys],
+                    on_conflict="name",
+                ).execute()
+                return
+            except Exception as e:
+                if attempt == BUMP_ATTEMPTS:
+                    log.error("Failed to bump roster versions %s; other workers may serve the old "
+                              "roster for up to %ss: %s", keys, self.ttl, e)
+                else:
+                    log.warning("Retrying roster version bump %s: %s", keys, e)
+                    time.sleep(0.05 * attempt)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+roster_cache = RosterCache()
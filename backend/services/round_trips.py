@@ -0,0 +1,48 @@
+# Per-request accounting of storage and database round trips
+#
+# Storage and table helpers call record(kind) for every network call they
+# make. Nothing is counted unless a caller has started a counter with
+# track(), e.g. for the duration of one chat turn. Counts from a nested
+# track() block are added to the enclosing counter when the block ends,
+# unless it is isolated (e.g. background work that outlives the request).
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar("round_trips", default=None)
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.counts = {}
+
+    def record(self, kind: str):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def as_dict(self) -> dict:
+        return {**self.counts, "total": self.total}
+
+
+def record(kind: str):
+    """Count one round trip of the given kind ("storage", "db") if tracking is active"""
+    counter = _current.get()
+    if counter is not None:
+        counter.record(kind)
+
+
+@contextmanager
+def track(isolated: bool = False):
+    """Count round trips made inside the block; yields the RoundTripCounter"""
+    parent = None if isolated else _current.get()
+    counter = RoundTripCounter()
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+        if parent is not None:
+            for kind, count in counter.counts.items():
+                parent.counts[kind] = parent.counts.get(kind, 0) + count
@@ -0,0 +1,168 @@
+# Full-text search over session transcripts and final summaries
+#
+# The search_documents table (migrations/005_search.sql; FTS5 in the local
+# backend) holds one row per transcript message, keyed by (session_id,
+# "transcript", index in the transcript), and one per approved summary
+# (session_id, "summary", 0). Postgres keeps a GIN-indexed tsvector of each
+# row, so a search only touches matching documents.
+#
+# The index is maintained incrementally by the writers: the session cache
+# indexes the messages of each flushed append (one upsert) or rewrite, and
+# save_final_summary indexes the approved summary. Index writes are
+# best-effort: a failure is logged and never fails the write it follows.
+# Sessions written before migration 005 are indexed by rebuild(), which can
+# be run from backend/ with `python -m services.search_index --rebuild`.
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+from services import round_trips
+from services.log import get_logger
+from services.supabase_client import supabase
+
+log = get_logger(__name__)
+
+BATCH_SIZE = int(os.getenv("SEARCH_INDEX_BATCH", "500"))
+SEARCH_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE_MAX = 100
+
+
+def _document(session_id: str, kind: str, seq: int, content: str, role: str = None, now: str = None) -> dict:
+    return {"session_id": session_id, "kind": kind, "seq": seq, "role": role, "content": content,
+            "updated_at": now or datetime.now(timezone.utc).isoformat()}
+
+
+class SearchIndex:
+    def __init__(self, client, batch_size: int = BATCH_SIZE):
+        self.client = client
+        self.batch_size = batch_size
+
+    def _upsert(self, documents: list):
+        for i in range(0, len(documents), self.batch_size):
+            round_trips.record("db")
+            self.client.table("search_documents").upsert(
+                documents[i:i + self.batch_size], on_conflict="session_id,kind,seq").execute()
+
+    def _delete(self, session_id: str, kind: str = None, from_seq: int = None):
+        query = self.client.table("search_documents").delete().eq("session_id", session_id)
+        if kind is not None:
+            query = query.eq("kind", kind)
+        if from_seq is not None:
+            query = query.gte("seq", from_seq)
+        round_trips.record("db")
+        query.execute()
+
+    def _messages(self, session_id: str, start: int, messages: list) -> list:
+        now = datetime.now(timezone.utc).isoformat()
+        return [_document(session_id, "transcript", start + i, m.get("message") or "", m.get("role"), now)
+                for i, m in enumerate(messages) if (m.get("message") or "").strip()]
+
+    # Writers
+
+    def add_messages(self, session_id: str, start: int, messages: list):
+        """
+        Index messages appended to a transcript.
+
+        Args:
+            session_id: Session identifier
+            start: Index of the first of `messages` in the transcript
+            messages: The appended message dicts
+        """
+        try:
+            self._upsert(self._messages(session_id, start, messages))
+        except Exception as e:
+            log.error("Failed to index %d messages for %s: %s", len(messages), session_id, e)
+
+    def replace_messages(self, session_id: str, transcript: list):
+        """Re-index a rewritten transcript, dropping messages past its new end"""
+        try:
+            self._delete(session_id, "transcript", from_seq=len(transcript))
+            self._upsert(self._messages(session_id, 0, transcript))
+        except Exception as e:
+            log.error("Failed to re-index transcript for %s: %s", session_id, e)
+
+    def index_summary(self, session_id: str, summary_text: str):
+        """Index a session's approved summary, replacing the previous one"""
+        try:
+            self._upsert([_document(session_id, "summary", 0, summary_text)])
+        except Exception as e:
+            log.error("Failed to index summary for %s: %s", session_id, e)
+
+    def delete_session(self, session_id: str):
+        try:
+            self._delete(session_id)
+        except Exception as e:
+            log.error("Failed to remove %s from the search index: %s", session_id, e)
+
+    def rebuild(self, session_ids: list = None) -> int:
+        """
+        Index stored transcripts and final summaries from scratch, e.g. for
+        sessions written before the index existed.
+
+        Args:
+            session_ids: Sessions to index; every session in the sessions table if not given
+
+        Returns:
+            number of sessions indexed
+        """
+        from services.transcript_store import transcript_store
+
+        if session_ids is None:
+            round_trips.record("db")
+            session_ids = [row["session_id"] for row in
+                           self.client.table("sessions").select("session_id").execute().data]
+        bucket = self.client.storage.from_("transcripts")
+        for session_id in session_ids:
+            self.replace_messages(session_id, transcript_store.read(session_id) or [])
+            try:
+                round_trips.record("storage")
+                summary = bucket.download(f"summaries/{session_id}_final.md").decode("utf-8")
+            except Exception:
+                continue
+            self.index_summary(session_id, summary)
+        return len(session_ids)
+
+    # Search
+
+    def search(self, query: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> tuple:
+        """
+        Sessions whose transcript or final summary match `query`, best first.
+
+        Args:
+            query: Words, "quoted phrases" and -excluded words, all of which must match
+            limit: Page size
+            offset: Results to skip (next_offset of the previous page)
+
+        Returns:
+            (results, next_offset); each result is {"session_id", "title",
+            "created_at", "kind", "seq", "snippet", "rank", "matches"}, where
+            the snippet has matches wrapped in <mark></mark>. next_offset is
+            None on the last page.
+        """
+        round_trips.record("db")
+        rows = self.client.rpc("search_sessions", {
+            "query": query, "max_results": limit + 1, "skip": offset}).execute().data or []
+        next_offset = offset + limit if len(rows) > limit else None
+        return rows[:limit], next_offset
+
+
+search_index = SearchIndex(supabase)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain the /api/search index")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="index stored transcripts and final summaries from scratch")
+    parser.add_argument("session_ids", nargs="*", help="sessions to rebuild (default: every session)")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 2
+    count = search_index.rebuild(args.session_ids or None)
+    print(f"Indexed {count} sessions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+# In-process transcript cache with write-behind flushing to the transcript store
+#
+# Hot sessions are served from memory instead of being re-downloaded every
+# turn. New messages are queued per session and a background thread writes
+# them out every TRANSCRIPT_FLUSH_INTERVAL seconds, coalescing several turns
+# into one append. A session is also flushed when it ends
+# (/api/transcript/upload), and everything pending is flushed at shutdown.
+# Flushed messages are also added to the search index.
+#
+# The cache is per process: other workers may hold an older copy of a
+# session for up to SESSION_CACHE_TTL seconds. Chat turns read with
+# fresh=True, which compares the copy with the stored message count (one
+# manifest read) and reloads it if another worker has appended, so prompts
+# include every turn other workers have flushed. Plain reads (e.g. showing
+# a transcript) skip that check and may lag by up to the TTL.
+#
+# Appends are checked against the stored message count this worker last
+# saw; if another worker appended in the meantime, the entry is reloaded and
+# the queued messages are appended after the other worker's instead of over
+# them.
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.log import get_logger
+from services.search_index import search_index
+from services.transcript_store import TranscriptConflict, transcript_store
+
+log = get_logger(__name__)
+
+MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "256"))
+MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL", "600"))
+# 0 disables write-behind: writes go straight to the store
+FLUSH_INTERVAL = float(os.getenv("TRANSCRIPT_FLUSH_INTERVAL", "2"))
+CONFLICT_RETRIES = 3
+
+
+def _size_of(messages: list) -> int:
+    return sum(len(json.dumps(m)) for m in messages)
+
+
+class _Entry:
+    def __init__(self, transcript: list, ttl: float, complete: bool = True, stored: int = None):
+        self.transcript = transcript
+        self.complete = complete  # False if only the queued tail is known
+        self.stored = stored   # messages in the store when last read or written; None if unknown
+        self.size = _size_of(transcript)
+        self.expires_at = time.monotonic() + ttl
+        self.pending = []      # messages not yet appended to the store
+        self.replace = False   # True if the whole transcript must be rewritten
+
+    @property
+    def dirty(self) -> bool:
+        return self.replace or bool(self.pending)
+
+
+class SessionCache:
+    def __init__(self, store, index=None, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES,
+                 ttl: float = TTL_SECONDS, flush_interval: float = FLUSH_INTERVAL):
+        self.store = store
+        self.index = index
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Serializes writes to the store so flushes of one session never reorder
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._stopped = threading.Event()
+        self.conflicts = 0
+
+    # Cache bookkeeping (call with self._lock held)
+
+    def _set(self, session_id: str, entry: _Entry):
+        self._drop(session_id)
+        self._entries[session_id] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def _evict(self):
+        # Oldest clean entries go first; dirty ones stay until they are flushed
+        for session_id in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            entry = self._entries[session_id]
+            if not entry.dirty:
+                self._drop(session_id)
+
+    def _get_live(self, session_id: str):
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic() and not entry.dirty:
+            self._drop(session_id)
+            return None
+        self._entries.move_to_end(session_id)
+        return entry
+
+    # Reads
+
+    def get(self, session_id: str):
+        """Cached transcript for a session, or None on a miss"""
+        with self._lock:
+            entry = self._get_live(session_id)
+            return list(entry.transcript) if entry and entry.complete else None
+
+    def read(self, session_id: str, fresh: bool = False):
+        """
+        Read-through load of a session's transcript.
+
+        Args:
+            session_id: Session identifier
+            fresh: Check a cached copy against the stored message count first
+                (one manifest read) and reload it if another worker has
+                appended since; use before building a prompt from the history
+
+        Returns:
+            list of message dicts, or None if nothing is stored for the session
+        """
+        cached = self.get(session_id)
+        if cached is not None and fresh:
+            cached = self._revalidate(session_id, cached)
+        if cached is not None:
+            return cached
+
+        transcript = self.store.read(session_id)
+        if transcript is not None:
+            with self._lock:
+                # Don't clobber messages queued by another request in the meantime
+                entry = self._get_live(session_id)
+                if entry is None or (not entry.complete and not entry.dirty):
+                    self._set(session_id, _Entry(list(transcript), self.ttl, stored=len(transcript)))
+        return transcript
+
+    def _revalidate(self, session_id: str, cached: list) -> list:
+        with self._lock:
+            entry = self._get_live(session_id)
+            stored = entry.stored if entry else None
+        manifest = self.store.read_manifest(session_id)
+        # Legacy single-file sessions have no manifest; they get one on their first append
+        if stored is None or manifest is None or manifest.get("count", 0) == stored:
+            return cached
+
+        log.debug("Cached transcript for %s is stale (%s stored, %s cached); reloading",
+                  session_id, manifest.get("count", 0), stored)
+        transcript = self.store.read(session_id) or []
+        with self._lock:
+            entry = self._get_live(session_id)
+            if entry is None or not entry.complete:
+                return transcript
+            # What is stored, then what this worker has queued but not flushed
+            entry.transcript = transcript + entry.pending
+            entry.stored = len(transcript)
+            self._bytes -= entry.size
+            entry.size = _size_of(entry.transcript)
+            self._bytes += entry.size
+            entry.expires_at = time.monotonic() + self.ttl
+            return list(entry.transcript)
+
+    # Writes
+
+    def append(self, session_id: str, messages: list, transcript: list = None):
+        """
+        Queue messages to be appended to a session's transcript.
+
+        Args:
+            session_id: Session identifier
+            messages: New message dicts
+            transcript: The caller's full transcript including `messages`; used
+                to populate the cache when the session is not cached yet
+        """
+        if not messages:
+            return
+        with self._lock:
+            entry = self._get_live(session_id)
+            if entry is None:
+                if transcript is not None:
+                    entry = _Entry(list(transcript), self.ttl, stored=len(transcript) - len(messages))
+                else:
+                    # Full transcript unknown; only queue the write
+                    entry = _Entry(list(messages), self.ttl, complete=False)
+                entry.pending = list(messages)
+                self._set(session_id, entry)
+            else:
+                entry.transcript.extend(messages)
+                entry.pending.extend(messages)
+                entry.size += _size_of(messages)
+                self._bytes += _size_of(messages)
+                self._evict()
+        self._after_write(session_id)
+
+    def replace(self, session_id: str, transcript: list):
+        """Queue a full rewrite of a session's transcript"""
+        with self._lock:
+            entry = _Entry(list(transcript), self.ttl)
+            entry.replace = True
+            self._set(session_id, entry)
+        self._after_write(session_id)
+
+    def discard(self, session_id: str):
+        """Forget a session, dropping anything not yet flushed"""
+        # Wait out an in-flight flush so it can't recreate what the caller deletes next
+        with self._flush_lock, self._lock:
+            self._drop(session_id)
+
+    def _drop(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry:
+            self._bytes -= entry.size
+
+    def _after_write(self, session_id: str):
+        if self.flush_interval <= 0:
+            self.flush(session_id)
+        else:
+            self._ensure_flusher()
+
+    # Flushing
+
+    def flush(self, session_id: str = None):
+        """Write pending changes for one session (or all sessions) to the store"""
+        with self._flush_lock:
+            with self._lock:
+                ids = [session_id] if session_id else list(self._entries)
+                work = []
+                for sid in ids:
+                    entry = self._entries.get(sid)
+                    if entry is None or not entry.dirty:
+                        continue
+                    work.append((sid, entry, entry.replace, entry.pending,
+                                 list(entry.transcript) if entry.replace else None, entry.stored))
+                    entry.pending = []
+                    entry.replace = False
+
+            for sid, entry, replace, pending, snapshot, stored in work:
+                try:
+                    if replace:
+                        count = self.store.replace(sid, snapshot)
+                    else:
+                        count = self._append(sid, entry, pending, stored)
+                except Exception as e:
+                    log.error("Failed to flush transcript for %s: %s", sid, e)
+                    with self._lock:
+                        # Requeue in front of anything added since
+                        if self._entries.get(sid) is entry:
+                            entry.replace = entry.replace or replace
+                            entry.pending = pending + entry.pending
+                    continue
+                with self._lock:
+                    if self._entries.get(sid) is entry:
+                        entry.stored = count
+                if self.index is not None:
+                    if replace:
+                        self.index.replace_messages(sid, snapshot)
+                    else:
+                        self.index.add_messages(sid, count - len(pending), pending)
+                if not entry.complete:
+                    # Nothing left to serve from this entry; the next read goes to the store
+                    with self._lock:
+                        if self._entries.get(sid) is entry and not entry.dirty:
+                            self._drop(sid)
+
+    def _append(self, session_id: str, entry: _Entry, pending: list, stored: int) -> int:
+        # Called with self._flush_lock held
+        for attempt in range(CONFLICT_RETRIES):
+            try:
+                return self.store.append(session_id, pending, expected=stored)
+            except TranscriptConflict as e:
+                if attempt == CONFLICT_RETRIES - 1:
+                    raise
+                log.warning("%s; appending after the other writer's messages", e)
+                transcript = self.store.read(session_id) or []
+                stored = len(transcript)
+                with self._lock:
+                    self.conflicts += 1
+                    if self._entries.get(session_id) is entry and entry.complete:
+                        # What is stored, then what this worker has queued since it last read
+                        entry.transcript = transcript + pending + entry.pending
+                        self._bytes -= entry.size
+                        entry.size = _size_of(entry.transcript)
+                        self._bytes += entry.size
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run_flusher, name="transcript-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def shutdown(self):
+        """Stop the background flusher and write out everything pending"""
+        self._stopped.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "dirty": sum(1 for e in self._entries.values() if e.dirty),
+                "conflicts": self.conflicts,
+            }
+
+
+session_cache = SessionCache(transcript_store, index=search_index)
+atexit.register(session_cache.shutdown)
@@ -0,0 +1,103 @@
+# Which sessions have a sessions row, without asking the database every time
+#
+# Each worker keeps a bounded LRU of session ids it has seen to exist (or
+# not). A row never stops existing except through delete_session, which calls
+# discard(), so positive entries live for SESSION_EXISTS_TTL. Another worker
+# may create a row at any moment, so negative entries expire after only
+# SESSION_MISSING_TTL seconds.
+#
+# Within a request, fetched sessions rows are also memoized, so the several
+# get_session() calls one request makes cost a single query. The memo is
+# opened by init_app() per request and is empty outside of requests.
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+MAX_ENTRIES = int(os.getenv("SESSION_EXISTS_MAX_ENTRIES", "4096"))
+TTL_SECONDS = float(os.getenv("SESSION_EXISTS_TTL", "3600"))
+MISSING_TTL_SECONDS = float(os.getenv("SESSION_MISSING_TTL", "2"))
+
+UNKNOWN = object()
+
+_request_rows = ContextVar("session_rows", default=None)
+
+
+class SessionIndex:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS,
+                 missing_ttl: float = MISSING_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._entries = OrderedDict()  # session_id -> (exists, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def exists(self, session_id: str):
+        """True/False if known, UNKNOWN if the database has to be asked"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return UNKNOWN
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def remember(self, session_id: str, exists: bool):
+        ttl = self.ttl if exists else self.missing_ttl
+        with self._lock:
+            self._entries[session_id] = (exists, time.monotonic() + ttl)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+        forget_row(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+session_index = SessionIndex()
+
+
+# Per-request row memo
+
+def cached_row(session_id: str):
+    """The row fetched earlier in this request (None if it had none), or UNKNOWN"""
+    rows = _request_rows.get()
+    if rows is None:
+        return UNKNOWN
+    return rows.get(session_id, UNKNOWN)
+
+
+def remember_row(session_id: str, row: dict):
+    rows = _request_rows.get()
+    if rows is not None:
+        rows[session_id] = row
+    session_index.remember(session_id, row is not None)
+
+
+def forget_row(session_id: str):
+    """Drop this request's copy of a row, e.g. after updating it"""
+    rows = _request_rows.get()
+    if rows is not None:
+        rows.pop(session_id, None)
+
+
+def init_app(app):
+    """Give every request its own row memo"""
+
+    @app.before_request
+    def _open_memo():
+        _request_rows.set({})
+
+    @app.teardown_request
+    def _close_memo(exc):
+        _request_rows.set(None)
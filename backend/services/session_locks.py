@@ -0,0 +1,65 @@
+# Per-session locks, so one session's chat turns run one at a time
+#
+# A chat turn reads the transcript, waits on the LLM and appends to the
+# transcript; two turns for the same session running at once would both
+# answer from the same history and interleave their writes. hold(session_id)
+# serializes them within this worker, while different sessions never wait on
+# each other. Locks exist only while someone holds or waits on them.
+#
+# Other workers are not covered; the session cache's version check on flush
+# catches appends made elsewhere (see services/session_cache.py).
+import os
+import threading
+from contextlib import contextmanager
+
+WAIT_SECONDS = float(os.getenv("SESSION_LOCK_TIMEOUT", "120"))
+
+
+class SessionBusy(Exception):
+    pass
+
+
+class SessionLocks:
+    def __init__(self, timeout: float = WAIT_SECONDS):
+        self.timeout = timeout
+        self._locks = {}  # session_id -> [lock, holders + waiters]
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.timeouts = 0
+
+    @contextmanager
+    def hold(self, session_id: str, timeout: float = None):
+        """
+        Hold a session's lock for the duration of the block.
+
+        Raises:
+            SessionBusy: if the lock could not be taken within `timeout`
+                seconds (SESSION_LOCK_TIMEOUT by default)
+        """
+        with self._lock:
+            entry = self._locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(blocking=False):
+                with self._lock:
+                    self.waits += 1
+                if not entry[0].acquire(timeout=self.timeout if timeout is None else timeout):
+                    with self._lock:
+                        self.timeouts += 1
+                    raise SessionBusy(f"Another request for session {session_id} is still running")
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[session_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"held": len(self._locks), "waits": self.waits, "timeouts": self.timeouts}
+
+
+session_locks = SessionLocks()
@@ -0,0 +1,98 @@
+# Single-flight execution of identical requests
+#
+# The first request for a key runs; requests for the same key that arrive
+# while it is running wait for it and get its result (or its error) instead
+# of doing the work again. With remember=True a successful result is also
+# kept for IDEMPOTENCY_TTL seconds, so a retry sent after the first request
+# finished gets the same answer.
+#
+# Calls are shared within this worker only.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL", "600"))
+MAX_REMEMBERED = 1000
+# A call still unfinished after this long is taken as abandoned (e.g. a stream
+# that was never consumed), and the next request for its key runs again
+MAX_RUNNING_SECONDS = 600
+
+
+class FingerprintMismatch(Exception):
+    """An idempotency key was reused for a different request"""
+
+
+class Call:
+    def __init__(self, fingerprint: str = None):
+        self.fingerprint = fingerprint
+        self.started_at = time.monotonic()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: float = None):
+        """The leader's result; re-raises its error"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Timed out waiting for the original request")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    def __init__(self, result_ttl: float = RESULT_TTL_SECONDS, max_running: float = MAX_RUNNING_SECONDS):
+        self.result_ttl = result_ttl
+        self.max_running = max_running
+        self._calls = OrderedDict()  # key -> running or remembered Call
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def begin(self, key, fingerprint: str = None) -> tuple:
+        """
+        Join the call for `key`, starting it if there is none.
+
+        Returns:
+            (call, leader); the leader must end the call with finish(), the
+            others wait on call.wait()
+
+        Raises:
+            FingerprintMismatch: if the key's call was started with a different fingerprint
+        """
+        with self._lock:
+            self._prune()
+            call = self._calls.get(key)
+            if call is not None and call.finished_at is None and time.monotonic() - call.started_at > self.max_running:
+                call = None
+            if call is not None:
+                if call.fingerprint != fingerprint:
+                    raise FingerprintMismatch("Idempotency key was already used for a different request")
+                self.shared += 1
+                return call, False
+            call = Call(fingerprint)
+            self._calls[key] = call
+            return call, True
+
+    def finish(self, key, call: Call, result=None, error: Exception = None, remember: bool = False):
+        """Publish the leader's result (or error) to everyone waiting on the call"""
+        call.result, call.error = result, error
+        call.finished_at = time.monotonic()
+        with self._lock:
+            if (not remember or error is not None) and self._calls.get(key) is call:
+                del self._calls[key]
+        call._done.set()
+
+    def _prune(self):
+        # Called with self._lock held; remembered results age out oldest first
+        cutoff = time.monotonic() - self.result_ttl
+        finished = [(key, call) for key, call in self._calls.items() if call.finished_at is not None]
+        for i, (key, call) in enumerate(finished):
+            if call.finished_at >= cutoff and len(finished) - i <= MAX_REMEMBERED:
+                break
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = sum(1 for call in self._calls.values() if call.finished_at is None)
+            return {"running": running, "remembered": len(self._calls) - running, "shared": self.shared}
@@ -0,0 +1,204 @@
+# Versioned summary history on top of the Supabase `transcripts` bucket
+#
+# Layout per session:
+#   summaries/history/<session_id>/manifest.json  {"version", "snapshot_every", "count", "iterations"}
+#   summaries/history/<session_id>/00000.jsonl    iterations 1..K: a snapshot, then diffs
+#   summaries/history/<session_id>/00001.jsonl    iterations K+1..2K
+#
+# Each segment starts with the full text of its first iteration; the others
+# store only a sentence-level diff against the iteration before. Storage grows
+# with the size of the edits plus one snapshot every SUMMARY_SNAPSHOT_EVERY
+# iterations, and any iteration is rebuilt from one segment (at most K-1
+# diffs). Only the tail segment and the manifest are rewritten on save.
+#
+# Every iteration also keeps the reviewer comments that produced it. The
+# manifest holds a small index entry per iteration, so listing needs one read.
+import difflib
+import json
+import os
+import re
+import threading
+from datetime import datetime, timezone
+
+from services import round_trips, tracing
+from services.supabase_client import supabase
+
+SNAPSHOT_EVERY = int(os.getenv("SUMMARY_SNAPSHOT_EVERY", "10"))
+MANIFEST_VERSION = 1
+
+# A sentence or line with its trailing punctuation/newlines; joining the
+# tokens gives back the original text
+_TOKEN = re.compile(r"[^.!?\n]*[.!?\n]*")
+
+
+def _tokens(text: str) -> list:
+    return [token for token in _TOKEN.findall(text) if token]
+
+
+def diff(old: str, new: str) -> list:
+    """
+    Edit script turning `old` into `new`: [start, end] copies old tokens
+    start..end, a string is inserted as is
+    """
+    old_tokens, new_tokens = _tokens(old), _tokens(new)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(new_tokens[j1:j2]))
+    return ops
+
+
+def patch(old: str, ops: list) -> str:
+    old_tokens = _tokens(old)
+    return "".join(op if isinstance(op, str) else "".join(old_tokens[op[0]:op[1]]) for op in ops)
+
+
+class SummaryHistory:
+    def __init__(self, bucket, snapshot_every: int = SNAPSHOT_EVERY):
+        self.bucket = bucket
+        self.snapshot_every = snapshot_every
+        # Saves for one session must not interleave (per process)
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    # Paths
+
+    def _manifest_path(self, session_id: str) -> str:
+        return f"summaries/history/{session_id}/manifest.json"
+
+    def _segment_path(self, session_id: str, index: int) -> str:
+        return f"summaries/history/{session_id}/{index:05d}.jsonl"
+
+    # Low-level IO
+
+    def _download(self, path: str):
+        round_trips.record("storage")
+        try:
+            return self.bucket.download(path)
+        except Exception:
+            return None
+
+    def _upload(self, path: str, content: bytes, content_type: str):
+        round_trips.record("storage")
+        self.bucket.upload(path, content, {"content-type": content_type, "upsert": "true"})
+
+    def read_manifest(self, session_id: str):
+        raw = self._download(self._manifest_path(session_id))
+        if raw is None:
+            return None
+        return json.loads(raw.decode("utf-8"))
+
+    def _read_segment(self, session_id: str, index: int) -> list:
+        raw = self._download(self._segment_path(session_id, index))
+        if not raw:
+            return []
+        return [json.loads(line) for line in raw.decode("utf-8").splitlines() if line]
+
+    def _write_segment(self, session_id: str, index: int, records: list):
+        content = "".join(json.dumps(r) + "\n" for r in records)
+        self._upload(self._segment_path(session_id, index), content.encode("utf-8"), "application/x-ndjson")
+
+    @staticmethod
+    def _rebuild(records: list, iteration: int) -> tuple:
+        """(text, record) of `iteration` from its segment's records"""
+        text = None
+        for record in records:
+            text = record["summary"] if "summary" in record else patch(text, record["diff"])
+            if record["iteration"] == iteration:
+                return text, record
+        return None, None
+
+    # Public API
+
+    def save(self, session_id: str, summary_text: str, comments: list = None, source: str = "regenerate") -> dict:
+        """
+        Record a new iteration of a session's summary.
+
+        Saving the same text as the latest iteration without comments is a
+        no-op.
+
+        Args:
+            session_id: Session identifier
+            summary_text: Full text of the new summary
+            comments: Reviewer comments that produced it
+            source: What produced it ("summarize", "regenerate", "approve")
+
+        Returns:
+            the iteration's index entry
+        """
+        with self._locks[hash(session_id) % len(self._locks)]:
+            manifest = self.read_manifest(session_id) or {
+                "version": MANIFEST_VERSION, "snapshot_every": self.snapshot_every, "count": 0, "iterations": []}
+            every = manifest["snapshot_every"]
+            iteration = manifest["count"] + 1
+            index, offset = divmod(iteration - 1, every)
+
+            record = {"iteration": iteration, "created_at": datetime.now(timezone.utc).isoformat(),
+                      "source": source, "comments": comments or []}
+            records = []
+            if offset:
+                records = self._read_segment(session_id, index)
+                with tracing.span("summary_history.diff"):
+                    latest, _ = self._rebuild(records, iteration - 1)
+                    if latest == summary_text and not comments:
+                        return manifest["iterations"][-1]
+                    record["diff"] = diff(latest, summary_text)
+            else:
+                record["summary"] = summary_text
+
+            self._write_segment(session_id, index, records + [record])
+            entry = {"iteration": iteration, "created_at": record["created_at"], "source": source,
+                     "kind": "snapshot" if offset == 0 else "diff", "chars": len(summary_text),
+                     "comments": len(record["comments"])}
+            manifest["count"] = iteration
+            manifest["iterations"].append(entry)
+            self._upload(self._manifest_path(session_id), json.dumps(manifest).encode("utf-8"), "application/json")
+            return entry
+
+    def list(self, session_id: str, before: int = None, limit: int = 20) -> tuple:
+        """
+        Index entries of a session's iterations, newest first.
+
+        Args:
+            session_id: Session identifier
+            before: Only iterations older than this one (next_cursor of the previous page)
+            limit: Page size
+
+        Returns:
+            (entries, next_cursor, count); next_cursor is None on the last page
+        """
+        manifest = self.read_manifest(session_id)
+        if manifest is None:
+            return [], None, 0
+        entries = manifest["iterations"]
+        end = min(before - 1, len(entries)) if before is not None else len(entries)
+        page = entries[max(end - limit, 0):max(end, 0)][::-1]
+        next_cursor = page[-1]["iteration"] if page and page[-1]["iteration"] > 1 else None
+        return page, next_cursor, manifest["count"]
+
+    def get(self, session_id: str, iteration: int = None):
+        """
+        One iteration with its full text and comments (latest if not given).
+
+        Returns:
+            {"iteration", "summary", "comments", "created_at", "source"},
+            or None if there is no such iteration
+        """
+        manifest = self.read_manifest(session_id)
+        if manifest is None or manifest["count"] == 0:
+            return None
+        iteration = manifest["count"] if iteration is None else iteration
+        if not 1 <= iteration <= manifest["count"]:
+            return None
+        records = self._read_segment(session_id, (iteration - 1) // manifest["snapshot_every"])
+        with tracing.span("summary_history.rebuild"):
+            text, record = self._rebuild(records, iteration)
+        if record is None:
+            return None
+        return {"iteration": iteration, "summary": text, "comments": record["comments"],
+                "created_at": record["created_at"], "source": record["source"]}
+
+
+summary_history = SummaryHistory(supabase.storage.from_("transcripts"))
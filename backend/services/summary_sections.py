@@ -0,0 +1,180 @@
+# Splitting a summary into its fixed heading sections
+#
+# SUMMARIZE_PROMPT asks for seven headings in a fixed order. parse() finds
+# them (however the model marked them up: **__x__**, **x**, ## x, <u>x</u>)
+# and cuts the summary into a preamble plus one slice per heading, so that
+# joining the slices gives back the exact text. Comments are mapped to the
+# sections their highlighted text falls in, and relevant_turns() picks the
+# parts of the transcript that matter for a section, so a regeneration can
+# rewrite only the sections that were commented on; extract_section() checks
+# that a rewrite is that one section before it is stitched back in.
+import re
+
+from services.context import estimate_tokens
+
+# (key, heading as written in SUMMARIZE_PROMPT, prefixes that identify it)
+SECTIONS = [
+    ("goals", "High-level goals/business objectives", ("high-level goals", "high level goals")),
+    ("features", "Functional & non-functional capabilities/features",
+     ("functional & non-functional", "functional and non-functional")),
+    ("technical", "Technical considerations", ("technical considerations",)),
+    ("constraints", "Requirements/constraints", ("requirements/constraints", "requirements and constraints")),
+    ("teams", "Teams/team members", ("teams/team members", "teams and team members", "team members")),
+    ("assumptions", "Project assumptions", ("project assumptions",)),
+    ("deliverables", "Project deliverables", ("project deliverables",)),
+]
+_ORDER = {key: i for i, (key, _, _) in enumerate(SECTIONS)}
+MIN_SECTIONS = 3  # fewer recognised headings than this and the summary is treated as unstructured
+
+_MARKUP = re.compile(r"</?u>|[*_#>:`]")
+_SLASH = re.compile(r"\s*/\s*")
+_WORD = re.compile(r"[a-z0-9][a-z0-9'-]{2,}")
+_STOPWORDS = set("""
+the and for with that this are was were will would should could have has had not but you your our
+their they them what which when where who how why can its it's also into from about than then there
+these those such each any all more most some other very just like been being does did doing over
+project client team section summary
+""".split())
+
+
+def heading_key(line: str):
+    """Key of the section a line is the heading of, or None"""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 120:
+        return None
+    # A heading is marked up (bold/underline/#) or is the bare heading text alone on its line
+    marked = stripped[0] in "*_#<"
+    normalized = _SLASH.sub("/", " ".join(_MARKUP.sub(" ", stripped).split())).lower()
+    for key, heading, prefixes in SECTIONS:
+        if normalized.startswith(prefixes) and (marked or normalized == heading.lower()):
+            return key
+    return None
+
+
+def parse(summary: str):
+    """
+    Split a summary at its headings. Headings must come in SUMMARIZE_PROMPT
+    order (some may be missing), so a bold sub-heading inside a section is
+    not mistaken for a later section.
+
+    Returns:
+        (preamble, sections) where sections is a list of
+        {"key", "heading", "text", "start", "end"} in document order and
+        preamble + "".join(s["text"] for s in sections) == summary;
+        None if fewer than MIN_SECTIONS distinct headings were found
+    """
+    starts = []
+    offset = 0
+    last = -1
+    for line in summary.splitlines(keepends=True):
+        key = heading_key(line)
+        if key is not None and _ORDER[key] > last:
+            last = _ORDER[key]
+            starts.append((offset, key, line.strip()))
+        offset += len(line)
+    if len(starts) < MIN_SECTIONS:
+        return None
+
+    sections = []
+    for i, (start, key, heading) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(summary)
+        sections.append({"key": key, "heading": heading, "text": summary[start:end], "start": start, "end": end})
+    return summary[:starts[0][0]], sections
+
+
+def extract_section(text: str, section: dict):
+    """
+    A model's rewrite of one section, starting at its heading (the original
+    heading is added if the rewrite has none). Text before the heading is
+    dropped.
+
+    Returns:
+        the section text, or None if the rewrite contains another section's
+        heading or repeats its own
+    """
+    lines = text.strip().splitlines(keepends=True)
+    keys = [heading_key(line) for line in lines]
+    found = [i for i, key in enumerate(keys) if key is not None]
+    if any(keys[i] != section["key"] for i in found) or len(found) > 1:
+        return None
+    if not found:
+        return f"{section['heading']}\n\n" + "".join(lines)
+    return "".join(lines[found[0]:])
+
+
+def locate_comment(summary: str, comment: dict):
+    """(start, end) of a comment's highlighted text in the summary, or None if it can't be found"""
+    text = (comment.get("highlightedText") or "").strip()
+    if not text:
+        return None
+    start = comment.get("startOffset")
+    if isinstance(start, int) and summary[start:start + len(text)] == text:
+        return start, start + len(text)
+    start = summary.find(text)
+    if start == -1:
+        return None
+    return start, start + len(text)
+
+
+def assign_comments(summary: str, sections: list, comments: list):
+    """
+    Map each comment to the sections its highlight overlaps.
+
+    Returns:
+        {section key: [comments]}, or None if any comment could not be
+        placed in a section (e.g. it highlights the preamble or text that is
+        no longer in the summary)
+    """
+    assigned = {}
+    for comment in comments:
+        span = locate_comment(summary, comment)
+        if span is None:
+            return None
+        hit = [s for s in sections if s["start"] < span[1] and span[0] < s["end"]]
+        if not hit:
+            return None
+        for section in hit:
+            assigned.setdefault(section["key"], []).append(comment)
+    return assigned
+
+
+def _words(text: str) -> set:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+
+def split_turns(messages: list) -> list:
+    """Group transcript messages into turns: a client message plus the replies to it"""
+    turns = []
+    for m in messages:
+        if m.get("role") != "bot" or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return turns
+
+
+def relevant_turns(messages: list, section: dict, comments: list, max_tokens: int) -> list:
+    """
+    The transcript messages most related to a section and its comments, in
+    transcript order and within about max_tokens. Transcripts that already
+    fit are returned whole.
+    """
+    def render(turn):
+        return "\n".join(m.get("message", "") for m in turn)
+
+    if estimate_tokens(render(messages)) <= max_tokens:
+        return messages
+
+    turns = split_turns(messages)
+    query = _words(section["text"] + " " + " ".join(
+        f"{c.get('highlightedText', '')} {c.get('comment', '')}" for c in comments))
+    scored = sorted(((len(query & _words(render(turn))), i) for i, turn in enumerate(turns)), reverse=True)
+    keep, used = set(), 0
+    for score, i in scored:
+        if score == 0:
+            break
+        tokens = estimate_tokens(render(turns[i]))
+        if used + tokens > max_tokens:
+            continue
+        keep.add(i)
+        used += tokens
+    return [m for i, turn in enumerate(turns) if i in keep for m in turn]
@@ -1,155 +1,216 @@
 # Supabase client for storage and database operations
 import os
 import json
-from datetime import datetime
-from supabase import create_client, Client
-from typing import Tuple
+import base64
+from datetime import datetime, timedelta, timezone
+from services import round_trips, tracing
+from services.log import SAMPLED, get_logger
+from services.session_index import session_index, cached_row, remember_row, forget_row, UNKNOWN
 
-# Initialize Supabase client
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+log = get_logger(__name__)
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("[WARNING] SUPABASE_URL or SUPABASE_KEY not set in .env")
+# "supabase" (default) or "local" (SQLite + local directory, see services/local_backend.py)
+PERSISTENCE_BACKEND = os.getenv("PERSISTENCE_BACKEND", "supabase").lower()
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+if PERSISTENCE_BACKEND == "local":
+    from services.local_backend import create_local_client
 
-def upload_transcript_to_storage(session_id: str, transcript: list) -> Tuple[str, bool, str]:
-    """
-    Upload transcript JSON to Supabase Storage
-    
-    Args:
-        session_id: Unique session identifier
-        transcript: List of message dictionaries
-    
-    Returns:
-        Public URL of uploaded transcript
-        Bool of if it already exists
-        Session data (from DB)
-    """
-    try:
+    supabase = create_local_client()
+    log.info("Using local persistence backend at %s", supabase.db_path)
+else:
+    from supabase import create_client, Client
 
-        # Flag
-        exists = False
+    # Initialize Supabase client
+    SUPABASE_URL = os.getenv("SUPABASE_URL")
+    SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-        # Check DB to see if record with that session ID exists
-        row = get_session(session_id)
-        # print(f"[DEBUG] upload_transcript_to_storage: row data is {row}")
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        log.warning("SUPABASE_URL or SUPABASE_KEY not set in .env")
 
-        # Var to hold existing content
-        content = ""
-        file_name = f"transcripts/{session_id}.json"
-        
-        # If so, we'll pull the existing transcript and append to it
-        if row:
-            exists = True
-            print(f"[DEBUG] Uploading transcript; existing one found in DB {row}")
-            print(f"[DEBUG] Existing transcript is at {file_name}")
-            try: 
-                existing = supabase.storage.from_("transcripts").download(file_name)
-                content = existing.decode("utf-8")
-            except Exception:
-                # If something goes wrong, just make it empty
-                content = ""
-
-        # Otherwise, we write to a new transcript
-
-        # Generate new file content
-        if content:
-            existing_json = json.loads(content)
-        else:
-            existing_json = []
-        
-        combined_json = existing_json + transcript
-        combined = json.dumps(combined_json, indent=2)
-        # print(combined)
-        
-        # Upload to storage bucket named 'transcripts'
-        response = supabase.storage.from_("transcripts").upload(
-            file_name,
-            combined.encode('utf-8'),
-            {"content-type": "application/json", "upsert": "true"}
-        )
-        
-        # Get public URL
-        public_url = supabase.storage.from_("transcripts").get_public_url(file_name)
-        print(f"[DEBUG] Uploaded transcript to: {public_url}")
-        return exists, public_url, row
-    
-    except Exception as e:
-        print(f"[ERROR] Failed to upload transcript: {e}")
-        raise
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Every table query and storage call becomes a tracing span
+supabase = tracing.instrument_client(supabase)
+
+# Session list: the fields the sidebar uses (not metadata, which can be large);
+# title is the display title
+SESSION_LIST_COLUMNS = "id,session_id,user_id,title:display_title,transcript_url,created_at,ended_at"
+SESSION_PAGE_SIZE = int(os.getenv("SESSION_PAGE_SIZE", "50"))
+SESSION_PAGE_SIZE_MAX = 200
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "200"))
+MESSAGE_PAGE_SIZE_MAX = 1000
+# Delta syncs re-read messages written this long before the cursor, so a write
+# that committed after a poll but got an earlier timestamp is still picked up
+MESSAGE_SYNC_OVERLAP_MS = int(os.getenv("MESSAGE_SYNC_OVERLAP_MS", "2000"))
+MESSAGE_SYNC_OVERLAP_ROWS = 100
+CHAT_MESSAGE_FIELDS = ("sender", "text", "options", "allow_other", "selected_option", "custom_response")
+CHAT_MESSAGE_BATCH_MAX = int(os.getenv("CHAT_MESSAGE_BATCH_MAX", "500"))
 
-def save_session_to_db(session_id: str, transcript_url: str, user_id: str = None, title: str = None) -> dict:
+def create_session(session_id: str, transcript_url: str, user_id: str = None, title: str = None) -> tuple:
     """
-    Save session metadata to Postgres database
-    
+    Create a session's Postgres row, unless another request already did.
+
+    Inserts with ON CONFLICT DO NOTHING, so an existing row keeps its
+    created_at, title and user_id.
+
     Args:
         session_id: Unique session identifier
         transcript_url: Public URL of uploaded transcript
         user_id: Optional user identifier
         title: Optional session title
-    
+
     Returns:
-        Inserted session record
+        (row, created); row is the existing one if created is False
     """
     try:
-
+        now = datetime.utcnow().isoformat()
         session_data = {
             "session_id": session_id,
             "transcript_url": transcript_url,
             "user_id": user_id,
-            "created_at": datetime.utcnow().isoformat(),
-            "ended_at": datetime.utcnow().isoformat(),
-            "title": title
+            "created_at": now,
+            "ended_at": now,
+            "title": title or None,
         }
-        
-        print(f"[DEBUG] save_session_to_db: Title is {title}")
+        log.debug("create_session: Title is %s", title)
+
+        round_trips.record("db")
+        response = supabase.table("sessions").upsert(
+            session_data, on_conflict="session_id", ignore_duplicates=True).execute()
+        if response.data:
+            log.debug("Saved session %s to database", session_id)
+            row, created = response.data[0], True
+        else:
+            log.debug("Session %s already exists, keeping its row", session_id)
+            round_trips.record("db")
+            response = supabase.table("sessions").select("*").eq("session_id", session_id).execute()
+            row, created = (response.data[0] if response.data else None), False
+        if row is not None:
+            remember_row(session_id, row)
+        return row, created
 
-        if title:
-            session_data["title"] = title
-        
-        response = supabase.table("sessions").upsert(session_data, on_conflict="session_id").execute()
-        print(f"[DEBUG] Saved session {session_id} to database")
-        return response.data[0] if response.data else None
-    
     except Exception as e:
-        print(f"[ERROR] Failed to save session to database: {e}")
+        log.error("Failed to save session to database: %s", e)
         raise
 
-def get_session(session_id: str) -> dict:
-    """Retrieve session from database"""
+def get_session(session_id: str, fresh: bool = False) -> dict:
+    """
+    Retrieve session from database.
+
+    Fetched once per request (see services/session_index.py); sessions
+    recently seen not to exist are answered from the existence cache.
+
+    Args:
+        session_id: Session identifier
+        fresh: Ask the database whenever no row is cached, instead of
+            trusting "missing" answers; paths that create the row on a miss
+            use this, since another worker may have just created it
+    """
+    row = cached_row(session_id)
+    if row is not UNKNOWN and (row is not None or not fresh):
+        return row
+    if not fresh and session_index.exists(session_id) is False:
+        return None
     try:
+        round_trips.record("db")
         response = supabase.table("sessions").select("*").eq("session_id", session_id).execute()
-        return response.data[0] if response.data else None
+        row = response.data[0] if response.data else None
+        remember_row(session_id, row)
+        return row
     except Exception as e:
-        print(f"[ERROR] Failed to get session: {e}")
+        log.error("Failed to get session: %s", e)
         return None
 
 
-def list_sessions(user_id: str = None) -> list:
-    """List all sessions, optionally filtered by user_id"""
+def session_exists(session_id: str, fresh: bool = False) -> bool:
+    """Whether the session has a sessions row, from the existence cache when possible (see get_session)"""
+    exists = session_index.exists(session_id)
+    if exists is UNKNOWN or (fresh and not exists):
+        return get_session(session_id, fresh=fresh) is not None
+    return exists
+
+
+def update_session_title(session_id: str, title: str, only_if_title: str = None) -> dict:
+    """
+    Set the title on an existing session row.
+
+    Args:
+        session_id: Session identifier
+        title: New title
+        only_if_title: Only update while the row still has this title; if
+            None, only update a row that has no title yet
+
+    Returns:
+        the updated row, or None if no row matched
+    """
     try:
-        query = supabase.table("sessions").select("*")
-        if user_id:
-            query = query.eq("user_id", user_id)
+        round_trips.record("db")
+        query = supabase.table("sessions").update({"title": title}).eq("session_id", session_id)
+        if only_if_title is None:
+            query = query.is_("title", "null")
+        else:
+            query = query.eq("title", only_if_title)
         response = query.execute()
-        sessions = response.data
-        
-        if not sessions:
-            return sessions
-        
-        # Enhance sessions with fallback titles if not set
-        for session in sessions:
-            # If title doesn't exist or is None, use session ID as fallback
-            if not session.get("title"):
-                session_id = session["session_id"]
-                session["title"] = f"Session {session_id[-8:]}"
-        
-        return sessions
+        forget_row(session_id)
+        return response.data[0] if response.data else None
     except Exception as e:
-        print(f"[ERROR] Failed to list sessions: {e}")
-        return []
+        log.error("Failed to update session title: %s", e)
+        return None
+
+
+def encode_cursor(*values) -> str:
+    """Opaque pagination cursor for a keyset position, e.g. (created_at, id)"""
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, types: tuple) -> tuple:
+    """Values of a cursor converted with `types`; raises ValueError if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if len(values) != len(types):
+            raise ValueError
+        return tuple(t(v) for t, v in zip(types, values))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_sessions(user_id: str = None, limit: int = SESSION_PAGE_SIZE, cursor: str = None) -> tuple:
+    """
+    One page of sessions, newest first, with only the fields the sidebar needs.
+
+    Pages are keyset-based on (created_at, id), so each page costs the same
+    no matter how deep into the list it is. `title` is sessions.display_title,
+    which falls back to "Session <id suffix>" in the database.
+
+    Args:
+        user_id: Optional user to filter by
+        limit: Page size (capped at SESSION_PAGE_SIZE_MAX)
+        cursor: next_cursor from the previous page
+
+    Returns:
+        (sessions, next_cursor); next_cursor is None on the last page
+    """
+    limit = max(1, min(limit, SESSION_PAGE_SIZE_MAX))
+    query = supabase.table("sessions").select(SESSION_LIST_COLUMNS)
+    if user_id:
+        query = query.eq("user_id", user_id)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor, (str, int))
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})')
+    # One extra row tells us whether there is another page
+    query = query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+
+    try:
+        round_trips.record("db")
+        sessions = query.execute().data or []
+    except Exception as e:
+        log.error("Failed to list sessions: %s", e)
+        raise
+
+    next_cursor = None
+    if len(sessions) > limit:
+        next_cursor = encode_cursor(sessions[limit - 1]["created_at"], sessions[limit - 1]["id"])
+    return sessions[:limit], next_cursor
         
 
 def save_chat_message(session_id: str, message_id: str, sender: str, text: str = None, 
@@ -171,52 +232,164 @@ def save_chat_message(session_id: str, message_id: str, sender: str, text: str =
     Returns:
         Inserted message record
     """
-    try:
-        # Ensure session exists first
+    result = save_chat_messages([{
+        "session_id": session_id,
+        "message_id": message_id,
+        "sender": sender,
+        "text": text,
+        "options": options,
+        "allow_other": allow_other,
+        "selected_option": selected_option,
+        "custom_response": custom_response,
+    }])[0]
+    if result["status"] != "saved":
+        raise RuntimeError(result["error"])
+    return result["message"]
+
+
+def save_chat_messages(messages: list) -> list:
+    """
+    Save a batch of chat messages, for one or more sessions, in at most two round trips.
+
+    Parent sessions are created with one upsert that leaves existing rows
+    untouched (skipped when the existence cache already knows them all), then
+    all messages are written with one bulk upsert on (session_id, message_id). Items without a session_id or message_id are
+    rejected individually; if a message_id repeats within a session, the last
+    item wins and the earlier ones are reported as "duplicate".
+
+    Args:
+        messages: Message dicts with session_id, message_id and the fields
+            in CHAT_MESSAGE_FIELDS
+
+    Returns:
+        One result per input item, in order:
+        {"index", "session_id", "message_id", "status"} plus "message" (the
+        saved row) when status is "saved" or "error" otherwise
+    """
+    results = []
+    rows = {}  # (session_id, message_id) -> row; later items replace earlier ones
+    pending = {}  # (session_id, message_id) -> result of the item that will be written
+
+    for index, item in enumerate(messages):
+        item = item if isinstance(item, dict) else {}
+        session_id = item.get("session_id")
+        message_id = item.get("message_id")
+        result = {"index": index, "session_id": session_id, "message_id": message_id}
+        results.append(result)
+        if not session_id or message_id in (None, ""):
+            result.update(status="error", error="session_id and message_id required")
+            continue
+        key = (session_id, str(message_id))
+        if key in pending:
+            pending[key].update(status="duplicate", error="message_id repeated later in the batch")
+        pending[key] = result
+        row = {field: item.get(field) for field in CHAT_MESSAGE_FIELDS}
+        # timestamp (the last-write time get_chat_messages syncs on) is set by the database
+        row.update(session_id=session_id, message_id=key[1], allow_other=bool(row["allow_other"]))
+        rows[key] = row
+
+    if rows:
+        saved, error = {}, None
         try:
-            existing_session = supabase.table("sessions").select("*").eq("session_id", session_id).execute()
-            if not existing_session.data:
-                # Create session if it doesn't exist
-                supabase.table("sessions").insert({
-                    "session_id": session_id,
-                    "transcript_url": "",
-                    "user_id": None
-                }).execute()
-        except Exception:
-            pass  # Continue anyway
-        
-        message_data = {
-            "session_id": session_id,
-            "message_id": str(message_id),
-            "sender": sender,
-            "text": text,
-            "options": options,
-            "allow_other": allow_other,
-            "selected_option": selected_option,
-            "custom_response": custom_response
-        }
-        
-        response = supabase.table("chat_messages").upsert(message_data).execute()
-        print(f"[DEBUG] Saved chat message {message_id} for session {session_id}")
-        return response.data[0] if response.data else None
-    
-    except Exception as e:
-        print(f"[ERROR] Failed to save chat message: {e}")
-        raise
+            # Conflict-tolerant: existing sessions keep their transcript_url, title and owner
+            session_ids = list(dict.fromkeys(session_id for session_id, _ in rows))
+            unknown = [session_id for session_id in session_ids if session_index.exists(session_id) is not True]
+            if unknown:
+                round_trips.record("db")
+                supabase.table("sessions").upsert(
+                    [{"session_id": session_id, "transcript_url": "", "user_id": None} for session_id in unknown],
+                    on_conflict="session_id", ignore_duplicates=True,
+                ).execute()
+                for session_id in unknown:
+                    # Rows created here are bare; whoever asks next in this request fetches them
+                    forget_row(session_id)
+                    session_index.remember(session_id, True)
+
+            round_trips.record("db")
+            response = supabase.table("chat_messages").upsert(
+                list(rows.values()), on_conflict="session_id,message_id"
+            ).execute()
+            saved = {(row["session_id"], row["message_id"]): row for row in response.data or []}
+            log.debug("Saved %d chat messages for %d sessions", len(rows), len(session_ids), extra=SAMPLED)
+        except Exception as e:
+            log.error("Failed to save chat messages: %s", e)
+            error = str(e)
+
+        for key, result in pending.items():
+            if error is None:
+                result.update(status="saved", message=saved.get(key))
+            else:
+                result.update(status="error", error=error)
+
+    return results
+
 
-def get_chat_messages(session_id: str) -> list:
+def _message_position(row: dict) -> tuple:
+    return datetime.fromisoformat(row["timestamp"]), row["message_id"]
+
+
+def get_chat_messages(session_id: str, since: str = None, limit: int = MESSAGE_PAGE_SIZE) -> tuple:
     """
-    Retrieve all chat messages for a session
-    
+    Chat messages for a session that were written after a cursor.
+
+    Messages come in the order they were last written, keyset-paginated on
+    (timestamp, message_id); the database sets `timestamp` on every write
+    (migrations/006_chat_message_write_time.sql), so an edited message shows
+    up again after the cursor. A write can still commit after a poll with a
+    timestamp just behind that poll's cursor, so a delta sync also re-sends
+    the messages written up to MESSAGE_SYNC_OVERLAP_MS before the cursor.
+    Clients merge by message_id and keep polling with next_cursor.
+
     Args:
         session_id: Session identifier
-    
+        since: next_cursor from an earlier call (None for the full history)
+        limit: Page size (capped at MESSAGE_PAGE_SIZE_MAX), not counting re-sent messages
+
     Returns:
-        List of chat messages ordered by timestamp
+        (messages, next_cursor, has_more); next_cursor points at the last
+        new message returned, or is `since` again if nothing changed
     """
+    limit = max(1, min(limit, MESSAGE_PAGE_SIZE_MAX))
+    query = supabase.table("chat_messages").select("*").eq("session_id", session_id)
+    if not since:
+        round_trips.record("db")
+        messages = _execute_messages(query.order("timestamp").order("message_id").limit(limit + 1))
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1]["timestamp"], messages[-1]["message_id"]) if messages else since
+        return messages, next_cursor, has_more
+
+    timestamp, message_id = decode_cursor(since, (str, str))
+    try:
+        cursor = (datetime.fromisoformat(timestamp), message_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    window_start = (cursor[0] - timedelta(milliseconds=MESSAGE_SYNC_OVERLAP_MS)).isoformat(timespec="microseconds")
+    fetch = limit + 1 + MESSAGE_SYNC_OVERLAP_ROWS
+    round_trips.record("db")
+    rows = _execute_messages(query.gte("timestamp", window_start).order("timestamp").order("message_id").limit(fetch))
+    overlap = [row for row in rows if _message_position(row) <= cursor]
+    fresh = [row for row in rows if _message_position(row) > cursor]
+    # Rows past the last one fetched were cut off by the limit
+    has_more = len(fresh) > limit or len(rows) == fetch
+    if len(rows) == fetch and not fresh:
+        # A burst of writes filled the overlap window; page on past the cursor instead
+        overlap = []
+        round_trips.record("db")
+        fresh = _execute_messages(
+            supabase.table("chat_messages").select("*").eq("session_id", session_id)
+            .or_(f'timestamp.gt."{timestamp}",and(timestamp.eq."{timestamp}",message_id.gt."{message_id}")')
+            .order("timestamp").order("message_id").limit(limit + 1))
+        has_more = len(fresh) > limit
+
+    fresh = fresh[:limit]
+    next_cursor = encode_cursor(fresh[-1]["timestamp"], fresh[-1]["message_id"]) if fresh else since
+    return overlap + fresh, next_cursor, has_more
+
+
+def _execute_messages(query) -> list:
     try:
-        response = supabase.table("chat_messages").select("*").eq("session_id", session_id).order("timestamp", desc=False).execute()
-        return response.data if response.data else []
+        return query.execute().data or []
     except Exception as e:
-        print(f"[ERROR] Failed to get chat messages: {e}")
-        return []
\ No newline at end of file
+        log.error("Failed to get chat messages: %s", e)
+        raise
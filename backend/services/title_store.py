@@ -0,0 +1,104 @@
+# Session titles, read through to sessions.title
+#
+# Each worker keeps a bounded LRU of recently seen titles. A miss reads the
+# sessions row, so a title generated by one worker is picked up by the
+# others instead of being generated again. Placeholder (fallback) titles are
+# cached only briefly, so workers pick up the generated title soon after it
+# is stored.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.supabase_client import get_session, update_session_title
+
+MAX_ENTRIES = int(os.getenv("TITLE_CACHE_MAX_ENTRIES", "1024"))
+TTL_SECONDS = float(os.getenv("TITLE_CACHE_TTL", "300"))
+PROVISIONAL_TTL_SECONDS = float(os.getenv("TITLE_CACHE_PROVISIONAL_TTL", "10"))
+
+_MISSING = object()
+
+
+class TitleStore:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS,
+                 provisional_ttl: float = PROVISIONAL_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.provisional_ttl = provisional_ttl
+        self._entries = OrderedDict()  # session_id -> (title, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db_reads = 0
+
+    def _cached(self, session_id: str):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def remember(self, session_id: str, title: str, provisional: bool = False):
+        """Cache a title locally without writing it anywhere"""
+        if not title:
+            return
+        ttl = self.provisional_ttl if provisional else self.ttl
+        with self._lock:
+            self._entries[session_id] = (title, time.monotonic() + ttl)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, session_id: str, session_row: dict = _MISSING):
+        """
+        Title for a session, or None if it has none yet.
+
+        Args:
+            session_id: Session identifier
+            session_row: The sessions row if the caller already loaded it
+                (None meaning "no row"); skips the DB read on a cache miss
+        """
+        title = self._cached(session_id)
+        if title is not _MISSING:
+            return title
+
+        if session_row is _MISSING:
+            with self._lock:
+                self.db_reads += 1
+            session_row = get_session(session_id)
+        title = (session_row or {}).get("title")
+        self.remember(session_id, title)
+        return title
+
+    def store_generated(self, session_id: str, title: str, replaces: str = None) -> bool:
+        """
+        Store a generated title on the sessions row.
+
+        If `replaces` is given, the row is only updated while it still holds
+        that placeholder, so a title another worker stored first is kept.
+
+        Returns:
+            True if this title was stored
+        """
+        row = update_session_title(session_id, title, only_if_title=replaces)
+        if row is None:
+            # Someone else got there first; adopt whatever the row now says
+            self.discard(session_id)
+            return False
+        self.remember(session_id, title)
+        return True
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits,
+                    "misses": self.misses, "db_reads": self.db_reads}
+
+
+title_store = TitleStore()
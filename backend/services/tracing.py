@@ -0,0 +1,321 @@
+# Lightweight request tracing and Prometheus-style histograms
+#
+# Every request gets a trace (request id + session id). span(name, kind)
+# times a block of work, e.g. an LLM call or a table query, and adds it to
+# both the current trace and the span duration histogram. The Supabase client
+# is wrapped by instrument_client(), so every table query and storage call is
+# a span without touching the call sites.
+#
+# Histograms are exported in Prometheus text format at GET /api/metrics.
+# Requests slower than TRACE_SLOW_MS are logged with their span breakdown.
+# With TRACING=off, span() returns a shared no-op and nothing is wrapped.
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+ENABLED = os.getenv("TRACING", "on").lower() not in ("0", "off", "false", "no")
+SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "0"))  # 0 disables the slow-request log
+MAX_SPANS_PER_TRACE = 256
+RECENT_SLOW = 50
+
+# Seconds; Prometheus' default buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar("trace", default=None)
+
+
+# Histograms
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, seconds: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += seconds
+
+    def render(self) -> list:
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(snapshot.items()):
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {round(series[-1], 6)}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_seconds = Histogram("rally_request_duration_seconds", "HTTP request latency",
+                            ("method", "endpoint", "status"))
+span_seconds = Histogram("rally_span_duration_seconds", "Latency of traced operations",
+                         ("kind", "span"))
+
+
+# Traces and spans
+
+class Trace:
+    __slots__ = ("request_id", "session_id", "name", "started", "spans", "status")
+
+    def __init__(self, name: str, request_id: str = None, session_id: str = None):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.session_id = session_id
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []  # (name, kind, seconds, error)
+        self.status = None
+
+    def breakdown(self) -> list:
+        """Spans grouped by name: [{"span", "kind", "count", "ms"}], slowest first"""
+        grouped = {}
+        for name, kind, seconds, error in self.spans:
+            entry = grouped.setdefault(name, {"span": name, "kind": kind, "count": 0, "ms": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["ms"] += seconds * 1000
+            entry["errors"] += error
+        for entry in grouped.values():
+            entry["ms"] = round(entry["ms"], 1)
+        return sorted(grouped.values(), key=lambda e: e["ms"], reverse=True)
+
+
+class _Span:
+    __slots__ = ("name", "kind", "started")
+
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        span_seconds.observe((self.kind, self.name), seconds)
+        trace = _current.get()
+        if trace is not None and len(trace.spans) < MAX_SPANS_PER_TRACE:
+            trace.spans.append((self.name, self.kind, seconds, exc_type is not None))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, kind: str = "app"):
+    """Time the enclosed block as a span ("llm", "db", "storage", "app", ...)"""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, kind)
+
+
+def current_trace():
+    return _current.get()
+
+
+def set_session(session_id: str):
+    """Attach a session id to the current trace"""
+    trace = _current.get()
+    if trace is not None and session_id:
+        trace.session_id = session_id
+
+
+# Flask integration
+
+_recent_slow = deque(maxlen=RECENT_SLOW)
+_slow_lock = threading.Lock()
+
+
+def init_app(app):
+    """Start a trace for every request and record it when the request ends"""
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        session_id = (request.view_args or {}).get("session_id")
+        if session_id is None and request.is_json:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                session_id = body.get("session_id")
+        trace = Trace(f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                      request_id=request.headers.get("X-Request-ID"), session_id=session_id)
+        _current.set(trace)
+        g.trace = trace
+
+    @app.after_request
+    def _tag_response(response):
+        trace = g.get("trace")
+        if trace is not None:
+            trace.status = response.status_code
+            response.headers["X-Request-ID"] = trace.request_id
+            if response.is_streamed:
+                # The body is generated after the view returns; finish once it is sent
+                g.trace = None
+                response.call_on_close(lambda: _finish(trace, None))
+        return response
+
+    @app.teardown_request
+    def _finish_trace(exc):
+        trace = g.pop("trace", None)
+        if trace is not None:
+            _finish(trace, exc)
+
+
+def _finish(trace: Trace, exc):
+    if _current.get() is trace:
+        _current.set(None)
+    _record_request(trace, 500 if exc is not None else trace.status)
+
+
+def _record_request(trace: Trace, status):
+    seconds = time.perf_counter() - trace.started
+    method, _, endpoint = trace.name.partition(" ")
+    request_seconds.observe((method, endpoint, str(status)), seconds)
+    if SLOW_MS and seconds * 1000 >= SLOW_MS:
+        breakdown = trace.breakdown()
+        entry = {
+            "request_id": trace.request_id,
+            "session_id": trace.session_id,
+            "request": trace.name,
+            "status": status,
+            "ms": round(seconds * 1000, 1),
+            "spans": breakdown,
+        }
+        with _slow_lock:
+            _recent_slow.append(entry)
+        parts = ", ".join(f"{s['span']} {s['ms']}ms" + (f" x{s['count']}" if s["count"] > 1 else "")
+                          for s in breakdown)
+        log.warning("Slow request %s %sms (request_id=%s, session_id=%s): %s", trace.name, entry["ms"],
+                    trace.request_id, trace.session_id, parts or "no spans")
+
+
+def recent_slow(limit: int = RECENT_SLOW) -> list:
+    """Most recent slow requests, newest first"""
+    with _slow_lock:
+        return list(_recent_slow)[-limit:][::-1]
+
+
+def render_metrics() -> str:
+    """All histograms in Prometheus text exposition format"""
+    return "\n".join(request_seconds.render() + span_seconds.render()) + "\n"
+
+
+# Supabase client instrumentation
+
+_QUERY_OPS = {"select", "insert", "upsert", "update", "delete"}
+_STORAGE_OPS = {"download", "upload", "update", "remove", "list", "move", "copy"}
+
+
+class _TracedQuery:
+    """Wraps a postgrest request builder so execute() runs in a db span"""
+
+    def __init__(self, query, table: str, op: str = "select"):
+        self._query = query
+        self._table = table
+        self._op = op
+
+    def execute(self, *args, **kwargs):
+        with _Span(f"db.{self._table}.{self._op}", "db"):
+            return self._query.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+        op = name if name in _QUERY_OPS else self._op
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return _TracedQuery(result, self._table, op) if hasattr(result, "execute") else result
+        return call
+
+
+class _TracedBucket:
+    def __init__(self, bucket, name: str):
+        self._bucket = bucket
+        self._name = name
+
+    def __getattr__(self, name):
+        attr = getattr(self._bucket, name)
+        if name not in _STORAGE_OPS:
+            return attr
+
+        def call(*args, **kwargs):
+            with _Span(f"storage.{self._name}.{name}", "storage"):
+                return attr(*args, **kwargs)
+        return call
+
+
+class _TracedStorage:
+    def __init__(self, storage):
+        self._storage = storage
+
+    def from_(self, bucket: str):
+        return _TracedBucket(self._storage.from_(bucket), bucket)
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+
+class _TracedClient:
+    def __init__(self, client):
+        self._client = client
+        self.storage = _TracedStorage(client.storage)
+
+    def table(self, name: str):
+        return _TracedQuery(self._client.table(name), name)
+
+    def rpc(self, name: str, params: dict = None, **kwargs):
+        return _TracedQuery(self._client.rpc(name, params or {}, **kwargs), "rpc", name)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_client(client):
+    """Wrap a Supabase (or local) client so its queries and storage calls are spans"""
+    if not ENABLED:
+        return client
+    return _TracedClient(client)
@@ -0,0 +1,246 @@
+# Append-only transcript storage on top of the Supabase `transcripts` bucket
+#
+# Layout per session:
+#   transcripts/<session_id>/manifest.json   {"version", "chunk_size", "count"}
+#   transcripts/<session_id>/00000.jsonl     one message dict per line
+#   transcripts/<session_id>/00001.jsonl     ...
+#   transcripts/<session_id>/context.json    digest of older turns (services/context.py)
+#
+# Only the tail chunk and the manifest are rewritten on append, so adding a
+# turn costs the same regardless of how long the session is. Sessions written
+# in the old single-file format (transcripts/<session_id>.json) are still
+# readable and get migrated on their first append.
+#
+# The message count doubles as the transcript's version: append() can be told
+# the count the caller last saw and refuses to write if another writer has
+# appended since (TranscriptConflict). Storage has no conditional writes, so
+# this catches interleaved writers rather than strictly excluding them.
+import json
+
+from services import round_trips, tracing
+from services.supabase_client import supabase
+
+CHUNK_SIZE = 50
+MANIFEST_VERSION = 1
+
+
+class TranscriptConflict(Exception):
+    def __init__(self, session_id: str, expected: int, count: int):
+        super().__init__(f"Transcript {session_id} has {count} messages, expected {expected}")
+        self.session_id = session_id
+        self.expected = expected
+        self.count = count
+
+
+class TranscriptStore:
+    def __init__(self, bucket, chunk_size: int = CHUNK_SIZE):
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+
+    # Paths
+
+    def _manifest_path(self, session_id: str) -> str:
+        return f"transcripts/{session_id}/manifest.json"
+
+    def _chunk_path(self, session_id: str, index: int) -> str:
+        return f"transcripts/{session_id}/{index:05d}.jsonl"
+
+    def _context_path(self, session_id: str) -> str:
+        return f"transcripts/{session_id}/context.json"
+
+    def _legacy_path(self, session_id: str) -> str:
+        return f"transcripts/{session_id}.json"
+
+    def public_url(self, session_id: str) -> str:
+        """Public URL recorded as the session's transcript_url"""
+        return self.bucket.get_public_url(self._manifest_path(session_id))
+
+    # Low-level IO
+
+    def _download(self, path: str):
+        round_trips.record("storage")
+        try:
+            return self.bucket.download(path)
+        except Exception:
+            return None
+
+    def _upload(self, path: str, content: bytes, content_type: str):
+        round_trips.record("storage")
+        self.bucket.upload(path, content, {"content-type": content_type, "upsert": "true"})
+
+    def _remove(self, paths: list):
+        round_trips.record("storage")
+        self.bucket.remove(paths)
+
+    def read_manifest(self, session_id: str):
+        raw = self._download(self._manifest_path(session_id))
+        if raw is None:
+            return None
+        return json.loads(raw.decode("utf-8"))
+
+    def _write_manifest(self, session_id: str, count: int):
+        manifest = {"version": MANIFEST_VERSION, "chunk_size": self.chunk_size, "count": count}
+        self._upload(self._manifest_path(session_id), json.dumps(manifest).encode("utf-8"), "application/json")
+
+    def _read_chunk(self, session_id: str, index: int) -> list:
+        raw = self._download(self._chunk_path(session_id, index))
+        if not raw:
+            return []
+        with tracing.span("transcript.decode"):
+            return [json.loads(line) for line in raw.decode("utf-8").splitlines() if line]
+
+    def _write_chunk(self, session_id: str, index: int, messages: list):
+        with tracing.span("transcript.encode"):
+            content = "".join(json.dumps(m) + "\n" for m in messages)
+        self._upload(self._chunk_path(session_id, index), content.encode("utf-8"), "application/x-ndjson")
+
+    def _read_legacy(self, session_id: str):
+        raw = self._download(self._legacy_path(session_id))
+        if raw is None:
+            return None
+        return json.loads(raw.decode("utf-8"))
+
+    def _write_chunks(self, session_id: str, start: int, messages: list, tail: list):
+        """Write `messages` starting at position `start`; `tail` holds what is already in that chunk"""
+        chunk_size = self.chunk_size
+        index = start // chunk_size
+        pending = tail + messages
+        while pending:
+            self._write_chunk(session_id, index, pending[:chunk_size])
+            pending = pending[chunk_size:]
+            index += 1
+
+    def _read_chunks(self, session_id: str, manifest: dict) -> list:
+        chunk_size = manifest.get("chunk_size", self.chunk_size)
+        count = manifest.get("count", 0)
+        transcript = []
+        for index in range(_chunk_count(count, chunk_size)):
+            transcript.extend(self._read_chunk(session_id, index))
+        return transcript[:count]
+
+    def _write_all(self, session_id: str, transcript: list, old_manifest) -> int:
+        self._write_chunks(session_id, 0, list(transcript), [])
+        self._write_manifest(session_id, len(transcript))
+
+        # Drop chunks left over from a longer previous transcript
+        if old_manifest:
+            old_chunks = _chunk_count(old_manifest.get("count", 0), old_manifest.get("chunk_size", self.chunk_size))
+            new_chunks = _chunk_count(len(transcript), self.chunk_size)
+            stale = [self._chunk_path(session_id, i) for i in range(new_chunks, old_chunks)]
+            if stale:
+                self._remove(stale)
+        return len(transcript)
+
+    # Public API
+
+    def load(self, session_id: str) -> tuple:
+        """
+        Load a session's manifest and full transcript.
+
+        The result can be passed back to `append` so it does not have to
+        re-read what the caller already holds.
+
+        Returns:
+            (manifest, transcript); manifest is None for sessions that are
+            missing or still in the old single-file format, and transcript is
+            None if nothing is stored for the session
+        """
+        manifest = self.read_manifest(session_id)
+        if manifest is None:
+            return None, self._read_legacy(session_id)
+        return manifest, self._read_chunks(session_id, manifest)
+
+    def read(self, session_id: str):
+        """
+        Load the full transcript for a session.
+
+        Returns:
+            list of message dicts, or None if nothing is stored for the session
+        """
+        return self.load(session_id)[1]
+
+    def append(self, session_id: str, messages: list, loaded: tuple = None, expected: int = None) -> int:
+        """
+        Append messages to the end of a session's transcript.
+
+        Only the tail chunk and the manifest are rewritten.
+
+        Args:
+            session_id: Session identifier
+            messages: Message dicts to append
+            loaded: Optional (manifest, transcript) from `load`, taken before
+                these messages were added; skips the manifest and tail reads
+            expected: Optional message count the caller last saw stored
+
+        Returns:
+            number of messages in the transcript after the append
+
+        Raises:
+            TranscriptConflict: if `expected` is given and the stored count differs
+        """
+        manifest, existing = loaded if loaded is not None else (self.read_manifest(session_id), None)
+        if manifest is None and loaded is None and (messages or expected is not None):
+            # First write for this session, or a session still in the old format
+            existing = self._read_legacy(session_id)
+        stored = manifest.get("count", 0) if manifest else len(existing or [])
+        if expected is not None and stored != expected:
+            raise TranscriptConflict(session_id, expected, stored)
+        if not messages:
+            return stored
+
+        if manifest is None:
+            return self._write_all(session_id, (existing or []) + list(messages), None)
+
+        if manifest.get("chunk_size", self.chunk_size) != self.chunk_size:
+            # Chunk size changed since this session was written; re-chunk it once
+            if existing is None:
+                existing = self._read_chunks(session_id, manifest)
+            return self._write_all(session_id, existing + list(messages), manifest)
+
+        count = manifest.get("count", 0)
+        offset = count % self.chunk_size
+        tail = []
+        if offset:
+            if existing is not None:
+                tail = existing[count - offset:count]
+            else:
+                tail = self._read_chunk(session_id, count // self.chunk_size)[:offset]
+        self._write_chunks(session_id, count, list(messages), tail)
+        count += len(messages)
+        self._write_manifest(session_id, count)
+        return count
+
+    def replace(self, session_id: str, transcript: list) -> int:
+        """
+        Overwrite a session's transcript with `transcript`.
+
+        Returns:
+            number of messages written
+        """
+        return self._write_all(session_id, transcript, self.read_manifest(session_id))
+
+    def read_context(self, session_id: str):
+        """The stored chat-context digest for a session, or None"""
+        raw = self._download(self._context_path(session_id))
+        if raw is None:
+            return None
+        return json.loads(raw.decode("utf-8"))
+
+    def write_context(self, session_id: str, context: dict):
+        self._upload(self._context_path(session_id), json.dumps(context).encode("utf-8"), "application/json")
+
+    def delete(self, session_id: str):
+        """Remove every stored object for a session, including the legacy file"""
+        manifest = self.read_manifest(session_id)
+        paths = [self._manifest_path(session_id), self._context_path(session_id), self._legacy_path(session_id)]
+        if manifest:
+            chunks = _chunk_count(manifest.get("count", 0), manifest.get("chunk_size", self.chunk_size))
+            paths.extend(self._chunk_path(session_id, i) for i in range(chunks))
+        self._remove(paths)
+
+
+def _chunk_count(count: int, chunk_size: int) -> int:
+    return (count + chunk_size - 1) // chunk_size
+
+
+transcript_store = TranscriptStore(supabase.storage.from_("transcripts"))
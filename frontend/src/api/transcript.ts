@@ -20,7 +20,7 @@ interface TranscriptContent {
   message: string;
 }
 
-interface Session {
+export interface Session {
   id: number;
   session_id: string;
   user_id?: string;
@@ -40,7 +40,8 @@ interface ChatMessage {
   allow_other: boolean;
   selected_option?: string;
   custom_response?: string;
-  timestamp: string;
+  timestamp: string;  // last write
+  created_at: string;
 }
 
 /**
@@ -79,13 +80,13 @@ export async function uploadTranscript(
 }
 
 /**
- * Get transcript from Supabase storage (requires public URL)
- * @param publicUrl - Public URL from Supabase
+ * Get transcript for a session (assembled by the backend from stored chunks)
+ * @param sessionId - Session identifier
  * @returns Transcript content
  */
-export async function getTranscript(publicUrl: string): Promise<TranscriptContent[]> {
+export async function getTranscript(sessionId: string): Promise<TranscriptContent[]> {
   try {
-    const response = await fetch(publicUrl);
+    const response = await fetch(`${API_BASE}/transcript/${sessionId}`);
     if (!response.ok) {
       throw new Error(`Failed to fetch: ${response.statusText}`);
     }
@@ -98,21 +99,59 @@ export async function getTranscript(publicUrl: string): Promise<TranscriptConten
 }
 
 /**
- * Fetch all sessions from database
- * @returns Array of sessions
+ * Fetch one page of sessions, newest first
+ * @param cursor - nextCursor from the previous page (omit for the first page)
+ * @param limit - Page size (server default 50, max 200)
+ * @returns Sessions on this page and the cursor for the next one (null on the last page)
  */
-export async function fetchSessions(): Promise<Session[]> {
-  try {
-    const response = await fetch(`${API_BASE}/sessions`);
-    if (!response.ok) {
-      throw new Error(`Failed to fetch sessions: ${response.statusText}`);
-    }
-    const data: Session[] = await response.json();
-    return data;
-  } catch (error) {
-    console.error("[ERROR] Failed to fetch sessions:", error);
-    return [];
+export async function fetchSessionsPage(
+  cursor?: string | null,
+  limit?: number
+): Promise<{ sessions: Session[]; nextCursor: string | null }> {
+  const params = new URLSearchParams();
+  if (cursor) params.set("cursor", cursor);
+  if (limit) params.set("limit", String(limit));
+  const query = params.toString();
+  const response = await fetch(`${API_BASE}/sessions${query ? `?${query}` : ""}`);
+  if (!response.ok) {
+    throw new Error(`Failed to fetch sessions: ${response.statusText}`);
   }
+  const sessions: Session[] = await response.json();
+  return { sessions, nextCursor: response.headers.get("X-Next-Cursor") };
+}
+
+export interface SearchResult {
+  session_id: string;
+  title: string | null;
+  created_at: string | null;
+  kind: 'transcript' | 'summary';
+  seq: number;
+  snippet: string;  // raw text with matches wrapped in <mark></mark>; escape the rest before rendering
+  rank: number;
+  matches: number;
+}
+
+/**
+ * Search all session transcripts and approved summaries
+ * @param q - Words, "quoted phrases" and -excluded words
+ * @param offset - nextOffset from the previous page (omit for the first page)
+ * @param limit - Page size (server default 20, max 100)
+ * @returns Matching sessions, best first, and the offset of the next page (null on the last page)
+ */
+export async function searchSessions(
+  q: string,
+  offset?: number | null,
+  limit?: number
+): Promise<{ results: SearchResult[]; nextOffset: number | null }> {
+  const params = new URLSearchParams({ q });
+  if (offset) params.set("offset", String(offset));
+  if (limit) params.set("limit", String(limit));
+  const response = await fetch(`${API_BASE}/search?${params.toString()}`);
+  if (!response.ok) {
+    throw new Error(`Failed to search sessions: ${response.statusText}`);
+  }
+  const data = await response.json();
+  return { results: data.results, nextOffset: data.next_offset };
 }
 
 /**
@@ -142,7 +181,7 @@ export async function fetchSessionDetail(sessionId: string): Promise<Session | n
  */
 export async function saveChatMessage(
   sessionId: string,
-  message: Omit<ChatMessage, 'id' | 'session_id' | 'timestamp'>
+  message: Omit<ChatMessage, 'id' | 'session_id' | 'timestamp' | 'created_at'>
 ): Promise<ChatMessage> {
   try {
     const response = await fetch(`${API_BASE}/chat/message`, {
@@ -169,6 +208,57 @@ export async function saveChatMessage(
   }
 }
 
+interface SaveMessageResult {
+  index: number;
+  session_id: string;
+  message_id: string;
+  status: 'saved' | 'duplicate' | 'error';
+  message?: ChatMessage;
+  error?: string;
+}
+
+/**
+ * Save many chat messages (for one or more sessions) in one request
+ * @param messages - Chat messages with UI state, each with its session_id
+ * @returns Per-message status, in the order given
+ */
+export async function saveChatMessages(
+  messages: Omit<ChatMessage, 'id' | 'timestamp' | 'created_at'>[]
+): Promise<SaveMessageResult[]> {
+  const response = await fetch(`${API_BASE}/chat/messages`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({ messages }),
+  });
+  // A 207 means some messages were not saved; their results say why
+  if (!response.ok) {
+    throw new Error(`Failed to save messages: ${response.statusText}`);
+  }
+  const data = await response.json();
+  return data.results;
+}
+
+
+/**
+ * Fetch chat messages written after a cursor (delta sync)
+ * @param sessionId - Session identifier
+ * @param since - nextCursor from an earlier call (omit for the full history)
+ * @returns New or changed messages, the cursor to poll with next, and whether more pages are waiting
+ */
+export async function syncChatMessages(
+  sessionId: string,
+  since?: string | null
+): Promise<{ messages: ChatMessage[]; nextCursor: string | null; hasMore: boolean }> {
+  const query = since ? `?since=${encodeURIComponent(since)}` : "";
+  const response = await fetch(`${API_BASE}/chat/messages/${sessionId}${query}`);
+  if (!response.ok) {
+    throw new Error(`Failed to fetch messages: ${response.statusText}`);
+  }
+  const data = await response.json();
+  return { messages: data.messages, nextCursor: data.next_cursor, hasMore: data.has_more };
+}
 
 /**
  * Fetch all chat messages for a session
@@ -177,11 +267,17 @@ export async function saveChatMessage(
  */
 export async function fetchChatMessages(sessionId: string): Promise<ChatMessage[]> {
   try {
-    const response = await fetch(`${API_BASE}/chat/messages/${sessionId}`);
-    if (!response.ok) {
-      throw new Error(`Failed to fetch messages: ${response.statusText}`);
+    // Messages come in last-write order; keep the latest version of each
+    const byId = new Map<string, ChatMessage>();
+    let cursor: string | null = null;
+    let hasMore = true;
+    while (hasMore) {
+      const page = await syncChatMessages(sessionId, cursor);
+      page.messages.forEach((message) => byId.set(message.message_id, message));
+      cursor = page.nextCursor;
+      hasMore = page.hasMore;
     }
-    const data: ChatMessage[] = await response.json();
+    const data = [...byId.values()].sort((a, b) => a.created_at.localeCompare(b.created_at));
     console.log("[DEBUG] Fetched chat messages:", data);
     return data;
   } catch (error) {
@@ -3,18 +3,9 @@ import { Link } from 'react-router';
 import { createClient } from '@supabase/supabase-js';
 import { Card } from './ui/Card';
 import { StatusBadge } from './ui/StatusBadge';
+import { SecondaryButton } from './ui/SecondaryButton';
 import { Sparkles, Clock } from 'lucide-react';
-import { fetchSessions } from '../api/transcript';
-
-interface Session {
-  id: number;
-  session_id: string;
-  user_id?: string;
-  transcript_url: string;
-  created_at: string;
-  ended_at: string;
-  title?: string;
-}
+import { useSessionPages } from './useSessionPages';
 
 type SummaryStatus = 'completed' | 'pending';
 
@@ -26,29 +17,16 @@ const supabase =
     : null;
 
 export function AISummaries() {
-  const [sessions, setSessions] = useState<Session[]>([]);
-  const [summaryStatusBySession, setSummaryStatusBySession] = useState<Record<string, SummaryStatus>>({});
-  const [isLoading, setIsLoading] = useState(true);
-  const [error, setError] = useState<string | null>(null);
+  // Most recent first, one page at a time
+  const { sessions, hasMore, isLoading, error: sessionsError, loadMore } = useSessionPages();
+  // Sessions with a draft or final summary; statuses of every loaded page come from this one listing
+  const [completedSessionIds, setCompletedSessionIds] = useState<Set<string>>(new Set());
+  const [summaryError, setSummaryError] = useState<string | null>(null);
 
   useEffect(() => {
-    const loadSessions = async () => {
+    const loadSummaryStatus = async () => {
+      if (!supabase) return;
       try {
-        const data = await fetchSessions();
-        const sortedData = data
-          .slice()
-          .sort((a, b) => new Date(b.created_at).getTime() - new Date(a.created_at).getTime());
-
-        setSessions(sortedData);
-
-        if (!supabase) {
-          const pendingStatus = Object.fromEntries(
-            sortedData.map((session) => [session.session_id, 'pending'])
-          ) as Record<string, SummaryStatus>;
-          setSummaryStatusBySession(pendingStatus);
-          return;
-        }
-
         const { data: summaryFiles, error: summaryListError } = await supabase.storage
           .from('transcripts')
           .list('summaries', { limit: 1000, sortBy: { column: 'name', order: 'asc' } });
@@ -58,7 +36,7 @@ export function AISummaries() {
         }
 
         const names = (summaryFiles || []).map((file) => file.name);
-        const completedSessionIds = new Set([
+        setCompletedSessionIds(new Set([
           // Finalized summaries
           ...names
             .filter((name) => name.endsWith('_final.md'))
@@ -67,27 +45,20 @@ export function AISummaries() {
           ...names
             .filter((name) => name.endsWith('.txt'))
             .map((name) => name.replace('.txt', '')),
-        ]);
-
-        const statusMap = Object.fromEntries(
-          sortedData.map((session) => [
-            session.session_id,
-            completedSessionIds.has(session.session_id) ? 'completed' : 'pending',
-          ])
-        ) as Record<string, SummaryStatus>;
-
-        setSummaryStatusBySession(statusMap);
+        ]));
       } catch (err) {
         console.error('Failed to load summaries:', err);
-        setError('Failed to load summaries');
-      } finally {
-        setIsLoading(false);
+        setSummaryError('Failed to load summaries');
       }
     };
 
-    loadSessions();
+    loadSummaryStatus();
   }, []);
 
+  const error = sessionsError || summaryError;
+  const summaryStatus = (sessionId: string): SummaryStatus =>
+    completedSessionIds.has(sessionId) ? 'completed' : 'pending';
+
   const getTimeAgo = (dateString: string) => {
     const date = new Date(dateString);
     const now = new Date();
@@ -122,7 +93,7 @@ export function AISummaries() {
         )}
 
         {sessions.map((session) => {
-          const status = summaryStatusBySession[session.session_id] || 'pending';
+          const status = summaryStatus(session.session_id);
           const timeAgo = getTimeAgo(session.created_at);
           const summaryPath = `/transcript/${session.session_id}/summary`;
 
@@ -150,6 +121,14 @@ export function AISummaries() {
             </Link>
           );
         })}
+
+        {hasMore && (
+          <div className="flex justify-center">
+            <SecondaryButton onClick={loadMore}>
+              {isLoading ? 'Loading…' : 'Load more sessions'}
+            </SecondaryButton>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -60,7 +60,7 @@ export function ChatInterface() {
           try {
             const sessionData = await fetchSessionDetail(id);
             if (sessionData && sessionData.transcript_url) {
-              const transcript = await getTranscript(sessionData.transcript_url);
+              const transcript = await getTranscript(id);
               // Convert transcript to Message format
               const loadedMessages = transcript.map((msg, idx) => ({
                 id: idx,
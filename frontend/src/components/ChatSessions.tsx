@@ -1,19 +1,9 @@
-import { useEffect, useState } from 'react';
 import { Link } from 'react-router';
 import { Card } from './ui/Card';
 import { StatusBadge } from './ui/StatusBadge';
+import { SecondaryButton } from './ui/SecondaryButton';
 import { MessageSquare, Calendar, Tag } from 'lucide-react';
-import { fetchSessions } from '../api/transcript';
-
-interface RealSession {
-  id: number;
-  session_id: string;
-  user_id?: string;
-  transcript_url: string;
-  created_at: string;
-  ended_at: string;
-  title?: string;
-}
+import { useSessionPages } from './useSessionPages';
 
 // Mock sessions for fallback/examples
 const mockSessions = [
@@ -23,25 +13,8 @@ const mockSessions = [
 ];
 
 export function ChatSessions() {
-  const [sessions, setSessions] = useState<RealSession[]>([]);
-  const [error, setError] = useState<string | null>(null);
-
-  useEffect(() => {
-    const loadSessions = async () => {
-      try {
-        const data = await fetchSessions();
-        // Sort sessions by most recent first
-        const sortedData = data.sort((a, b) => 
-          new Date(b.created_at).getTime() - new Date(a.created_at).getTime()
-        );
-        setSessions(sortedData);
-      } catch (err) {
-        console.error('Failed to load sessions:', err);
-        setError('Failed to load sessions');
-      }
-    };
-    loadSessions();
-  }, []);
+  // Most recent first, one page at a time
+  const { sessions, hasMore, isLoading, error, loadMore } = useSessionPages();
 
   return (
     <div className="p-8">
@@ -85,6 +58,14 @@ export function ChatSessions() {
           );
         })}
 
+        {hasMore && (
+          <div className="flex justify-center">
+            <SecondaryButton onClick={loadMore}>
+              {isLoading ? 'Loading…' : 'Load more sessions'}
+            </SecondaryButton>
+          </div>
+        )}
+
         {/* Mock sessions as examples */}
         {mockSessions.map((session, idx) => (
           <Link key={`mock-${idx}`} to={`/chat/${session.id}`}>
@@ -1,44 +1,20 @@
-import { useEffect, useMemo, useState } from 'react';
+import { useMemo } from 'react';
 import { MessageSquare, FileText, Send, Tag } from 'lucide-react';
 import { Card } from './ui/Card';
 import { StatusBadge } from './ui/StatusBadge';
 import { Link } from 'react-router';
-import { fetchSessions } from '../api/transcript';
-
-interface Session {
-  id: number;
-  session_id: string;
-  title?: string;
-  created_at: string;
-}
+import { useSessionPages } from './useSessionPages';
 
 export function Dashboard() {
-  const [sessions, setSessions] = useState<Session[]>([]);
-  const [isLoading, setIsLoading] = useState(true);
-
-  useEffect(() => {
-    const loadSessions = async () => {
-      try {
-        const data = await fetchSessions();
-        const sorted = data
-          .slice()
-          .sort((a, b) => new Date(b.created_at).getTime() - new Date(a.created_at).getTime());
-        setSessions(sorted);
-      } catch (error) {
-        console.error('Failed to load dashboard sessions:', error);
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    loadSessions();
-  }, []);
+  // Only the first page (newest first); counts past it are shown as "N+"
+  const { sessions, hasMore, isLoading } = useSessionPages();
 
   const recentSessions = useMemo(() => sessions.slice(0, 5), [sessions]);
+  const sessionCount = `${sessions.length}${hasMore ? '+' : ''}`;
 
   const stats = [
-    { label: 'Total Sessions', value: String(sessions.length), icon: MessageSquare, color: 'indigo' },
-    { label: 'Pending Summaries', value: String(sessions.length), icon: FileText, color: 'amber' },
+    { label: 'Total Sessions', value: sessionCount, icon: MessageSquare, color: 'indigo' },
+    { label: 'Pending Summaries', value: sessionCount, icon: FileText, color: 'amber' },
     { label: 'Projects Routed', value: '189', icon: Send, color: 'green' },
     { label: 'Most Tagged Dept', value: 'Frontend', icon: Tag, color: 'purple' },
   ];
@@ -110,7 +110,7 @@ export function ImprovedChatInterface() {
       if (!sessionData?.transcript_url) return;
       if (sessionData.title) setProjectTitle(sessionData.title);
 
-      const transcript = await getTranscript(sessionData.transcript_url);
+      const transcript = await getTranscript(sessionId);
       if (!transcript || transcript.length === 0) return;
 
       const restored: Message[] = transcript.map((entry, idx) => {
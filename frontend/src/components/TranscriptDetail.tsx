@@ -163,6 +163,7 @@ import { Card } from './ui/Card';
 import { PrimaryButton } from './ui/PrimaryButton';
 import { SecondaryButton } from './ui/SecondaryButton';
 import { ArrowLeft, Sparkles, Loader2, AlertCircle, CheckCircle2 } from 'lucide-react';
+import { getTranscript } from '../api/transcript';
 
 type TranscriptMessage = {
   role: 'bot' | 'user';
@@ -187,26 +188,20 @@ export function TranscriptDetail() {
   const [hasFinalSummary, setHasFinalSummary] = useState(false);
 
   useEffect(() => {
-    async function fetchTranscript() {
-      if (!supabase) {
-        setError('Supabase is not configured. Check your VITE_SUPABASE_URL and VITE_SUPABASE_ANON_KEY environment variables.');
-        setLoading(false);
-        return;
-      }
-
+    async function fetchTranscript(id: string) {
       try {
         setLoading(true);
         setError(null);
 
-        // Fetch transcript and check for final summary in parallel
-        const [transcriptResult, finalSummaryResult] = await Promise.all([
-          supabase.storage.from('transcripts').download(`transcripts/${id}.json`),
-          supabase.storage.from('transcripts').download(`summaries/${id}_final.md`),
+        // The backend assembles the transcript from its stored chunks; the final
+        // summary is a plain file, so its presence is checked in storage directly
+        const [messages, finalSummaryResult] = await Promise.all([
+          getTranscript(id),
+          supabase
+            ? supabase.storage.from('transcripts').download(`summaries/${id}_final.md`)
+            : Promise.resolve({ error: new Error('Supabase is not configured') }),
         ]);
 
-        if (transcriptResult.error) throw new Error(transcriptResult.error.message);
-
-        const messages: TranscriptMessage[] = JSON.parse(await transcriptResult.data.text());
         setTranscript(messages);
 
         // If the final summary download succeeded, the file exists
@@ -218,7 +213,7 @@ export function TranscriptDetail() {
       }
     }
 
-    if (id) fetchTranscript();
+    if (id) fetchTranscript(id);
   }, [id]);
 
   return (
@@ -16,6 +16,44 @@ const supabase =
     : null;
 
 const SUMMARY_DRAFT_STORAGE_PREFIX = 'rally:summary-draft:';
+const SUMMARY_JOB_POLL_MS = 1000;
+const SUMMARY_JOB_MAX_MISSING = 5;
+const SUMMARY_JOB_MAX_WAIT_MS = 3 * 60 * 1000;
+
+// Summarize/regenerate run as background jobs on the backend: ask for a job id
+// (202) and poll it until the summary is ready, giving up after SUMMARY_JOB_MAX_WAIT_MS.
+// Cached summaries come back directly.
+async function requestSummary(url: string, init: RequestInit = {}) {
+  const res = await fetch(url, {
+    ...init,
+    headers: { ...(init.headers ?? {}), Prefer: 'respond-async' },
+  });
+  if (!res.ok) {
+    const body = await res.json().catch(() => ({}));
+    throw new Error(body?.detail ?? `Request failed with status ${res.status}`);
+  }
+  const data = await res.json();
+  if (res.status !== 202) return data;
+
+  const deadline = Date.now() + SUMMARY_JOB_MAX_WAIT_MS;
+  for (let missing = 0; ; ) {
+    if (Date.now() >= deadline) {
+      throw new Error('Timed out waiting for the summary. Please try again.');
+    }
+    await new Promise((resolve) => setTimeout(resolve, SUMMARY_JOB_POLL_MS));
+    const poll = await fetch(`${BACKEND_URL}${data.status_url}`);
+    // A worker that hasn't seen the job's stored status yet answers 404; poll again
+    if (poll.status === 404 && ++missing < SUMMARY_JOB_MAX_MISSING) continue;
+    if (!poll.ok) {
+      throw new Error(`Request failed with status ${poll.status}`);
+    }
+    const job = await poll.json();
+    if (job.status === 'succeeded') return job.result;
+    if (job.status === 'failed') {
+      throw new Error(job.result?.detail ?? `Request failed with status ${job.status_code}`);
+    }
+  }
+}
 
 const DEPARTMENTS = ['Frontend', 'Backend', 'Design', 'Business', 'DevOps', 'QA'] as const;
 type DepartmentName = (typeof DEPARTMENTS)[number];
@@ -742,12 +780,7 @@ export function TranscriptSummary() {
     setComments([]);
 
     try {
-      const res = await fetch(`${BACKEND_URL}/api/summarize/${id}`, { method: 'POST' });
-      if (!res.ok) {
-        const body = await res.json().catch(() => ({}));
-        throw new Error(body?.detail ?? `Request failed with status ${res.status}`);
-      }
-      const data = await res.json();
+      const data = await requestSummary(`${BACKEND_URL}/api/summarize/${id}`, { method: 'POST' });
       setSummary(data.summary);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to generate summary.');
@@ -866,16 +899,11 @@ export function TranscriptSummary() {
     setRegenerateError(null);
     setRegenerateSuccess(false);
     try {
-      const res = await fetch(`${BACKEND_URL}/api/summarize/${id}/regenerate`, {
+      const data = await requestSummary(`${BACKEND_URL}/api/summarize/${id}/regenerate`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ summary, comments: commentsForRegeneration }),
       });
-      if (!res.ok) {
-        const body = await res.json().catch(() => ({}));
-        throw new Error(body?.detail ?? `Request failed with status ${res.status}`);
-      }
-      const data = await res.json();
       setSummary(data.summary);
       setComments([]);
       setRegenerateSuccess(true);
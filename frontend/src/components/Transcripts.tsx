@@ -1,18 +1,9 @@
-import { useEffect, useState } from 'react';
 import { Link } from 'react-router';
 import { Card } from './ui/Card';
 import { StatusBadge } from './ui/StatusBadge';
+import { SecondaryButton } from './ui/SecondaryButton';
 import { MessageSquare, Calendar, FileText } from 'lucide-react';
-import { fetchSessions, getTranscript } from '../api/transcript';
-
-interface Session {
-  id: number;
-  session_id: string;
-  user_id?: string;
-  transcript_url: string;
-  created_at: string;
-  ended_at: string;
-}
+import { useSessionPages } from './useSessionPages';
 
 // Mock transcripts for examples
 const mockTranscripts = [
@@ -22,28 +13,8 @@ const mockTranscripts = [
 ];
 
 export function Transcripts() {
-  const [sessions, setSessions] = useState<Session[]>([]);
-  const [isLoading, setIsLoading] = useState(true);
-  const [error, setError] = useState<string | null>(null);
-
-  useEffect(() => {
-    const loadSessions = async () => {
-      try {
-        const data = await fetchSessions();
-        // Sort sessions by most recent first
-        const sortedData = data.sort((a, b) => 
-          new Date(b.created_at).getTime() - new Date(a.created_at).getTime()
-        );
-        setSessions(sortedData);
-      } catch (err) {
-        console.error('Failed to load sessions:', err);
-        setError('Failed to load transcripts');
-      } finally {
-        setIsLoading(false);
-      }
-    };
-    loadSessions();
-  }, []);
+  // Most recent first, one page at a time
+  const { sessions, hasMore, isLoading, error, loadMore } = useSessionPages();
 
   return (
     <div className="p-8">
@@ -90,6 +61,14 @@ export function Transcripts() {
           );
         })}
 
+        {hasMore && (
+          <div className="flex justify-center">
+            <SecondaryButton onClick={loadMore}>
+              {isLoading ? 'Loading…' : 'Load more sessions'}
+            </SecondaryButton>
+          </div>
+        )}
+
         {/* Mock transcripts as examples */}
         {mockTranscripts.map((transcript, idx) => (
           <Link key={`mock-${idx}`} to={`/transcript/${transcript.id}`}>
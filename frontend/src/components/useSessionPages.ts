@@ -0,0 +1,47 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+import { fetchSessionsPage, type Session } from '../api/transcript';
+
+/**
+ * Sessions list loaded one page at a time, newest first
+ * @param limit - Page size (server default when omitted)
+ * @returns Sessions loaded so far, whether more pages exist, and loadMore() to fetch the next one
+ */
+export function useSessionPages(limit?: number) {
+  const [sessions, setSessions] = useState<Session[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoading, setIsLoading] = useState(true);
+  const [error, setError] = useState<string | null>(null);
+  const loading = useRef(false);
+
+  const loadPage = useCallback(async (cursor: string | null) => {
+    if (loading.current) return;
+    loading.current = true;
+    setIsLoading(true);
+    try {
+      const page = await fetchSessionsPage(cursor, limit);
+      setSessions((previous) => {
+        // A session created between two page loads can show up on both
+        const seen = new Set(previous.map((session) => session.session_id));
+        return [...previous, ...page.sessions.filter((session) => !seen.has(session.session_id))];
+      });
+      setNextCursor(page.nextCursor);
+      setError(null);
+    } catch (err) {
+      console.error('Failed to load sessions:', err);
+      setError('Failed to load sessions');
+    } finally {
+      loading.current = false;
+      setIsLoading(false);
+    }
+  }, [limit]);
+
+  useEffect(() => {
+    loadPage(null);
+  }, [loadPage]);
+
+  const loadMore = useCallback(() => {
+    if (nextCursor) loadPage(nextCursor);
+  }, [loadPage, nextCursor]);
+
+  return { sessions, hasMore: nextCursor !== null, isLoading, error, loadMore };
+}